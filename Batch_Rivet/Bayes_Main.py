@@ -5,12 +5,21 @@ from Bayes_HEP.Design_Points import data_pred as DataPred
 from Bayes_HEP.Emulation import emulation as Emulation
 from Bayes_HEP.Calibration import calibration as Calibration
 from Bayes_HEP.Design_Points import rivet_html_parser as RivetParser
+from batch_tools import registry as Registry
+from batch_tools import prediction_merge as PredMerge
+from batch_tools import prediction_cache as PredCache
+from batch_tools import gp_emulator as GPEmulator
+from batch_tools import calibration as GPCalibration
+from batch_tools import design as Design
+from batch_tools import plotting as GPPlots
+from batch_tools import observables as Observables
+from batch_tools import emulator_benchmark as EmuBenchmark
 
 import os
 import shutil
-import matplotlib.pyplot as plt
 import glob
 import dill
+import numpy as np
     
 ###########################################################
 ################### SCRIPT PARAMETERS #####################
@@ -20,6 +29,9 @@ import os
 def str2bool(x):
     return str(x).lower() in ['true', '1', 'yes', 'y']
 
+def str2auto(x):
+    return None if str(x).lower() == 'auto' else str2bool(x)
+
 parser = argparse.ArgumentParser(description="Run Bayesian Emulator and Calibration workflow.")
 
 parser.add_argument("--work_dir", type=str, default=None,
@@ -27,28 +39,63 @@ parser.add_argument("--work_dir", type=str, default=None,
 parser.add_argument("--main_dir", type=str, default=None,
     help="Project main directory (default: <work_dir>/HPC_New_Project)")
 parser.add_argument("--seed", type=int, default=43)
-parser.add_argument("--clear_output", type=str2bool, default=True)
+parser.add_argument("--clear_output", type=str2bool, default=True,
+    help="Clear the output directory (the fingerprinted emulator cache in output/emulator is kept)")
 parser.add_argument("--Coll_System", nargs="+", default=["pp_7000"],
     help="List of collision systems (e.g. pp_7000 pPb_5020)")
 parser.add_argument("--model", type=str, default="pythia8")
+parser.add_argument("--Prediction_Cache", type=str2bool, default=True,
+    help="Load predictions from the memory-mapped binary cache instead of parsing the text files")
 parser.add_argument("--train_size", type=int, default=80,
     help="Percentage of design points for training")
 parser.add_argument("--validation_size", type=int, default=20,
     help="Percentage of design points for validation")
-parser.add_argument("--Train_Surmise", type=str2bool, default=True)
-parser.add_argument("--Train_Scikit", type=str2bool, default=True)
+parser.add_argument("--Train_Surmise", type=str2auto, default=None,
+    help="auto (default): reuse the emulator if it was trained on the current inputs, else retrain; True: always retrain; False: load the saved one")
+parser.add_argument("--Train_Scikit", type=str2auto, default=None,
+    help="auto, True or False, as --Train_Surmise")
 parser.add_argument("--PCA", type=str2bool, default=True)
+parser.add_argument("--Bayes_Engine", choices=["Bayes_HEP", "batch_tools"], default="Bayes_HEP",
+    help="Bayes_HEP: its Emulation.train_*/Calibration.run_calibration, one system. batch_tools: the same workflow "
+         "(PCGP/indGP/GP emulators, emcee, design/emulator/trace/posterior/results plots) with process-pool training, "
+         "a walker-batched low-rank likelihood, resumable chains, early stopping, SMC and several systems at once")
+parser.add_argument("--emulator_jobs", type=int, default=None,
+    help="Processes for batch_tools emulator training (default: --npool, else the CPUs of the allocation)")
+parser.add_argument("--n_starts", type=int, default=3,
+    help="Hyperparameter multi-starts per GP (batch_tools emulators)")
+parser.add_argument("--Benchmark_Emulators", type=str2bool, default=False,
+    help="batch_tools engine: k-fold / learning-curve benchmark of every emulator method to output/benchmark/emulators.json, instead of emulation and calibration")
+parser.add_argument("--benchmark_folds", type=int, default=5, help="Folds of the emulator benchmark")
+parser.add_argument("--benchmark_sizes", type=int, nargs="*", default=[],
+    help="Training sizes of the benchmark learning curve (default: the full k-fold training sets only)")
 parser.add_argument("--Run_Calibration", type=str2bool, default=True)
 parser.add_argument("--nwalkers", type=int, default=50)
 parser.add_argument("--npool", type=int, default=5)
 parser.add_argument("--Samples", type=int, default=100)
 parser.add_argument("--nburn", type=int, default=50)
+parser.add_argument("--Sampler", choices=["emcee", "smc"], default="emcee",
+    help="batch_tools engine: emcee ensemble, or tempered SMC (multimodal posteriors, gives the evidence) on --npool processes")
+parser.add_argument("--n_particles", type=int, default=2000, help="SMC particles")
+parser.add_argument("--checkpoint_every", type=int, default=500,
+    help="Sampler steps between chain checkpoints (batch_tools engine)")
+parser.add_argument("--thin", type=int, default=1, help="Store every thin-th step of the chains (batch_tools engine)")
+parser.add_argument("--chain_float32", type=str2bool, default=False, help="Store the chains as float32 (batch_tools engine)")
+parser.add_argument("--Resume_Calibration", type=str2bool, default=True,
+    help="Continue an interrupted calibration from its last checkpoint (needs --clear_output False)")
+parser.add_argument("--Early_Stop", type=str2bool, default=True,
+    help="Stop once the chain is tau_factor x the autocorrelation time and tau is stable; burn-in and thinning from tau (batch_tools engine, --Samples is then the maximum)")
+parser.add_argument("--tau_factor", type=float, default=50, help="Chain length in units of the autocorrelation time")
+parser.add_argument("--tau_tol", type=float, default=0.01, help="Relative change of tau between checkpoints counted as stable")
 parser.add_argument("--percent", type=float, default=0.15,
     help="Get traces for the last percentage of samples")
 parser.add_argument("--Load_Calibration", type=str2bool, default=True)
 parser.add_argument("--size", type=int, default=1000,
     help="Number of samples for results")
 parser.add_argument("--Result_plots", type=str2bool, default=True)
+parser.add_argument("--Plot_Jobs", type=int, default=2,
+    help="Background processes rendering the figures (0: render in the main process)")
+parser.add_argument("--Skip_Plots", nargs="*", default=[], choices=GPPlots.GROUPS,
+    help="Figure groups not to make")
 
 args = parser.parse_args()
 
@@ -59,120 +106,217 @@ seed = args.seed
 clear_output = args.clear_output
 Coll_System = args.Coll_System
 model = args.model
+Prediction_Cache = args.Prediction_Cache
 train_size = args.train_size
 validation_size = args.validation_size
 Train_Surmise = args.Train_Surmise
 Train_Scikit = args.Train_Scikit
 PCA = args.PCA
+Bayes_Engine = args.Bayes_Engine
+emulator_jobs = args.emulator_jobs
+n_starts = args.n_starts
+Benchmark_Emulators = args.Benchmark_Emulators
+benchmark_folds = args.benchmark_folds
+benchmark_sizes = args.benchmark_sizes
 Run_Calibration = args.Run_Calibration
 nwalkers = args.nwalkers
 npool = args.npool
 Samples = args.Samples
 nburn = args.nburn
 percent = args.percent
+Sampler = args.Sampler
+n_particles = args.n_particles
+checkpoint_every = args.checkpoint_every
+thin = args.thin
+chain_float32 = args.chain_float32
+Resume_Calibration = args.Resume_Calibration
+Early_Stop = args.Early_Stop
+tau_factor = args.tau_factor
+tau_tol = args.tau_tol
 Load_Calibration = args.Load_Calibration
 size = args.size
 Result_plots = args.Result_plots
+Plot_Jobs = args.Plot_Jobs
+Skip_Plots = args.Skip_Plots
 ###########################################################
 ###########################################################
+if Bayes_Engine == "Bayes_HEP" and Sampler == "smc":
+    raise SystemExit("--Sampler smc needs --Bayes_Engine batch_tools (Calibration.run_calibration runs emcee)")
+
 output_dir = f"{main_dir}/output"
 if clear_output and os.path.exists(output_dir):
     print(f"Clearing output directory: {output_dir}")
-    shutil.rmtree(output_dir)
+    for entry in os.listdir(output_dir):
+        if entry != "emulator":
+            path = os.path.join(output_dir, entry)
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
 os.makedirs(output_dir, exist_ok=True)
 os.makedirs(output_dir + "/plots", exist_ok=True)
 
+# Figures render headless in background processes while the workflow carries on
+GPPlots.headless()
+figures = GPPlots.FigureQueue(Plot_Jobs, Skip_Plots)
+prior_names, lower, upper = Design.read_prior_ranges(f"{main_dir}/input/Rivet/parameter_prior_list.dat")
+
 ############## Design Points ####################
 print("Loading design points from input directory.")
 
-index_files = DataPred.get_design_index(main_dir)
+registry = Registry.connect(main_dir)
 merged_Design_file = f"Design__Rivet__Merged.dat"
-merged_output_file = f'{main_dir}/input/Design/{merged_Design_file}'
-shutil.copy(f"{main_dir}/input/Rivet/parameter_prior_list.dat", merged_output_file)
-existing_rows = DataPred.get_existing_design_points(index_files)
-
-with open(merged_output_file, 'a') as f:
-    f.write(f"\n\n# Total Design Points Merged = {len(existing_rows)}")
-    f.write('\n' + "# Design point indices (row index): " + ' '.join(str(i) for i in range(len(existing_rows))) + '\n')   
-    f.write("\n".join(existing_rows) + "\n")
-print(f"➕ Appended {len(existing_rows)} design points to {merged_output_file}")
+# Design__Rivet__Merged.dat and input/Prediction_Merged are only rewritten for waves added since the last run
+n_design_points, merged_dir = PredMerge.merge_all(registry, main_dir)
 print(f"Loading {merged_Design_file} from input directory.") 
 
 RawDesign = Reader.ReadDesign(f'{main_dir}/input/Design/{merged_Design_file}')
 priors, parameter_names, dim= DesignPoints.get_prior(RawDesign)
 train_points, validation_points, train_indices, validation_indices = DesignPoints.load_data(train_size, validation_size, RawDesign['Design'], priors, seed)
 
-Plots.plot_design_points(train_points, validation_points, priors)
-plt.suptitle(f"Design Point Parameter Space", fontsize=18)
-plt.savefig(f"{output_dir}/plots/Design_Points.png")
-plt.show()
+if len(train_points) + len(validation_points) > 2000:
+    figures.submit("design", GPPlots.design_pairs, train_points, validation_points, prior_names, lower, upper,
+                   f"{output_dir}/plots/Design_Points.png")
+else:
+    figures.submit("design", Plots.plot_design_points, train_points, validation_points, priors,
+                   path=f"{output_dir}/plots/Design_Points.png", title="Design Point Parameter Space")
 
 print("Loading input directory.")
 
 prediction_dir, data_dir = f"{main_dir}/input/Prediction", f"{main_dir}/input/Data"
-DG_predictions_files = glob.glob(f"{prediction_dir}/*.dat")
-merged_dir = f"{main_dir}/input/Prediction_Merged"
-os.makedirs(merged_dir, exist_ok=True)
-DataPred.group_histograms_by_design(DG_predictions_files, merged_dir)
 
 Data = {}
 Predictions = {}
 all_data = {}
 n_hist = {}
+observables = {}
 
-for system in Coll_System:
-    System, Energy = system.split('_')[0], system.split('_')[1]  
-    sys = System + Energy   
+if Bayes_Engine == "batch_tools":
+    # All systems stacked into one observable vector, indexed by system / analysis / histogram
+    stacked = Observables.load_systems(main_dir, model, Coll_System, train_indices, validation_indices, merged_dir, data_dir,
+                                       use_cache=Prediction_Cache)
+    layout, system_blocks = stacked['layout'], stacked['systems']
+    for system, block in system_blocks.items():
+        observables[system] = block['names']
+    x, y_data_results, y_data_errors, y_train_results, y_val_results = (
+        np.concatenate([block[key] for block in system_blocks.values()], axis=-1)
+        for key in ('x', 'y_data', 'y_err', 'y_train', 'y_val'))
+else:
+    if len(Coll_System) > 1:
+        print(f"⚠️ The Bayes_HEP engine calibrates one system: only {Coll_System[-1]} is used (--Bayes_Engine batch_tools combines them).")
+    for system in Coll_System:
+        System, Energy = system.split('_')[0], system.split('_')[1]  
+        sys = System + Energy   
 
-    prediction_files = glob.glob(os.path.join(merged_dir, f"Prediction__{model}__{Energy}__{System}__*__values.dat"))
-    data_files = glob.glob(os.path.join(data_dir, f"Data__{Energy}__{System}__*.dat"))
+        prediction_files = glob.glob(os.path.join(merged_dir, f"Prediction__{model}__{Energy}__{System}__*__values.dat"))
+        data_files = glob.glob(os.path.join(data_dir, f"Data__{Energy}__{System}__*.dat"))
 
-    all_predictions = [Reader.ReadPrediction(f) for f in prediction_files]
-    all_data[sys] = [Reader.ReadData(f) for f in data_files]
+        if Prediction_Cache:
+            all_predictions = PredCache.read_predictions(main_dir, model, system, prediction_files, merged_dir, data_dir)
+        else:
+            all_predictions = [Reader.ReadPrediction(f) for f in prediction_files]
+        all_data[sys] = [Reader.ReadData(f) for f in data_files]
 
-    n_hist[sys] = len(prediction_files)
+        n_hist[sys] = len(prediction_files)
+        observables[sys] = sorted(os.path.basename(f) for f in prediction_files)
 
-    x, x_errors, y_data_results, y_data_errors = DataPred.get_data(all_data[sys], sys)
-    y_train_results, y_train_errors, y_val_results, y_val_errors = DataPred.get_predictions(all_predictions, train_indices, validation_indices, sys)
+        x, x_errors, y_data_results, y_data_errors = DataPred.get_data(all_data[sys], sys)
+        y_train_results, y_train_errors, y_val_results, y_val_errors = DataPred.get_predictions(all_predictions, train_indices, validation_indices, sys)
 print("Data and predictions loaded successfully.")
 
+######### Emulator benchmark ########
+if Benchmark_Emulators:
+    if Bayes_Engine != "batch_tools":
+        raise SystemExit("--Benchmark_Emulators needs --Bayes_Engine batch_tools")
+    # Every design point takes part: k folds over train + validation, all methods and sizes on one pool
+    report = EmuBenchmark.run(np.vstack([train_points, validation_points]), np.vstack([y_train_results, y_val_results]),
+                              layout, k=benchmark_folds, train_sizes=benchmark_sizes,
+                              jobs=emulator_jobs or GPEmulator.pool_size(npool), seed=seed, n_starts=n_starts)
+    EmuBenchmark.write_report(report, f"{output_dir}/benchmark/emulators.json")
+    EmuBenchmark.print_summary(report)
+    print(f"Benchmark written to {output_dir}/benchmark/emulators.json; skipping emulation and calibration.")
+    figures.wait()
+    raise SystemExit(0)
+
 ######### Emulators ########
 Emulators = {}
 PredictionVal = {}
 PredictionTrain = {}
-os.makedirs(output_dir + "/emulator", exist_ok=True)
-
-######### Surmise Emulator ########
-if Train_Surmise:
-    print("Training Surmise emulators.")
-    method_type = 'indGP'
-    if PCA:
-        method_type = 'PCGP'
+emulator_dir = f"{output_dir}/emulator"
+os.makedirs(emulator_dir, exist_ok=True)
+emulator_observables = [name for sys_name in sorted(observables) for name in observables[sys_name]]
+emulator_methods = {'surmise': ('PCGP' if PCA else 'indGP', Train_Surmise), 'scikit': ('GP', Train_Scikit)}
 
-    Emulators['surmise'], PredictionVal['surmise_val'], PredictionTrain['surmise_train'] = Emulation.train_surmise(Emulators, x, y_train_results, train_points, validation_points, output_dir, method_type)
+if Bayes_Engine == "batch_tools":
+    # scikit-learn counterparts of the surmise (PCGP/indGP) and scikit (GP) emulators, one per system, every GP fit
+    # spread over one process pool; keyed by method (gp_PCGP, gp_indGP, gp_Matern) everywhere downstream
+    emulator_methods = {GPEmulator.label(method): (method, train) for method, train in emulator_methods.values()}
+    jobs = emulator_jobs or GPEmulator.pool_size(npool)
+    requests = {}
+    for name, (method_type, train) in emulator_methods.items():
+        for system, block in system_blocks.items():
+            spec = {'name': f"{name}_{system}", 'method': method_type, 'theta': train_points, 'y': block['y_train'],
+                    'observables': block['names'], 'settings': {'n_starts': n_starts, 'seed': seed}}
+            requests.setdefault(train, []).append((name, system, spec))
+    print(f"{len(emulator_methods)} emulator(s) x {len(system_blocks)} system(s): fits on {jobs} process(es) where training is needed.")
+    for train, entries in requests.items():
+        fitted = GPEmulator.cached_fit_many(emulator_dir, [spec for _, _, spec in entries], jobs, train)
+        for (name, system, _), emulator in zip(entries, fitted):
+            Emulators.setdefault(name, {})[system] = emulator
+    for name, per_system in Emulators.items():
+        val_pred = [per_system[system].predict(validation_points) for system in system_blocks]
+        train_pred = [per_system[system].predict(train_points) for system in system_blocks]
+        PredictionVal[f'{name}_val'] = tuple(np.hstack(parts) for parts in zip(*val_pred))
+        PredictionTrain[f'{name}_train'] = tuple(np.hstack(parts) for parts in zip(*train_pred))
+        for system in system_blocks:
+            rmse = GPEmulator.rmse(per_system[system], validation_points, y_val_results[:, layout.system_slice(system)])
+            print(f"   {name} {system} validation RMSE: mean {rmse.mean():.4g}, max {rmse.max():.4g}")
 else:
-    print("Loading Surmise emulator.")
-    Emulators['surmise'] = {}
-    Emulators['surmise'], PredictionVal['surmise_val'], PredictionTrain['surmise_train'] = Emulation.load_surmise(Emulators['surmise'], x, train_points, validation_points, output_dir)
-
-######## Scikit-learn Emulator ########
-if Train_Scikit:
-    print("Training Scikit-learn emulator.")
-    method_type = 'GP'
-    if PCA:
-        print("PCA is not supported for Scikit-learn emulator. Using standard Gaussian Process.") 
+    # Bayes_HEP saves its own emulator files: a fingerprint next to them says what they were trained on
+    fingerprints = {name: GPEmulator.fingerprint(train_points, y_train_results, emulator_observables,
+                                                 engine=Bayes_Engine, method=method_type)
+                    for name, (method_type, _) in emulator_methods.items()}
+    for name, (method_type, train) in emulator_methods.items():
+        if train is None:
+            train = not GPEmulator.matches(emulator_dir, name, fingerprints[name])
+            print(f"{name} emulator: " + ("inputs changed, retraining." if train else "matches the inputs, reusing it."))
+        emulator_methods[name] = (method_type, train)
+
+    ######### Surmise Emulator ########
+    method_type, Train_Surmise = emulator_methods['surmise']
+    if Train_Surmise:
+        print("Training Surmise emulators.")
+
+        Emulators['surmise'], PredictionVal['surmise_val'], PredictionTrain['surmise_train'] = Emulation.train_surmise(Emulators, x, y_train_results, train_points, validation_points, output_dir, method_type)
+        GPEmulator.record(emulator_dir, 'surmise', fingerprints['surmise'])
+    else:
+        print("Loading Surmise emulator.")
+        Emulators['surmise'] = {}
+        Emulators['surmise'], PredictionVal['surmise_val'], PredictionTrain['surmise_train'] = Emulation.load_surmise(Emulators['surmise'], x, train_points, validation_points, output_dir)
+
+    ######## Scikit-learn Emulator ########
+    method_type, Train_Scikit = emulator_methods['scikit']
+    if Train_Scikit:
+        print("Training Scikit-learn emulator.")
+        if PCA:
+            print("PCA is not supported for Scikit-learn emulator. Using standard Gaussian Process.") 
         
-    Emulators['scikit'], PredictionVal['scikit_val'], PredictionTrain['scikit_train'] = Emulation.train_scikit(Emulators, x, y_train_results, train_points, validation_points, output_dir, method_type)
-else:
-    print("Loading Scikit-learn emulator.")
+        Emulators['scikit'], PredictionVal['scikit_val'], PredictionTrain['scikit_train'] = Emulation.train_scikit(Emulators, x, y_train_results, train_points, validation_points, output_dir, method_type)
+        GPEmulator.record(emulator_dir, 'scikit', fingerprints['scikit'])
+    else:
+        print("Loading Scikit-learn emulator.")
 
-    Emulators['scikit'] = {}
-    Emulators['scikit'], PredictionVal['scikit_val'], PredictionTrain['scikit_train'] = Emulation.load_scikit(Emulators['scikit'], x, train_points, validation_points, output_dir)
+        Emulators['scikit'] = {}
+        Emulators['scikit'], PredictionVal['scikit_val'], PredictionTrain['scikit_train'] = Emulation.load_scikit(Emulators['scikit'], x, train_points, validation_points, output_dir)
 
 os.makedirs(f"{output_dir}/plots/emulators/", exist_ok=True)
-Plots.plot_rmse_comparison(y_train_results, y_val_results, PredictionTrain, PredictionVal, output_dir)
-    
+if Bayes_Engine == "Bayes_HEP":
+    figures.submit("emulators", Plots.plot_rmse_comparison, y_train_results, y_val_results, PredictionTrain, PredictionVal, output_dir)
+else:
+    figures.submit("emulators", GPPlots.emulator_validation, PredictionVal, y_val_results,
+                   f"{output_dir}/plots/emulators/Emulator_Validation.png")
+
 ########### Calibration ###########
+# burn-in / thinning of the stored chains: from the convergence report with early stopping, else --nburn and no thinning
+# (explicitly, so a stale report cannot set them)
+sample_cuts = {'nburn': None, 'thin': None} if Early_Stop else {'nburn': nburn, 'thin': 1}
 if Run_Calibration:
     print("Running calibration.")
     os.makedirs(f"{output_dir}/calibration/samples/", exist_ok=True)
@@ -180,13 +324,43 @@ if Run_Calibration:
     os.makedirs(f"{output_dir}/plots/calibration/", exist_ok=True)  
     os.makedirs(f"{output_dir}/plots/trace/", exist_ok=True)
 
-    results, samples_results, min_samples, map_params = Calibration.run_calibration(x, y_data_results, y_data_errors, priors, Emulators, output_dir, nburn, nwalkers, npool, Samples)
+    if Bayes_Engine == "batch_tools":
+        # One calibration per emulator kind over all systems; the whole walker ensemble per likelihood call
+        for name, per_system in Emulators.items():
+            likelihood = GPCalibration.JointLikelihood(
+                GPCalibration.Likelihood(per_system[system], block['y_data'], block['y_err'], lower, upper)
+                for system, block in system_blocks.items())
+            if Sampler == "smc":
+                GPCalibration.run_smc(likelihood, n_particles, output_dir, name, seed, npool)
+                continue
+            monitor = GPCalibration.ConvergenceMonitor(prior_names, tau_factor, tau_tol) if Early_Stop else None
+            GPCalibration.run_calibration(likelihood, nwalkers, Samples, nburn, output_dir, name, seed,
+                                          checkpoint_every=checkpoint_every, thin=thin, float32=chain_float32,
+                                          resume=Resume_Calibration, monitor=monitor)
+            figures.submit("traces", GPPlots.trace_bands, GPCalibration.traces(output_dir, name, percent),
+                           prior_names, f"{output_dir}/plots/trace/Trace_{name}.png")
+        samples_results, min_samples, map_params = GPCalibration.load_samples(output_dir, list(Emulators),
+                                                                               **sample_cuts)
+    else:
+        results, samples_results, min_samples, map_params = Calibration.run_calibration(x, y_data_results, y_data_errors, priors, Emulators, output_dir, nburn, nwalkers, npool, Samples)
     
-    Calibration.get_traces(output_dir, x, samples_results, Emulators, parameter_names, percent) 
+        # local: surmise emulators hold a module object and cannot be pickled for a worker
+        figures.submit("traces", Calibration.get_traces, output_dir, x, samples_results, Emulators, parameter_names, percent,
+                       local=True)
 
 if Load_Calibration:
     print("Calibration not performed. Loading Samples.")
-    samples_results, min_samples, map_params= Calibration.load_samples(output_dir, x, Emulators)
+    if Bayes_Engine == "batch_tools":
+        samples_results, min_samples, map_params = GPCalibration.load_samples(output_dir, list(Emulators),
+                                                                               **sample_cuts)
+    else:
+        samples_results, min_samples, map_params= Calibration.load_samples(output_dir, x, Emulators)
+
+if Bayes_Engine == "batch_tools" and (Run_Calibration or Load_Calibration):
+    os.makedirs(f"{output_dir}/plots/calibration/", exist_ok=True)
+    for name, samples in samples_results.items():
+        figures.submit("posterior", GPPlots.posterior_corner, np.asarray(samples), prior_names, lower, upper,
+                       f"{output_dir}/plots/calibration/Posterior_{name}.png", map_point=map_params[name])
 
 ########### Results ###########
 
@@ -197,6 +371,13 @@ if Result_plots:
         print(f"Warning: Minimum samples ({min_samples}) is less than requested size ({size}). Adjusting size to {min_samples}.")
         size = min_samples
 
-    Plots.results(size, x, all_data, samples_results, y_data_results, y_data_errors, Emulators, n_hist, output_dir)
-    
+    if Bayes_Engine == "batch_tools":
+        # prior / posterior predictive bands of every histogram of every system, through the batch_tools emulators
+        figures.submit("results", GPPlots.results, size, layout, x, y_data_results, y_data_errors, samples_results,
+                       Emulators, lower, upper, output_dir, seed)
+    else:
+        figures.submit("results", Plots.results, size, x, all_data, samples_results, y_data_results, y_data_errors,
+                       Emulators, n_hist, output_dir, local=True)
+
+figures.wait()
 print("done")
\ No newline at end of file
@@ -88,6 +88,13 @@ if [ "$DO_GENERATE_DESIGN_POINTS" = true ]; then
     fi
 fi
 
+# === Design points in the current wave (from the design registry) ===
+REGISTRY_POINTS=$(python "$MAIN_DIR/Batch_Rivet/batch_tools/registry.py" --main_dir "$MAIN_DIR" count | tail -n 1)
+if [[ "$REGISTRY_POINTS" =~ ^[0-9]+$ ]] && (( REGISTRY_POINTS > 0 )); then
+    TOTAL_POINTS=$REGISTRY_POINTS
+fi
+echo "📋 Design points in current wave: $TOTAL_POINTS"
+
 # === Background job limiter ===
 function wait_for_slot() {
     while [ "$(jobs -r | wc -l)" -ge "$CPU" ]; do
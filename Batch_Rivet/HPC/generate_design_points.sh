@@ -61,6 +61,14 @@ if [ "$DO_GENERATE_DESIGN_POINTS" = true ]; then
     fi
 fi
 
+# === Design points in the current wave (from the design registry) ===
+REGISTRY_POINTS=$(apptainer exec --bind "$BIND_PATH" "$CONTAINER" \
+    python "$MAIN_DIR/Batch_Rivet/batch_tools/registry.py" --main_dir "$MAIN_DIR" count | tail -n 1)
+if [[ "$REGISTRY_POINTS" =~ ^[0-9]+$ ]] && (( REGISTRY_POINTS > 0 )); then
+    TOTAL_POINTS=$REGISTRY_POINTS
+fi
+echo "📋 Design points in current wave: $TOTAL_POINTS"
+
 # === Submit SLURM jobs ===
 run_jobids_all=()
 declare -A deps_by_batch
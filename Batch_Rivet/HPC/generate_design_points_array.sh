@@ -4,10 +4,22 @@
 DO_GENERATE_DESIGN_POINTS=false
 DO_PT_HAT_BINS=false
 PT_EDGES=(15 20 25 30 40 60) 
+PT_EVENTS=()               # events per pT-hat bin from batch_tools/pthat.py (empty: TOTAL_EVENTS per bin)
+export PT_EVENTS_STR="${PT_EVENTS[*]}"
 DO_BATCH_RUN=false
 DO_RIVET_MERGE=false
 DO_WRITE_INPUTS=true
 
+# === Opt-in modes (set them in the environment or here; the defaults are the static DP slices,
+# === merge_batch_array.slurm with merge.sh and predictions read from the HTML reports) ===
+export WORK_QUEUE=${WORK_QUEUE:-false}   # true: array tasks pull runs from a shared queue instead of fixed DP slices
+export SEED_CHUNKS=${SEED_CHUNKS:-6}     # seed chunks per DP and pT-hat bin, work-queue mode only (the slices run 6)
+MERGE_ENGINE=${MERGE_ENGINE:-merge.sh}   # python: one merge_python.slurm job; merge.sh: merge_batch_array.slurm
+if [ -z "${PREDICTION_SOURCE:-}" ] && [ "$MERGE_ENGINE" = python ]; then
+    PREDICTION_SOURCE=yoda               # python merges write no HTML reports: read the merged YODA files
+fi
+export PREDICTION_SOURCE=${PREDICTION_SOURCE:-html}
+
 DO_DP_RERUN=false
 DP_LIST=(2 4 6 8 14 18)
 DP_SEED=(449862913 449863460 449862913 449863460 449862913 449863460)
@@ -18,6 +30,7 @@ COLLISIONS="pp_200" #"pp_7000 pp_13000"
 TOTAL_POINTS=5        # Total number of design points
 TOTAL_EVENTS=100000    # Total number of events
 NEVENTS=1000000    # Events per job NOT USED ANYMORE
+export SEED_BASE=283  # fixed run seeds: resubmitting after a failure only redoes missing/stale runs
 
 # === PATHS ===
 MAIN_DIR="${WORKDIR:-/workdir}/Detroit_tune_Project"
@@ -55,6 +68,14 @@ if [ "$DO_GENERATE_DESIGN_POINTS" = true ]; then
     fi
 fi
 
+# === Design points in the current wave (from the design registry) ===
+REGISTRY_POINTS=$(apptainer exec --bind "$BIND_PATH" "$CONTAINER" \
+    python "$MAIN_DIR/Batch_Rivet/batch_tools/registry.py" --main_dir "$MAIN_DIR" count | tail -n 1)
+if [[ "$REGISTRY_POINTS" =~ ^[0-9]+$ ]] && (( REGISTRY_POINTS > 0 )); then
+    TOTAL_POINTS=$REGISTRY_POINTS
+fi
+echo "📋 Design points in current wave: $TOTAL_POINTS"
+
 # === Submit SLURM jobs ===
 run_jobids_all=()
 declare -A deps_by_batch
@@ -123,11 +144,15 @@ if [ "$DO_RIVET_MERGE" = true ]; then
         echo "📦 Submitting MERGE with NO dependency (no RUN jobs tracked)"
     fi
 
-    jid=$(sbatch --parsable "${dep_flag[@]}" "$HPC_DIR/merge_batch_array.slurm" "$MAIN_DIR" "$MAIN_SCRIPT" "$COLLISIONS" "$TOTAL_POINTS" "$CONTAINER" "$BIND_PATH")
+    if [ "$MERGE_ENGINE" = python ]; then
+        jid=$(sbatch --parsable "${dep_flag[@]}" "$HPC_DIR/merge_python.slurm" "$MAIN_DIR" "$MAIN_SCRIPT" "$COLLISIONS" "$CONTAINER" "$BIND_PATH" "$DO_PT_HAT_BINS")
+    else
+        jid=$(sbatch --parsable "${dep_flag[@]}" "$HPC_DIR/merge_batch_array.slurm" "$MAIN_DIR" "$MAIN_SCRIPT" "$COLLISIONS" "$TOTAL_POINTS" "$CONTAINER" "$BIND_PATH")
+    fi
     if [[ "$jid" =~ ^[0-9]+$ ]]; then
         merge_jobids_all+=("$jid")
     else
-        echo "❌ sbatch failed for MERGE [$start,$end): $jid"
+        echo "❌ sbatch failed for MERGE: $jid"
     fi
 
 fi
@@ -0,0 +1,87 @@
+from batch_tools import pipeline as Pipeline
+from batch_tools import registry as Registry
+
+import argparse
+import os
+import sys
+
+
+###########################################################
+################### SCRIPT PARAMETERS #####################
+parser = argparse.ArgumentParser(description="Run the Rivet/Bayes workflow as a task DAG.")
+
+parser.add_argument("--main_dir", type=str, default="New_Project")
+parser.add_argument("--Coll_System", nargs="+", default=["pp_7000"],
+                    help="List of collision systems (e.g. pp_7000 pPb_5020); each is an independent branch")
+parser.add_argument("--stages", nargs="+", default=list(Pipeline.STAGES), choices=list(Pipeline.STAGES),
+                    help="Stages to run; dependencies on stages left out are assumed satisfied")
+parser.add_argument("--nsamples", type=int, default=None,
+                    help="Design points of a new wave (design stage); default: size of the latest wave")
+parser.add_argument("--dp_per_task", type=int, default=5, help="Design points per generate/merge task")
+parser.add_argument("--backend", choices=["local", "slurm", "fake"], default="local")
+parser.add_argument("--jobs", type=int, default=1, help="Local backend: tasks running at the same time")
+parser.add_argument("--rivet_args", type=str, default="",
+                    help='Extra Rivet_Main.py arguments for every Rivet task, e.g. "--nevents 100000 --jobs 4"')
+parser.add_argument("--bayes_args", type=str, default="",
+                    help='Extra Bayes_Main.py arguments for every Bayes task, e.g. "--Samples 10000"')
+parser.add_argument("--container", type=str, default=None,
+                    help="Slurm backend: apptainer image every command runs in")
+parser.add_argument("--bind_path", type=str, default=None, help="Slurm backend: apptainer --bind value")
+parser.add_argument("--sbatch_args", type=str, default="",
+                    help='Slurm backend: arguments for every job, e.g. "-A ISAAC-UTK0244 --partition=campus"')
+parser.add_argument("--stage_sbatch", nargs="*", default=[],
+                    help='Slurm backend: per-stage arguments, e.g. generate="--cpus-per-task=4 --time=12:00:00"')
+
+args = parser.parse_args()
+
+main_dir = args.main_dir
+Coll_System = args.Coll_System
+stages = args.stages
+batch_dir = os.path.dirname(os.path.abspath(__file__))
+
+###########################################################
+###########################################################
+
+if "design" in stages:
+    if args.nsamples is None:
+        parser.error("--nsamples is required when the design stage runs")
+    n_points = args.nsamples
+    rivet_args = f"--nsamples {args.nsamples} {args.rivet_args}"
+else:
+    registry = Registry.connect(main_dir)
+    wave = Registry.latest_wave(registry)
+    if not wave:
+        print("❌ No design points in the registry: run the design stage first.")
+        sys.exit(1)
+    n_points = args.nsamples or len(Registry.wave_rows(registry, wave))
+    rivet_args = args.rivet_args
+
+config = {'main_dir': main_dir, 'rivet_main': f"{batch_dir}/Rivet_Main.py", 'bayes_main': f"{batch_dir}/Bayes_Main.py",
+          'systems': Coll_System, 'n_points': n_points, 'dp_per_task': args.dp_per_task,
+          'rivet_args': rivet_args, 'bayes_args': args.bayes_args}
+tasks = Pipeline.expand(config, stages)
+
+work_dir = f"{main_dir}/pipeline"
+if args.backend == "local":
+    backend = Pipeline.LocalBackend(args.jobs, f"{work_dir}/logs")
+else:
+    prefix = ""
+    if args.container:
+        prefix = f"apptainer exec --bind {args.bind_path} {args.container}" if args.bind_path else \
+            f"apptainer exec {args.container}"
+    resources = {}
+    for item in args.stage_sbatch:
+        stage, _, value = item.partition("=")
+        resources[stage] = value.split()
+    if args.backend == "slurm":
+        backend = Pipeline.SlurmBackend(work_dir, prefix, args.sbatch_args, resources)
+    else:
+        backend = Pipeline.FakeBackend(work_dir, prefix, args.sbatch_args, resources)
+
+result = Pipeline.run(tasks, backend)
+
+if args.backend == "fake":
+    for job in backend.jobs:
+        print("   sbatch " + " ".join(job))
+elif args.backend == "local" and any(s != "done" for s in result[0].values()):
+    sys.exit(1)
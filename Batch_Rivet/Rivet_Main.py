@@ -2,13 +2,21 @@ from Bayes_HEP.Design_Points import reader as Reader
 from Bayes_HEP.Design_Points import design_points as DesignPoints
 from Bayes_HEP.Design_Points import plots as Plots
 from Bayes_HEP.Design_Points import rivet_html_parser as RivetParser
+from batch_tools import executor as Executor
+from batch_tools import design as Design
+from batch_tools import registry as Registry
+from batch_tools import rivet_writer as RivetWriter
+from batch_tools import manifest as Manifest
+from batch_tools import adaptive as Adaptive
+from batch_tools import yoda_merge as YodaMerge
+from batch_tools import work_queue as WorkQueue
+from batch_tools import stream as Stream
 
 import argparse
 import os
 import shutil
 import subprocess
 import sys
-import glob
 import random
 import numpy as np
 
@@ -23,6 +31,8 @@ parser.add_argument("--model_seed", type=int, default=283)
 parser.add_argument("--clear_rivet_models", type=lambda x: x.lower() == "true", default=False)
 parser.add_argument("--Get_Design_Points", type=lambda x: x.lower() == "true", default=True)
 parser.add_argument("--nsamples", type=int, default=10)
+parser.add_argument("--Augment_Design", type=lambda x: x.lower() == "true", default=False,
+                    help="Add maximin LHS points that fill gaps left by all existing Design__Rivet__N.dat waves")
 parser.add_argument("--Rivet_Setup", type=lambda x: x.lower() == "true", default=True)
 parser.add_argument("--model", type=str, default="pythia8")
 parser.add_argument("--Run_Model", type=lambda x: x.lower() == "true", default=True)
@@ -30,8 +40,47 @@ parser.add_argument("--Run_Batch", type=lambda x: x.lower() == "true", default=T
 parser.add_argument("--PT_Min", type=int, default=-1)
 parser.add_argument("--PT_Max", type=int, default=-1)
 parser.add_argument("--nevents", type=int, default=1000)
+parser.add_argument("--jobs", type=int, default=1,
+                    help="Number of model runs / writer processes to use in parallel on this node")
+parser.add_argument("--seed_chunks", type=int, default=1,
+                    help="Independent seed chunks per design point (each runs nevents)")
+parser.add_argument("--PT_Edges", nargs="*", type=int, default=[],
+                    help="pT-hat bin edges; the last bin is open ended (overrides PT_Min/PT_Max)")
+parser.add_argument("--Adaptive_Events", type=lambda x: x.lower() == "true", default=False,
+                    help="Run each DP in chunks of nevents until the MC errors reach --Target_Rel_Error")
+parser.add_argument("--Target_Rel_Error", type=float, default=0.05,
+                    help="Adaptive mode: target relative error of the analyses_list.txt histograms")
+parser.add_argument("--Error_Quantile", type=float, default=0.9,
+                    help="Adaptive mode: fraction of bins that must be within the target")
+parser.add_argument("--Max_Chunks", type=int, default=10,
+                    help="Adaptive mode: maximum number of nevents chunks per DP")
+parser.add_argument("--PT_Events", nargs="*", type=int, default=[],
+                    help="Events per pT-hat bin (one per PT_Edges bin, e.g. from pthat.py); default nevents for all")
+parser.add_argument("--Stitch_PT_Bins", type=lambda x: x.lower() == "true", default=False,
+                    help="Merge pT-hat bins with cross-section weights in python instead of merge.sh "
+                         "(implies --Merge_Engine python)")
+parser.add_argument("--Work_Queue", type=lambda x: x.lower() == "true", default=False,
+                    help="Claim model runs of all DPs from a shared queue in the registry instead of a fixed DP slice")
+parser.add_argument("--Heartbeat", type=int, default=60, help="Work queue: seconds between heartbeats of claimed runs")
+parser.add_argument("--Stale_After", type=int, default=900,
+                    help="Work queue: seconds without heartbeat after which a claimed run is given to another worker")
+parser.add_argument("--Max_Attempts", type=int, default=3, help="Work queue: tries per run before it is marked failed")
+parser.add_argument("--Stream_Events", type=lambda x: x.lower() == "true", default=False,
+                    help="Pipe generator HepMC straight into rivet through a node-local FIFO instead of run_<model>.sh")
+parser.add_argument("--Stream_Generator", choices=list(Stream.GENERATORS), default="pythia8",
+                    help="Streaming mode: event generator (toy is a stand-in for tests)")
+parser.add_argument("--log_dir", type=str, default=None,
+                    help="Per-task log directory for --jobs > 1 (default: <main_dir>/rivet/logs)")
 parser.add_argument("--Rivet_Merge", type=lambda x: x.lower() == "true", default=True)
+parser.add_argument("--Merge_Engine", choices=["merge.sh", "python"], default="merge.sh",
+                    help="Merge seed chunks with merge.sh per DP, or in python with all DPs in a --jobs process pool")
+parser.add_argument("--Make_HTML", type=lambda x: x.lower() == "true", default=True,
+                    help="Render the mkhtml.sh report of every merged DP (needed for --Prediction_Source html)")
 parser.add_argument("--Write_input_Rivet", type=lambda x: x.lower() == "true", default=True)
+parser.add_argument("--Prediction_Source", choices=["html", "yoda"], default="html",
+                    help="Read predictions from the HTML reports or directly from the merged YODA files")
+parser.add_argument("--Force_Rerun", type=lambda x: x.lower() == "true", default=False,
+                    help="Redo every stage even if the manifest says its outputs are complete and valid")
 parser.add_argument("--Coll_System", nargs="+", default=["pp_7000"],
                     help="List of collision systems (e.g. pp_7000 pPb_5020)")
 
@@ -48,6 +97,7 @@ model_seed = args.model_seed
 clear_rivet_models = args.clear_rivet_models
 Get_Design_Points = args.Get_Design_Points
 nsamples = args.nsamples
+Augment_Design = args.Augment_Design
 Rivet_Setup = args.Rivet_Setup
 model = args.model
 Run_Model = args.Run_Model
@@ -55,8 +105,27 @@ Run_Batch = args.Run_Batch
 PT_Min = args.PT_Min
 PT_Max = args.PT_Max
 nevents = args.nevents
+jobs = args.jobs
+seed_chunks = args.seed_chunks
+PT_Edges = args.PT_Edges
+PT_Events = args.PT_Events
+Adaptive_Events = args.Adaptive_Events
+Target_Rel_Error = args.Target_Rel_Error
+Error_Quantile = args.Error_Quantile
+Max_Chunks = args.Max_Chunks
+Work_Queue = args.Work_Queue
+Heartbeat = args.Heartbeat
+Stale_After = args.Stale_After
+Max_Attempts = args.Max_Attempts
+Stream_Events = args.Stream_Events
+Stream_Generator = args.Stream_Generator
+log_dir = args.log_dir or f"{main_dir}/rivet/logs"
 Rivet_Merge = args.Rivet_Merge
+Merge_Engine = "python" if args.Stitch_PT_Bins else args.Merge_Engine
+Make_HTML = args.Make_HTML
 Write_input_Rivet = args.Write_input_Rivet
+Prediction_Source = args.Prediction_Source
+Force_Rerun = args.Force_Rerun
 batch_start = args.batch_start
 batch_end = args.batch_end if args.batch_end is not None else nsamples
 Coll_System = args.Coll_System
@@ -72,74 +141,65 @@ if clear_rivet_models and os.path.exists(models_dir):
 
 # ############## Design Points ####################
 
+# Only the design stage picks up Design__Rivet__N.dat waves added by hand; array tasks never scan the directory
+registry = Registry.connect(main_dir, import_designs=Get_Design_Points)
+
 if Get_Design_Points: 
     print("Generating design points.")
     os.makedirs(f"{main_dir}/input/Design", exist_ok=True)
 
-    index_numbers = []
-    index_files = glob.glob(f"{main_dir}/input/Design/Design__Rivet__*.dat")
-    for file in index_files:
-        num = int(file.split("__")[-1].split(".")[0])
-        index_numbers.append(num)
-
-    max_index = max(index_numbers) if index_numbers else 0
-    max_index = max_index + 1 
+    RawDesign = Reader.ReadDesign(f'{main_dir}/input/Rivet/parameter_prior_list.dat')
+    priors, parameter_names, dim = DesignPoints.get_prior(RawDesign)
+    existing_rows = Registry.all_design_rows(registry)
+
+    if Augment_Design:
+        _, lower, upper = Design.read_prior_ranges(f"{main_dir}/input/Rivet/parameter_prior_list.dat")
+        existing_points = Registry.rows_to_array(existing_rows, len(lower))
+        print(f"Augmenting {len(existing_points)} existing design points with {nsamples} new points.")
+        design_points = Design.augment_maximin_lhs(existing_points, nsamples, lower, upper, seed)
+        print(f"🟢 Minimum scaled distance to existing/new points: "
+              f"{Design.min_distance(design_points, existing_points, lower, upper):.3f}")
+    else:
+        existing_rows = set(existing_rows)
+
+        run_duplicate_check = True
+        while run_duplicate_check:
+            design_points = DesignPoints.get_design(nsamples, priors, seed)
+            design_points = np.atleast_2d(design_points)
+            current_rows = {Registry.format_row(row) for row in design_points}
+            if current_rows.isdisjoint(existing_rows):
+                print("🟢 No duplicates detected")
+                run_duplicate_check = False
+            else:
+                print("🟡 Duplicates detected, re-generating design_points")
+                seed = random.randint(1, 2**32 - 1)
+
+    max_index = Registry.new_wave(registry, design_points, parameter_names, seed)
 
     Design_file = f'Design__Rivet__{max_index}.dat'
     output_file = f'{main_dir}/input/Design/{Design_file}'
     shutil.copy(f"{main_dir}/input/Rivet/parameter_prior_list.dat", output_file)
 
-    RawDesign = Reader.ReadDesign(f'{main_dir}/input/Rivet/parameter_prior_list.dat')
-    priors, parameter_names, dim = DesignPoints.get_prior(RawDesign)
-    
-    existing_rows = set()
-    for oldfile in glob.glob(f"{main_dir}/input/Design/*.dat"):
-        with open(oldfile) as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith("#"):
-                    continue
-                existing_rows.add(line)
-    
-    run_duplicate_check = True 
-    while run_duplicate_check:
-        design_points = DesignPoints.get_design(nsamples, priors, seed)
-        design_points = np.atleast_2d(design_points)  
-        current_rows = {' '.join(f"{val:.18e}" for val in row) for row in design_points}
-        if current_rows.isdisjoint(existing_rows):
-            print("🟢 No duplicates detected")
-            run_duplicate_check = False        
-        else:
-            print("🟡 Duplicates detected, re-generating design_points")
-            seed = random.randint(1, 2**32 - 1) 
-
     with open(output_file, 'a') as f:
         index_line = '\n' + "# Design point indices (row index): " + ' '.join(str(i) for i in range(len(design_points))) + '\n'
         f.write(f"\n\n# LHS Seed = {seed}; Number of Design Points = {nsamples}")
         f.write(index_line)
         for row in design_points:
-            f.write(' '.join(f"{val:.18e}" for val in row) + '\n')
+            f.write(Registry.format_row(row) + '\n')
     print(f"Appended {len(design_points)} design points to {output_file}")
 
 else:
-    print("Loading design points from input directory.")
+    print("Loading design points from the design registry.")
 
-    index_numbers = []
-    index_files = glob.glob(f"{main_dir}/input/Design/Design__Rivet__*.dat")
-    for file in index_files:
-        num = int(file.split("__")[-1].split(".")[0])
-        index_numbers.append(num)
-
-    if not index_numbers:  
+    max_index = Registry.latest_wave(registry)
+    if not max_index:
         print("No Design files in directory. Please generate design points.")
         sys.exit(1)
 
-    max_index = max(index_numbers)
-
-    Design_file = f'Design__Rivet__{max_index}.dat'
-    RawDesign = Reader.ReadDesign(f'{main_dir}/input/Design/{Design_file}')
+    RawDesign = Reader.ReadDesign(f'{main_dir}/input/Rivet/parameter_prior_list.dat')
     priors, parameter_names, dim = DesignPoints.get_prior(RawDesign)
-    design_points = np.atleast_2d(RawDesign['Design'])  
+    design_points = Registry.rows_to_array(Registry.wave_rows(registry, max_index), len(parameter_names))
+    print(f"Loaded {len(design_points)} design points of wave DG_{max_index}.")
 
 ################# Rivet Analyses ####################
 input_dir = f'{main_dir}/input/Rivet'
@@ -178,6 +238,16 @@ missing_systems = [sys for sys in Coll_System if sys not in analyses_list]
 if missing_systems:
     raise ValueError(f"❌ Missing analyses for the following system(s): {missing_systems}")
 
+hist_keys = {system: [(analysis, hist) for analysis in analyses_list[system] for hist in tagged_analyses[system][analysis]]
+             for system in Coll_System}
+
+
+def merge_dp(system, dp):
+    """Merge one DP in python (stitching its recorded pT-hat bins) or with merge.sh, skipped if up to date."""
+    if Merge_Engine == "python":
+        return YodaMerge.merge_dp(registry, max_index, project_dir, model, system, dp, Force_Rerun)
+    return Manifest.merge_dp(registry, max_index, project_dir, model, system, dp, Force_Rerun)
+
    
 if Rivet_Setup:
     all_analyses = []
@@ -189,7 +259,7 @@ if Rivet_Setup:
     # Run the analysis build script
     subprocess.run([
         'bash',
-        '/usr/local/share/Bayes_HEP/Design_Points/Rivet_Analyses/run_analysis.sh',
+        Executor.share_path('Design_Points', 'Rivet_Analyses', 'run_analysis.sh'),
         ','.join(all_analyses),
         project_dir
     ], check=True)
@@ -221,41 +291,78 @@ if Run_Model:
         batch_start = 0
         batch_end = len(design_points)
 
-    for system in Coll_System:
-        if system not in analyses_list:
-            print(f"⚠️ No analyses defined for system: {system}")
-            continue
-
-        System, Energy = system.split('_')
-        print("🧪 Running model for system:", system)
-
-        system_analyses = analyses_list[system]
-        if not system_analyses:
-            print(f"⚠️ No analyses listed for {system}")
-            continue
-
-        for i in range(batch_start, min(batch_end, len(design_points))):
-            point = design_points[i]
-
-            print(f"Running {model} for Design Point {i+1}: {point}")
-            param_tag = DesignPoints.generate_param_tag(parameter_names, design_points[i])
-            merge_tag = f"DP_{i+1}"
-            model_seed_DP = model_seed * 10 + i 
-
-            subprocess.run([
-                'bash',
-                f'/usr/local/share/Bayes_HEP/Design_Points/Models/{model}/scripts/run_{model}.sh',
-                ','.join(system_analyses), input_dir, project_dir, System, Energy, str(nevents), str(model_seed), param_tag, merge_tag, str(PT_Min), str(PT_Max)], check=True)
+    print("🧪 Running model for systems:", Coll_System)
+
+    pt_bins = Executor.pt_hat_bins(PT_Edges, PT_Min, PT_Max)
+    if PT_Events and len(PT_Events) != len(pt_bins):
+        raise ValueError(f"❌ --PT_Events needs one count per pT-hat bin ({len(pt_bins)}), got {len(PT_Events)}")
+    bin_events = PT_Events or nevents
+    dp_range = range(batch_start, min(batch_end, len(design_points)))
+
+    if Stream_Events and not Stream.available(Stream_Generator):
+        print(f"⚠️ rivet or {Stream_Generator} not available: running run_{model}.sh with event files instead.")
+        Stream_Events = False
+    if Stream_Events and Merge_Engine != "python":
+        print("⚠️ Streamed runs are merged from the manifest: use --Merge_Engine python to merge them.")
+
+    def model_tasks(dps, n_chunks, chunks=None):
+        tasks = Executor.build_model_tasks(model, Coll_System, analyses_list, design_points, parameter_names,
+                                           DesignPoints.generate_param_tag, input_dir, project_dir, bin_events,
+                                           model_seed, pt_bins, n_chunks, dps, chunks)
+        if Stream_Events:
+            tasks = [Stream.stream_task(task, design_points[task['dp'] - 1], parameter_names, input_dir, project_dir,
+                                        model, Stream_Generator) for task in tasks]
+        return tasks
+
+    if Adaptive_Events:
+        # Chunks of nevents per DP until the histogram errors reach the target (or Max_Chunks).
+        results, _ = Adaptive.run_adaptive(
+            lambda chunk: model_tasks(dp_range, Max_Chunks, [chunk]),
+            lambda tasks: Manifest.run_model_tasks(registry, max_index, tasks, project_dir, model, nevents, jobs,
+                                                   log_dir, Force_Rerun),
+            merge_dp, hist_keys, [i + 1 for i in dp_range], Target_Rel_Error, Error_Quantile, Max_Chunks)
+    elif Work_Queue:
+        # Every worker enqueues all runs of the wave (idempotent), then pulls units until none is left.
+        tasks = model_tasks(range(len(design_points)), seed_chunks)
+        queue = WorkQueue.connect(main_dir)
+        print(f"📥 Queued {WorkQueue.enqueue(queue, max_index, tasks)} new model runs of DG_{max_index}")
+        results = WorkQueue.run_worker(main_dir, max_index, project_dir, model, nevents, jobs, log_dir, Force_Rerun,
+                                       Heartbeat, Stale_After, Max_Attempts)
+        queue_state = WorkQueue.counts(queue, max_index)
+        print(f"📊 Queue: {queue_state}")
+    else:
+        tasks = model_tasks(dp_range, seed_chunks)
+        results = Manifest.run_model_tasks(registry, max_index, tasks, project_dir, model, nevents, jobs, log_dir,
+                                           Force_Rerun)
+    failed = Executor.print_summary(results)
+    if Work_Queue and not Adaptive_Events and not queue_state.get('failed'):
+        failed = []  # released runs were retried by a worker and succeeded
+    if failed:
+        print(f"❌ {len(failed)} model runs failed.")
+        sys.exit(1)
 
 
 ############# Rivet Merge/HTML #################
 if Rivet_Merge:
+    if not Make_HTML and Prediction_Source == "html":
+        print("⚠️ --Make_HTML false with --Prediction_Source html: existing HTML reports will be used.")
+    if Merge_Engine == "python" and Prediction_Source != "yoda":
+        print("⚠️ Python merges are only read with --Prediction_Source yoda.")
     if args.Run_Batch:
         batch_start = args.batch_start
         batch_end = args.batch_end if args.batch_end is not None else len(design_points)
     else:
         batch_start = 0
         batch_end = len(design_points)
+    batch_dps = [i + 1 for i in range(batch_start, min(batch_end, len(design_points)))]
+
+    # Python merges of every DP in one process pool; the loop below then only renders reports.
+    if Merge_Engine == "python":
+        failed = YodaMerge.merge_dps(registry, max_index, project_dir, model, Coll_System, batch_dps, jobs,
+                                     Force_Rerun)
+        if failed:
+            print(f"❌ {len(failed)} merges failed.")
+            sys.exit(1)
 
     for system in Coll_System:
         System, Energy = system.split('_')
@@ -273,11 +380,20 @@ if Rivet_Merge:
             
             merge_tag = f"DP_{i+1}"
 
-            # Merge results
-            subprocess.run(['bash', '/usr/local/share/Bayes_HEP/Design_Points/Rivet_Analyses/merge.sh', project_dir, model, System, Energy, merge_tag], check=True)
-            
+            # Merge results (only if the model runs changed since the last merge)
+            if Merge_Engine == "merge.sh":
+                merge_dp(system, i + 1)
+
             # Generate HTML report
-            subprocess.run(['bash', '/usr/local/share/Bayes_HEP/Design_Points/Rivet_Analyses/mkhtml.sh', project_dir, model, System, Energy, merge_tag], check=True)
+            if Make_HTML:
+                report_inputs = Manifest.upstream(registry, max_index, i + 1, system, 'merge')
+                if Force_Rerun or not Manifest.is_complete(registry, max_index, i + 1, system, 'report', report_inputs):
+                    subprocess.run(['bash', Executor.share_path('Design_Points', 'Rivet_Analyses', 'mkhtml.sh'), project_dir, model, System, Energy, merge_tag], check=True)
+                    Manifest.record(registry, max_index, i + 1, system, 'report', report_inputs,
+                                    RivetWriter.source_files(project_dir, model, system, system_analyses,
+                                                             tagged_analyses[system], i + 1, 'html'))
+                else:
+                    print(f"⏭️ {system} {merge_tag}: HTML report is up to date")
             
 ############# Write out Data/Prediction Files #################
 if Write_input_Rivet:
@@ -285,29 +401,24 @@ if Write_input_Rivet:
     os.makedirs(f"{main_dir}/input/Prediction", exist_ok=True)
     
     for system in Coll_System:
-        System, Energy = system.split('_')
-
-        system_analyses = analyses_list[system]
+        # Data/Prediction files hold every DP: rewrite them if any source file changed.
+        DPs = range(1, len(design_points) + 1)
+        sources = {DP: Manifest.hash_files(registry, RivetWriter.source_files(
+            project_dir, model, system, analyses_list[system], tagged_analyses[system], DP, Prediction_Source))
+            for DP in DPs}
+        write_fingerprint = Manifest.fingerprint(stage='write', source=Prediction_Source, histograms=tagged_analyses[system],
+                                            sources=sources)
+        if not Force_Rerun and all(Manifest.is_complete(registry, max_index, DP, system, 'write', write_fingerprint)
+                                   for DP in DPs):
+            print(f"⏭️ {system}: Data/Prediction files are up to date")
+            continue
 
-        for i, point in enumerate(design_points):
-            DP = i + 1
-            skip_dp = False
-            for analysis in system_analyses:
-                for hist in tagged_analyses[system][analysis]:
-                    Experiment = analysis.split('_')[0]
-                    base = f"{project_dir}/Models/{model}/html_reports/{model}_{System}_{Energy}_DP_{DP}_report.html/{analysis}/{hist}"
-                    datafile = base + "__data.py"
-                    labelfile = base + ".py"
-                    if not os.path.exists(datafile):
-                        print(f"[WARN] Missing data file for DP {DP}: {datafile} — skipping DP {DP}")
-                        skip_dp = True
-                        break
-
-                    obs, subobs = RivetParser.extract_labels(labelfile)
-
-                    input_data_name = f"{main_dir}/input/Data/Data__{Energy}__{System}__{analysis}__{hist}"
-                    input_pred_name = f"{main_dir}/input/Prediction/Prediction__{model}__{Energy}__{System}__{analysis}__{hist}__DG_{max_index}"
-
-                    RivetParser.extract_data(datafile, model, input_data_name, input_pred_name, obs, subobs, DP)
+        status = RivetWriter.write_inputs(main_dir, project_dir, model, system, analyses_list[system],
+                                          tagged_analyses[system], len(design_points), max_index, jobs,
+                                          Prediction_Source)
+        outputs = RivetWriter.output_files(main_dir, model, system, analyses_list[system], tagged_analyses[system],
+                                           max_index)
+        for DP, st in status.items():
+            Manifest.record(registry, max_index, DP, system, 'write', write_fingerprint, outputs, st)
 
 print("done")
\ No newline at end of file
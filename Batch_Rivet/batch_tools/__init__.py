@@ -0,0 +1 @@
+"""Helpers shared by the Batch_Rivet drivers (Rivet_Main.py, Bayes_Main.py)."""
@@ -0,0 +1,96 @@
+"""Adaptive event allocation for the Run_Model stage.
+
+Each design point is generated in seed chunks of ``nevents`` events.  After
+every round the new chunks are merged and the relative MC errors of the
+histograms listed in analyses_list.txt are checked: a DP stops once the chosen
+quantile of its per-bin relative errors is at or below the target, or when the
+chunk cap is reached.  DPs that converge quickly free their slots for the rest.
+Empty bins (nothing expected there, e.g. far tails) do not count, and a DP
+whose model runs fail is dropped from the following rounds on its own.
+"""
+
+import numpy as np
+
+from batch_tools import yoda_io as YodaIO
+
+
+def relative_errors(y, yerr):
+    """Per-bin yerr / |y|; NaN for empty bins, which carry no precision to reach."""
+    y, yerr = np.abs(np.asarray(y, dtype=float)), np.asarray(yerr, dtype=float)
+    rel = np.full(len(y), np.nan)
+    filled = y > 0
+    rel[filled] = yerr[filled] / y[filled]
+    return rel
+
+
+def _quantile(values, q):
+    """Upper quantile without interpolation, so infinite entries stay well defined."""
+    if len(values) == 0:
+        return np.inf
+    values = np.sort(values)
+    return float(values[min(max(int(np.ceil(q * len(values))) - 1, 0), len(values) - 1)])
+
+
+def precision(yoda_file, keys, quantile=0.9):
+    """(overall, {key: value}): ``quantile`` of the relative errors of the filled bins of the listed histograms.
+
+    A missing histogram counts as infinitely uncertain; an entirely empty one is NaN and left out.
+    """
+    found = YodaIO.read_histograms(yoda_file, keys) if yoda_file else {}
+    per_hist, rel_all = {}, []
+    for key in keys:
+        if key not in found:
+            per_hist[key] = np.inf
+            continue
+        rel = relative_errors(found[key][2], found[key][3])
+        rel = rel[~np.isnan(rel)]
+        per_hist[key] = _quantile(rel, quantile) if len(rel) else np.nan
+        rel_all.append(rel)
+    overall = _quantile(np.concatenate(rel_all), quantile) if len(rel_all) == len(keys) else np.inf
+    return overall, per_hist
+
+
+def chunks_needed(error, target, chunks_done):
+    """Chunks a DP needs in total if its errors keep falling like 1/sqrt(N)."""
+    if not np.isfinite(error):
+        return None
+    return int(np.ceil(chunks_done * (error / target) ** 2))
+
+
+def run_adaptive(build_tasks, run, merge, keys_by_system, dps, target, quantile=0.9, max_chunks=10):
+    """Generate chunks round by round until every (system, DP) meets ``target``.
+
+    ``build_tasks(chunk)`` returns the model tasks of one seed chunk for all DPs,
+    ``run(tasks)`` runs them and returns the run records, and ``merge(system, dp)``
+    merges a DP and returns its YODA file.  Returns (run records, {(system, dp): (chunks, error)}).
+    """
+    active = {(system, dp) for system in keys_by_system for dp in dps}
+    summary, results = {}, []
+    for chunk in range(max_chunks):
+        if not active:
+            break
+        tasks = [task for task in build_tasks(chunk) if (task['system'], task['dp']) in active]
+        print(f"🔁 Round {chunk + 1}/{max_chunks}: {len(active)} design point(s) not yet at target")
+        round_results = run(tasks)
+        results += round_results
+        failed = {(r['system'], r['dp']) for r in round_results if r['returncode'] != 0 or r['error']}
+        for system, dp in sorted(failed):
+            print(f"❌ {system} DP_{dp}: model runs failed; dropped from adaptive generation")
+            summary[(system, dp)] = (chunk + 1, np.inf)
+        active -= failed
+
+        for system, dp in sorted(active):
+            error, per_hist = precision(merge(system, dp), keys_by_system[system], quantile)
+            summary[(system, dp)] = (chunk + 1, error)
+            if error <= target:
+                print(f"✅ {system} DP_{dp}: {quantile:.0%} of bins within {error:.2%} after {chunk + 1} chunk(s)")
+                active.discard((system, dp))
+                continue
+            worst = max(per_hist, key=lambda key: -1.0 if np.isnan(per_hist[key]) else per_hist[key])
+            needed = chunks_needed(error, target, chunk + 1)
+            print(f"   {system} DP_{dp}: {error:.2%} (target {target:.2%}), worst {'/'.join(worst)} "
+                  f"{per_hist[worst]:.2%}" + (f", ~{needed} chunk(s) needed" if needed else ""))
+
+    for system, dp in sorted(active):
+        print(f"⚠️ {system} DP_{dp}: chunk cap reached at {summary.get((system, dp), (0, np.inf))[1]:.2%}")
+    return results, summary
@@ -0,0 +1,553 @@
+"""Emulator-based Bayesian calibration with a walker-batched likelihood.
+
+``Likelihood`` evaluates the whole emcee ensemble at once: one emulator
+prediction for all walkers inside the prior box, then one batched residual /
+covariance solve.  With experimental errors only (diagonal covariance) the
+solve is element-wise; with a full data covariance it is a stacked Cholesky
+factorisation.
+
+For PCGP emulators the covariance is
+
+    Sigma(theta) = A + B diag(v(theta)) B^T,   A = data covariance + variance of the dropped PCs
+
+with B the (scaled) PC basis, n x k.  A is factorised once and everything
+is whitened by it up front, so with the Woodbury identity and the matrix
+determinant lemma a likelihood call only needs k x k algebra per walker
+instead of an n x n factorisation.  ``run_calibration`` drives ``emcee`` in ``vectorize=True``
+mode, so a step costs one call however many walkers there are.
+
+Chains are checkpointed to ``output/calibration/chains/<emulator>`` in
+chunks (``ChainStore``), together with the sampler state, so an interrupted
+run resumes from its last checkpoint; samples and traces are streamed back
+from the chunks.
+
+``run_smc`` is an alternative to emcee for multimodal posteriors: adaptive
+tempered sequential Monte Carlo whose particle batches are evaluated on a
+process pool.  It also estimates the log evidence, and its final particles
+go to the same chain store, so ``load_samples`` reads either.
+
+``JointLikelihood`` calibrates several collision systems at once: their
+observables are stacked (see observables.py), the covariance is block
+diagonal over the systems and each block keeps its own emulator.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+LOG_2PI = np.log(2 * np.pi)
+
+
+############################ Likelihood ############################
+
+class Likelihood:
+    """log posterior of parameter vectors given the data, an emulator and a uniform prior box.
+
+    ``y_err`` is either the experimental errors (n,) or a full covariance (n, n).
+    The emulator variance is added to the data covariance unless ``emulator_var`` is False.
+    """
+
+    def __init__(self, emulator, y_data, y_err, lower, upper, emulator_var=True):
+        self.emulator = emulator
+        self.y = np.ravel(np.asarray(y_data, dtype=float))
+        err = np.asarray(y_err, dtype=float)
+        self.diagonal = err.ndim < 2 or err.shape[0] != err.shape[1] or err.shape[0] != len(self.y)
+        self.data_var = np.ravel(err) ** 2 if self.diagonal else err
+        self.lower, self.upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+        self.emulator_var = emulator_var
+        self.low_rank = getattr(emulator, 'basis', None) is not None
+        if self.low_rank:
+            self._precompute()
+
+    def _precompute(self):
+        """Whiten by the constant part A of the covariance, once."""
+        emulator = self.emulator
+        n = len(self.y)
+        residual_var = emulator.residual_var if self.emulator_var else np.zeros(n)
+        basis = emulator.basis * emulator.scale[:, None]
+        y0 = self.y - emulator.mean
+        if self.diagonal:
+            a = self.data_var + residual_var
+            w, r = basis / np.sqrt(a)[:, None], y0 / np.sqrt(a)
+            self.logdet_a = np.sum(np.log(a))
+        else:
+            from scipy.linalg import solve_triangular
+
+            chol = np.linalg.cholesky(self.data_var + np.diag(residual_var))
+            w = solve_triangular(chol, basis, lower=True)
+            r = solve_triangular(chol, y0, lower=True)
+            self.logdet_a = 2 * np.sum(np.log(np.diag(chol)))
+        self.gram = w.T @ w       # k x k
+        self.proj = w.T @ r       # k
+        self.norm = r @ r
+
+    def inside(self, theta):
+        return np.all((theta >= self.lower) & (theta <= self.upper), axis=1)
+
+    def fingerprint(self):
+        """{'emulators': [training fingerprints], 'data': hash of y_data, y_err and the prior box}."""
+        key = getattr(self.emulator, 'key', None) or hashlib.sha256(pickle.dumps(self.emulator)).hexdigest()
+        return {"emulators": [key],
+                "data": _hash(self.y, self.data_var, self.lower, self.upper, str(self.emulator_var).encode())}
+
+    def __call__(self, theta):
+        """log posterior of one vector (dim,) or of a walker batch (W, dim)."""
+        theta = np.asarray(theta, dtype=float)
+        single = theta.ndim == 1
+        theta = np.atleast_2d(theta)
+        logp = np.full(len(theta), -np.inf)
+        inside = self.inside(theta)
+        if inside.any():
+            logp[inside] = self.log_likelihood(theta[inside])
+        return logp[0] if single else logp
+
+    def log_likelihood(self, theta):
+        if self.low_rank:
+            return self._log_likelihood_low_rank(theta)
+        mean, var = self.emulator.predict(theta)
+        residual = self.y - mean
+        if not self.emulator_var:
+            var = np.zeros_like(var)
+        if self.diagonal:
+            total = self.data_var + var
+            return -0.5 * (np.sum(residual ** 2 / total, axis=1) + np.sum(np.log(total), axis=1) + len(self.y) * LOG_2PI)
+        cov = self.data_var[None, :, :] + var[:, :, None] * np.eye(len(self.y))[None]
+        chol = np.linalg.cholesky(cov)
+        z = np.linalg.solve(chol, residual[:, :, None])[:, :, 0]
+        logdet = 2 * np.sum(np.log(np.diagonal(chol, axis1=1, axis2=2)), axis=1)
+        return -0.5 * (np.sum(z ** 2, axis=1) + logdet + len(self.y) * LOG_2PI)
+
+    def _log_likelihood_low_rank(self, theta):
+        z, v = self.emulator.predict_components(theta)  # W x k
+        gz = z @ self.gram
+        # Whitened residual r - W z: |.|^2 and its projection u = W^T (r - W z)
+        quad = self.norm - 2 * z @ self.proj + np.einsum('ij,ij->i', z, gz)
+        logdet = np.full(len(z), self.logdet_a)
+        if self.emulator_var:
+            u = self.proj - gz
+            capacitance = self.gram[None] + np.einsum('ij,jk->ijk', 1 / v, np.eye(len(self.gram)))
+            chol = np.linalg.cholesky(capacitance)
+            c = np.linalg.solve(chol, u[:, :, None])[:, :, 0]
+            quad -= np.sum(c ** 2, axis=1)
+            logdet += 2 * np.sum(np.log(np.diagonal(chol, axis1=1, axis2=2)), axis=1) + np.sum(np.log(v), axis=1)
+        return -0.5 * (quad + logdet + len(self.y) * LOG_2PI)
+
+
+class JointLikelihood(Likelihood):
+    """log posterior over several systems: block-diagonal covariance, so the sum of the per-system terms.
+
+    Every ``Likelihood`` keeps its own emulator and factorisation; they must
+    share the prior box.
+    """
+
+    def __init__(self, likelihoods):
+        self.likelihoods = list(likelihoods)
+        first = self.likelihoods[0]
+        for likelihood in self.likelihoods[1:]:
+            if not (np.array_equal(likelihood.lower, first.lower) and np.array_equal(likelihood.upper, first.upper)):
+                raise ValueError("The systems of a joint calibration need the same prior box")
+        self.lower, self.upper = first.lower, first.upper
+        self.y = np.concatenate([likelihood.y for likelihood in self.likelihoods])
+
+    def log_likelihood(self, theta):
+        return sum(likelihood.log_likelihood(theta) for likelihood in self.likelihoods)
+
+    def fingerprint(self):
+        parts = [likelihood.fingerprint() for likelihood in self.likelihoods]
+        return {"emulators": [key for part in parts for key in part["emulators"]],
+                "data": _hash(*(part["data"].encode() for part in parts))}
+
+
+def _hash(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            part = np.ascontiguousarray(part, dtype=np.float64)
+            h.update(str(part.shape).encode())
+            part = part.tobytes()
+        h.update(part)
+    return h.hexdigest()
+
+
+############################ Chain store ############################
+
+class ChainStore:
+    """Chunked on-disk chain: ``chain_NNNNN.npy`` (steps, walkers, dim), ``log_prob_NNNNN.npy``,
+    the sampler state to resume from (``state.pkl``) and ``meta.json``.
+
+    Each checkpoint writes its chunk, then the state, then the metadata, so a run
+    killed half-way resumes from the last complete checkpoint.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.meta_file = os.path.join(path, "meta.json")
+        self.meta = None
+        if os.path.exists(self.meta_file):
+            with open(self.meta_file) as f:
+                self.meta = json.load(f)
+
+    def compatible(self, nwalkers, dim, thin, posterior=None):
+        """True if the stored emcee chain has these walkers/dim/thin and samples the same ``posterior``
+        (``Likelihood.fingerprint()``: emulators, data, errors and prior box)."""
+        return self.meta is not None and self.meta.get("sampler", "emcee") == "emcee" and \
+            [self.meta[k] for k in ("nwalkers", "dim", "thin")] == [nwalkers, dim, thin] and \
+            self.meta.get("posterior") == posterior
+
+    def create(self, nwalkers, dim, thin=1, float32=False, sampler="emcee", posterior=None):
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path)
+        self.meta = {"sampler": sampler, "nwalkers": nwalkers, "dim": dim, "thin": thin,
+                     "dtype": "float32" if float32 else "float64", "chunks": [], "steps": 0, "posterior": posterior}
+        self._write_meta()
+
+    def _write_meta(self):
+        with open(self.meta_file + ".tmp", 'w') as f:
+            json.dump(self.meta, f, indent=1)
+        os.replace(self.meta_file + ".tmp", self.meta_file)
+
+    def append(self, chain, log_prob, state, steps):
+        """Store a chunk of (thinned) steps and the state after ``steps`` sampler steps."""
+        k = len(self.meta["chunks"])
+        np.save(os.path.join(self.path, f"chain_{k:05d}.npy"), chain.astype(self.meta["dtype"]))
+        np.save(os.path.join(self.path, f"log_prob_{k:05d}.npy"), log_prob.astype(self.meta["dtype"]))
+        with open(os.path.join(self.path, "state.pkl.tmp"), 'wb') as f:
+            pickle.dump({"coords": state.coords, "log_prob": state.log_prob, "random_state": state.random_state}, f)
+        os.replace(os.path.join(self.path, "state.pkl.tmp"), os.path.join(self.path, "state.pkl"))
+        self.meta["chunks"].append(len(chain))
+        self.meta["steps"] = steps
+        self._write_meta()
+
+    def state(self):
+        import emcee
+
+        with open(os.path.join(self.path, "state.pkl"), 'rb') as f:
+            saved = pickle.load(f)
+        return emcee.State(saved["coords"], log_prob=saved["log_prob"], random_state=saved["random_state"])
+
+    def chunks(self, discard=0):
+        """(chain, log_prob) memory-mapped chunks, skipping the first ``discard`` stored steps."""
+        for k, n in enumerate(self.meta["chunks"] if self.meta else []):
+            if discard >= n:
+                discard -= n
+                continue
+            chain = np.load(os.path.join(self.path, f"chain_{k:05d}.npy"), mmap_mode='r')
+            log_prob = np.load(os.path.join(self.path, f"log_prob_{k:05d}.npy"), mmap_mode='r')
+            yield chain[discard:], log_prob[discard:]
+            discard = 0
+
+    def stored(self):
+        return sum(self.meta["chunks"]) if self.meta else 0
+
+
+def chain_dir(output_dir, name):
+    return f"{output_dir}/calibration/chains/{name}"
+
+
+############################ Convergence ############################
+
+class ConvergenceMonitor:
+    """Integrated autocorrelation time per parameter, re-estimated at every checkpoint.
+
+    The chain has converged once it is longer than ``factor`` times the largest
+    tau and every tau moved by less than ``tol`` (relative) since the previous
+    checkpoint.  Burn-in is then ``burn_factor`` x max tau and the samples are
+    thinned by half the smallest tau.
+    """
+
+    def __init__(self, parameter_names, factor=50, tol=0.01, burn_factor=2):
+        self.parameter_names = list(parameter_names)
+        self.factor = factor
+        self.tol = tol
+        self.burn_factor = burn_factor
+        self.history = []
+        self.converged = False
+
+    def restore(self, report, steps):
+        """Take over the tau history of an earlier report up to ``steps`` (a resumed chain)."""
+        self.history = [h for h in (report or {}).get("history", []) if h["steps"] <= steps]
+        last = self.history[-1]["steps"] if self.history else None
+        self.converged = bool(report and report.get("converged") and last == steps)
+
+    def update(self, store):
+        """Re-estimate tau (in sampler steps) from the whole stored chain. Returns True once converged."""
+        from emcee.autocorr import integrated_time
+
+        chain = np.concatenate([np.asarray(c) for c, _ in store.chunks()])
+        tau = integrated_time(chain, tol=0, quiet=True) * store.meta["thin"]
+        steps = store.meta["steps"]
+        previous = self.history[-1]["tau"] if self.history else None
+        self.history.append({"steps": steps, "tau": tau.tolist()})
+        stable = previous is not None and np.all(np.abs(np.array(previous) - tau) / tau < self.tol)
+        self.converged = bool(steps > self.factor * tau.max() and stable)
+        return self.converged
+
+    @property
+    def tau(self):
+        return np.array(self.history[-1]["tau"]) if self.history else None
+
+    def burn_thin(self):
+        """(burn-in, thinning) in sampler steps chosen from tau."""
+        tau = self.tau
+        return int(np.ceil(self.burn_factor * tau.max())), max(1, int(tau.min() / 2))
+
+    def report(self, path, name):
+        burn, thin = self.burn_thin() if self.history else (0, 1)
+        report = {"emulator": name, "converged": self.converged, "steps": self.history[-1]["steps"] if self.history else 0,
+                  "tau": dict(zip(self.parameter_names, self.tau.tolist())) if self.history else {},
+                  "factor": self.factor, "tol": self.tol, "burn": burn, "thin": thin,
+                  "history": self.history}
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=1)
+        return report
+
+
+def convergence_file(output_dir, name):
+    return f"{output_dir}/calibration/samples/convergence_{name}.json"
+
+
+def read_convergence(output_dir, name):
+    path = convergence_file(output_dir, name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+############################ Sampler ############################
+
+def initial_walkers(lower, upper, nwalkers, seed):
+    rng = np.random.default_rng(seed)
+    return lower + (upper - lower) * rng.random((nwalkers, len(lower)))
+
+
+def run_calibration(likelihood, nwalkers, nsteps, nburn, output_dir, name, seed=43, vectorize=True,
+                    checkpoint_every=500, thin=1, float32=False, resume=True, monitor=None):
+    """Sample the posterior with emcee, checkpointing every ``checkpoint_every`` steps.
+
+    Chains go to ``output/calibration/chains/<name>`` (every ``thin``-th step,
+    optionally as float32).  With ``resume`` an existing store with the same
+    walkers/dim/thin and posterior (emulator fingerprints, data, errors, prior
+    box) is continued from its last checkpoint up to ``nsteps``; any other
+    store is started over.
+    A ``ConvergenceMonitor`` stops the run early once it has converged and then
+    sets burn-in and thinning; its report goes next to the samples.
+    Returns (flat post burn-in samples, their log-probabilities, MAP point).
+    """
+    import emcee
+
+    dim = len(likelihood.lower)
+    posterior = likelihood.fingerprint()
+    store = ChainStore(chain_dir(output_dir, name))
+    if resume and store.compatible(nwalkers, dim, thin, posterior) and store.meta["steps"] > 0:
+        state, done = store.state(), store.meta["steps"]
+        print(f"🔁 {name}: resuming at step {done} of {nsteps}")
+        if monitor is not None:
+            monitor.restore(read_convergence(output_dir, name), done)
+    else:
+        if resume and store.stored():
+            print(f"🆕 {name}: the stored chain has other walkers/thinning or another posterior; starting over")
+        store.create(nwalkers, dim, thin, float32, posterior=posterior)
+        if os.path.exists(convergence_file(output_dir, name)):
+            os.remove(convergence_file(output_dir, name))  # belongs to the old chain
+        state = initial_walkers(likelihood.lower, likelihood.upper, nwalkers, seed)
+        done = 0
+    sampler = emcee.EnsembleSampler(nwalkers, dim, likelihood, vectorize=vectorize)
+    sampler.random_state = np.random.RandomState(seed).get_state()
+
+    checkpoint_every = max(thin, checkpoint_every // thin * thin)
+    start, first = time.time(), done
+    while done < nsteps:
+        n = min(checkpoint_every, nsteps - done)
+        n = max(thin, n // thin * thin)
+        state = sampler.run_mcmc(state, n // thin, thin_by=thin, progress=False)
+        store.append(sampler.get_chain(), sampler.get_log_prob(), state, done + n)
+        acceptance = np.mean(sampler.acceptance_fraction)
+        sampler.reset()  # the chunk is on disk: keep the memory flat
+        done += n
+        print(f"💾 {name}: step {done}/{nsteps}, acceptance {acceptance:.2f}")
+        if monitor is not None and monitor.update(store):
+            print(f"🏁 {name}: converged at step {done} (max tau {monitor.tau.max():.1f})")
+            break
+    elapsed = time.time() - start
+    if done > first:
+        print(f"🎲 {name}: {done - first} steps x {nwalkers} walkers in {elapsed:.1f} s "
+              f"({(done - first) / max(elapsed, 1e-9):.1f} steps/s)")
+
+    sample_thin = 1
+    if monitor is not None:
+        if not monitor.history:
+            monitor.update(store)
+        if not monitor.converged:
+            print(f"⚠️ {name}: not converged after {done} steps (max tau {monitor.tau.max():.1f}, "
+                  f"needs > {monitor.factor} x tau)")
+        monitor.report(convergence_file(output_dir, name), name)
+        nburn, sample_thin = monitor.burn_thin()
+    samples, min_samples, map_params = load_samples(output_dir, [name], nburn, thin=sample_thin)
+    return samples[name], min_samples, map_params[name]
+
+
+def _flat(store, nburn, thin=1):
+    """Flattened (samples, log_prob) chunks after ``nburn`` sampler steps, keeping every ``thin``-th step."""
+    step_thin = max(1, thin // store.meta["thin"])
+    skip = nburn // store.meta["thin"]
+    index = skip
+    for chain, log_prob in store.chunks(skip):
+        first = (-index) % step_thin
+        index += len(chain)
+        chain, log_prob = chain[first::step_thin], log_prob[first::step_thin]
+        yield chain.reshape(-1, chain.shape[-1]), log_prob.reshape(-1)
+
+
+def load_samples(output_dir, names, nburn=None, max_samples=None, thin=None):
+    """({name: post burn-in samples}, smallest sample count, {name: MAP point}), streamed from the chain stores.
+
+    ``nburn``/``thin`` default to the convergence report of the run (else 0 and 1).
+    With ``max_samples`` every k-th sample is kept so at most that many are held in memory.
+    """
+    samples, map_params = {}, {}
+    for name in names:
+        store = ChainStore(chain_dir(output_dir, name))
+        if not store.stored():
+            continue
+        report = read_convergence(output_dir, name) or {}
+        burn = nburn if nburn is not None else report.get("burn", 0)
+        step_thin = thin if thin is not None else report.get("thin", 1)
+        if store.meta.get("sampler") == "smc":
+            burn, step_thin = 0, 1  # final particles only
+        flats = list(_flat(store, burn, step_thin))
+        total = sum(len(flat) for flat, _ in flats)
+        stride = max(1, -(-total // max_samples)) if max_samples else 1
+        kept, best, best_logp, offset = [], None, -np.inf, 0
+        for flat, log_prob in flats:
+            kept.append(np.array(flat[(-offset) % stride::stride], dtype=float))
+            offset += len(flat)
+            if len(log_prob):
+                k = int(np.argmax(log_prob))
+                if log_prob[k] > best_logp:
+                    best, best_logp = np.array(flat[k], dtype=float), log_prob[k]
+        samples[name] = np.concatenate(kept) if kept else np.empty((0, store.meta["dim"]))
+        map_params[name] = best
+    min_samples = min((len(s) for s in samples.values()), default=0)
+    return samples, min_samples, map_params
+
+
+def traces(output_dir, name, percent=1.0):
+    """Walker traces (steps, walkers, dim) of the last ``percent`` of the stored steps, read from the tail chunks only."""
+    store = ChainStore(chain_dir(output_dir, name))
+    keep = int(np.ceil(store.stored() * percent))
+    parts = [np.asarray(chain) for chain, _ in store.chunks(store.stored() - keep)]
+    return np.concatenate(parts) if parts else np.empty((0, store.meta["nwalkers"] if store.meta else 0, 0))
+
+
+############################ SMC ############################
+
+_pool_likelihood = None
+
+
+def _set_likelihood(likelihood):
+    global _pool_likelihood
+    _pool_likelihood = likelihood
+
+
+def _evaluate(theta):
+    return _pool_likelihood(theta)
+
+
+def _systematic_resample(weights, rng):
+    n = len(weights)
+    positions = (rng.random() + np.arange(n)) / n
+    return np.minimum(np.searchsorted(np.cumsum(weights), positions), n - 1)
+
+
+def _next_beta(beta, logl, target_ess):
+    """Largest temperature step keeping the effective sample size at ``target_ess``."""
+    def ess(b):
+        w = np.exp((b - beta) * (logl - logl.max()))
+        return w.sum() ** 2 / np.sum(w ** 2)
+
+    if ess(1.0) >= target_ess:
+        return 1.0
+    lo, hi = beta, 1.0
+    for _ in range(60):
+        mid = 0.5 * (lo + hi)
+        lo, hi = (mid, hi) if ess(mid) >= target_ess else (lo, mid)
+    return max(lo, beta + 1e-12)
+
+
+def run_smc(likelihood, n_particles, output_dir, name, seed=43, npool=1, ess_fraction=0.5, max_moves=50):
+    """Adaptive tempered SMC from the prior box to the posterior.
+
+    Temperatures are chosen so the ESS drops to ``ess_fraction`` per stage.
+    Particles are resampled systematically and then moved with random-walk
+    Metropolis (proposal 2.38^2/d x particle covariance), repeated until a
+    particle has most likely moved (at most ``max_moves``).  Likelihood batches run on
+    ``npool`` processes.  Returns (samples, log evidence, MAP point).
+    """
+    import emcee
+
+    rng = np.random.default_rng(seed)
+    dim = len(likelihood.lower)
+    x = initial_walkers(likelihood.lower, likelihood.upper, n_particles, seed)
+    pool = ProcessPoolExecutor(max_workers=npool, initializer=_set_likelihood, initargs=(likelihood,)) \
+        if npool > 1 else None
+
+    def evaluate(theta):
+        if pool is None:
+            return likelihood(theta)
+        return np.concatenate(list(pool.map(_evaluate, np.array_split(theta, npool))))
+
+    start = time.time()
+    try:
+        logl = evaluate(x)
+        beta, log_evidence, ladder = 0.0, 0.0, []
+        while beta < 1.0:
+            new_beta = _next_beta(beta, logl, ess_fraction * n_particles)
+            increment = (new_beta - beta) * logl
+            top = np.max(increment)
+            weights = np.exp(increment - top)
+            log_evidence += top + np.log(weights.mean())
+            index = _systematic_resample(weights / weights.sum(), rng)
+            x, logl = x[index], logl[index]
+
+            cov = np.atleast_2d(np.cov(x, rowvar=False)) * 2.38 ** 2 / dim
+            accepted, moves, n_moves = 0.0, 0, max_moves
+            while moves < n_moves:
+                proposal = x + rng.multivariate_normal(np.zeros(dim), cov, n_particles)
+                logl_new = evaluate(proposal)
+                accept = np.log(rng.random(n_particles)) < new_beta * (logl_new - logl)
+                x[accept], logl[accept] = proposal[accept], logl_new[accept]
+                accepted += accept.mean()
+                moves += 1
+                if moves == 1:
+                    rate = min(max(accepted, 1e-3), 0.999)
+                    n_moves = int(min(max_moves, max(2, np.ceil(np.log(0.01) / np.log(1 - rate)))))
+            ladder.append({"beta": new_beta, "moves": moves, "acceptance": accepted / moves})
+            print(f"🌡️ {name}: beta {new_beta:.4g}, {moves} moves, acceptance {accepted / moves:.2f}")
+            beta = new_beta
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    print(f"🎲 {name}: SMC with {n_particles} particles, {len(ladder)} stages in {time.time() - start:.1f} s, "
+          f"log evidence {log_evidence:.3f}")
+
+    # Same store as the emcee chains: one "step" holding the equally weighted particles
+    store = ChainStore(chain_dir(output_dir, name))
+    store.create(n_particles, dim, sampler="smc")
+    store.append(x[None], logl[None], emcee.State(x, log_prob=logl), len(ladder))
+    report_file = f"{output_dir}/calibration/samples/smc_{name}.json"
+    os.makedirs(os.path.dirname(report_file), exist_ok=True)
+    with open(report_file, 'w') as f:
+        json.dump({"emulator": name, "sampler": "smc", "particles": n_particles, "log_evidence": log_evidence,
+                   "ladder": ladder, "elapsed": time.time() - start}, f, indent=1)
+    if os.path.exists(convergence_file(output_dir, name)):
+        os.remove(convergence_file(output_dir, name))  # belongs to an earlier emcee run
+    return x, log_evidence, x[np.argmax(logl)]
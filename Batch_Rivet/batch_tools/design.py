@@ -0,0 +1,175 @@
+"""Augmented space-filling Latin hypercube designs.
+
+New design waves are placed in the strata left empty by the existing
+``Design__Rivet__N.dat`` points and then spread out with column exchanges
+that minimise the Morris-Mitchell phi_p criterion (a smooth stand-in for
+maximin distance) against both the existing and the new points.  Each
+point's terms are summed over its nearest neighbours only (k-d trees), so
+thousands of existing points cost seconds.
+"""
+
+import re
+import numpy as np
+
+
+def read_prior_ranges(prior_file):
+    """Parse ``# - Parameter name: Linear [lo, hi]`` lines of parameter_prior_list.dat."""
+    pattern = re.compile(r"#\s*-\s*Parameter\s+(\S+?):\s*\S+\s*\[\s*([^,\]]+)\s*,\s*([^\]]+)\]")
+    names, lower, upper = [], [], []
+    with open(prior_file) as f:
+        for line in f:
+            match = pattern.search(line)
+            if match:
+                names.append(match.group(1))
+                lower.append(float(match.group(2)))
+                upper.append(float(match.group(3)))
+    if not names:
+        raise ValueError(f"No parameter ranges found in {prior_file}")
+    return names, np.array(lower), np.array(upper)
+
+
+def _new_strata(unit_existing, nsamples, rng):
+    """Pick nsamples empty intervals per dimension out of (n_existing + nsamples)."""
+    n_total = len(unit_existing) + nsamples
+    dim = unit_existing.shape[1]
+    strata = np.empty((nsamples, dim), dtype=int)
+    for j in range(dim):
+        occupied = np.unique(np.clip((unit_existing[:, j] * n_total).astype(int), 0, n_total - 1))
+        # At most n_existing intervals are occupied, so at least nsamples are empty.
+        empty = np.setdiff1d(np.arange(n_total), occupied)
+        strata[:, j] = np.sort(rng.choice(empty, nsamples, replace=False))
+    return strata, n_total
+
+
+def _inv_pow(sq_dist, p):
+    """(1 / d**2) ** (p / 2) with repeated squaring for the usual even p."""
+    r = 1.0 / np.maximum(sq_dist, 1e-30)
+    half = p // 2
+    if p % 2 or half > 64:
+        return np.power(r, p / 2.0)
+    out, base = None, r
+    while half:
+        if half & 1:
+            out = base if out is None else out * base
+        half >>= 1
+        if half:
+            base = base * base
+    return out
+
+
+def _tree(points):
+    from scipy.spatial import cKDTree
+
+    return cKDTree(points) if len(points) else None
+
+
+def _phi_terms(trees, Q, skip, p, k, bound=np.inf):
+    """phi_p**p terms of the points ``Q`` with their ``k`` nearest existing and ``k`` nearest new points.
+
+    ``skip`` (len(Q), 2) are rows of the new points left out of each sum;
+    points further than ``bound`` are ignored.  Returns the existing and the
+    new part separately.
+    """
+    tree_e, tree_x = trees
+    existing = np.zeros(len(Q))
+    if tree_e is not None:
+        d, _ = tree_e.query(Q, k=k, distance_upper_bound=bound)
+        existing = _inv_pow(np.reshape(d, (len(Q), -1)) ** 2, p).sum(1)
+    d, i = tree_x.query(Q, k=k + skip.shape[1], distance_upper_bound=bound)
+    d, i = np.reshape(d, (len(Q), -1)), np.reshape(i, (len(Q), -1))
+    d = np.sort(np.where((i[:, :, None] == skip[:, None, :]).any(-1), np.inf, d), axis=1)[:, :k]
+    return existing, _inv_pow(d ** 2, p).sum(1)
+
+
+def _self_skip(rows):
+    return np.column_stack([rows, rows])
+
+
+def augment_maximin_lhs(existing, nsamples, lower, upper, seed, n_starts=10, max_iter=None, p=20,
+                        neighbours=10, candidates=16, cutoff_factor=2.0):
+    """Return nsamples new points (in physical units) that augment ``existing``.
+
+    ``existing`` may be empty, in which case this is a plain optimised maximin LHS.
+    With p=20 only the nearest points matter, so every phi term is summed over
+    the ``neighbours`` nearest existing and new points (k-d trees) within
+    ``cutoff_factor`` x the largest nearest-neighbour distance of the start
+    design, and each exchange step scores ``candidates`` random partner rows
+    per column.
+    """
+    rng = np.random.default_rng(seed)
+    lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+    dim = len(lower)
+    E = (np.atleast_2d(existing).reshape(-1, dim) - lower) / (upper - lower)
+    strata, n_total = _new_strata(E, nsamples, rng)
+    if max_iter is None:
+        max_iter = 2 * nsamples
+    k = max(1, min(neighbours, nsamples - 1))
+    rows = np.arange(nsamples)
+
+    # Best of several random permutations of the chosen strata.
+    best = None
+    for _ in range(n_starts):
+        order = np.argsort(rng.random((nsamples, dim)), axis=0)
+        cells = np.take_along_axis(strata, order, axis=0)
+        X = (cells + rng.random((nsamples, dim))) / n_total
+        trees = (_tree(E), _tree(X))
+        to_existing, to_new = _phi_terms(trees, X, _self_skip(rows), p, k)
+        phi = to_existing.sum() + to_new.sum() / 2.0
+        if best is None or phi < best[0]:
+            best = (phi, X, trees, to_existing, to_new)
+    _, X, trees, to_existing, to_new = best
+    if nsamples < 2:
+        return lower + X * (upper - lower)
+
+    # Terms beyond the bound are down by cutoff_factor**-p and are ignored.
+    nearest = np.minimum(trees[0].query(X)[0] if len(E) else np.inf, trees[1].query(X, k=2)[0][:, 1])
+    bound = cutoff_factor * nearest.max()
+    to_existing, to_new = _phi_terms(trees, X, _self_skip(rows), p, k, bound)
+
+    # Column exchanges keep the Latin property; work on the most crowded rows first.
+    # Swapping column j of rows a and b leaves their mutual distance unchanged, so
+    # the change is that of their terms against everything else.
+    for _ in range(max_iter):
+        improved = False
+        terms = to_existing + to_new
+        for a in np.argsort(-terms)[:5]:
+            others = np.delete(rows, a)
+            b = others if len(others) <= candidates else rng.choice(others, candidates, replace=False)
+            A = np.repeat(X[a][None], dim * len(b), axis=0).reshape(dim, len(b), dim)
+            B = np.repeat(X[b][None], dim, axis=0)
+            for j in range(dim):
+                A[j, :, j], B[j, :, j] = X[b, j], X[a, j]
+            # One query for a' and b' of every (column, partner) and for a and the partners as they are,
+            # each against everything but the pair itself.
+            Q = np.vstack([A.reshape(-1, dim), B.reshape(-1, dim), np.repeat(X[a][None], len(b), axis=0), X[b]])
+            skip = np.tile(np.column_stack([np.full(len(b), a), b]), (2 * dim + 2, 1))
+            phi = sum(_phi_terms(trees, Q, skip, p, k, bound)).reshape(2 * dim + 2, len(b))
+            deltas = phi[:dim] + phi[dim:2 * dim] - (phi[-2] + phi[-1])[None, :]
+            j, i = np.unravel_index(np.argmin(deltas), deltas.shape)
+            if deltas[j, i] < -1e-12 * terms.sum():
+                pair = np.array([a, b[i]])
+                before = X[pair]
+                X[pair, j] = X[pair[::-1], j]
+                # only rows within the bound of the old or new positions see the swap
+                near = trees[1].query_ball_point(np.vstack([before, X[pair]]), bound)
+                near = np.union1d(np.concatenate([np.asarray(n, dtype=int) for n in near]), pair)
+                trees = (trees[0], _tree(X))
+                to_existing[pair] = _phi_terms(trees, X[pair], _self_skip(pair), p, k, bound)[0]
+                to_new[near] = _phi_terms(trees, X[near], _self_skip(near), p, k, bound)[1]
+                improved = True
+                break
+        if not improved:
+            break
+
+    return lower + X * (upper - lower)
+
+
+def min_distance(points, existing, lower, upper):
+    """Smallest scaled distance from any of ``points`` to the others or to ``existing``."""
+    lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+    X = (np.atleast_2d(points) - lower) / (upper - lower)
+    E = (np.atleast_2d(existing).reshape(-1, len(lower)) - lower) / (upper - lower)
+    to_new = np.sqrt(((X[:, None, :] - X[None, :, :]) ** 2).sum(-1))
+    np.fill_diagonal(to_new, np.inf)
+    to_existing = np.sqrt(((X[:, None, :] - E[None, :, :]) ** 2).sum(-1)) if len(E) else np.full((len(X), 1), np.inf)
+    return min(to_new.min(), to_existing.min())
@@ -0,0 +1,138 @@
+"""k-fold and learning-curve validation of the batch_tools emulator methods.
+
+Every (method, training size, fold) is one task on a process pool: the
+design is split into ``k`` folds once (seeded), the emulator is trained on
+the first ``n_train`` points of the other folds and scored on the held-out
+fold.  Every task runs in a freshly forked worker, so the growth of its peak
+resident memory is what that fit needed.  Recorded per task:
+
+* ``train_s``            -- training time;
+* ``predict_ms_per_1k``  -- mean + variance prediction time of a 1000-point batch;
+* ``model_bytes``        -- size of the pickled emulator;
+* ``peak_mem_mb``        -- peak resident memory added by training and prediction;
+* ``rmse``, ``nrmse``, ``coverage_68``, ``coverage_95`` -- overall and per
+  histogram of the Layout (nrmse: rmse / spread of the held-out values;
+  coverage: fraction of held-out values within 1 / 1.96 predicted sigma).
+
+``run`` returns the report -- settings, every task and a per method / size
+summary (mean and std over the folds) -- and ``write_report`` stores it as JSON.
+"""
+
+import json
+import multiprocessing
+import os
+import pickle
+import resource
+import time
+
+import numpy as np
+
+from batch_tools import gp_emulator as GPEmulator
+
+SCALARS = ("train_s", "predict_ms_per_1k", "model_bytes", "peak_mem_mb", "rmse", "nrmse", "coverage_68", "coverage_95")
+
+
+def folds(n_points, k, seed=43):
+    """(train, test) index arrays of a seeded k-fold split."""
+    order = np.random.default_rng(seed).permutation(n_points)
+    parts = np.array_split(order, k)
+    return [(np.concatenate(parts[:i] + parts[i + 1:]), parts[i]) for i in range(k)]
+
+
+def _scores(y, mean, var):
+    err = mean - y
+    sigma = np.sqrt(np.maximum(var, 0))
+    spread = np.std(y)
+    rmse = float(np.sqrt(np.mean(err ** 2)))
+    return {"rmse": rmse, "nrmse": rmse / spread if spread > 0 else float("nan"),
+            "coverage_68": float(np.mean(np.abs(err) <= sigma)),
+            "coverage_95": float(np.mean(np.abs(err) <= 1.96 * sigma))}
+
+
+def _max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _run_task(task):
+    method, n_train, fold, theta_train, y_train, theta_test, y_test, blocks, settings = task
+    baseline = _max_rss_kb()
+    start = time.time()
+    emulator = GPEmulator.Emulator(method, **settings).fit(theta_train, y_train)
+    train_s = time.time() - start
+
+    mean, var = emulator.predict(theta_test)
+    start = time.time()
+    emulator.predict(np.resize(theta_test, (1000, theta_test.shape[1])))  # a 1000-point batch, like a calibration step
+    predict_s = time.time() - start
+    result = {"method": method, "n_train": n_train, "fold": fold, "n_test": len(theta_test), "train_s": train_s,
+              "predict_ms_per_1k": 1e3 * predict_s, "model_bytes": len(pickle.dumps(emulator)),
+              "peak_mem_mb": (_max_rss_kb() - baseline) / 1024,
+              **_scores(y_test, mean, var)}
+    result["histograms"] = {name: _scores(y_test[:, s], mean[:, s], var[:, s]) for name, s in blocks}
+    return result
+
+
+def _summary(runs):
+    summary = {}
+    for run in runs:
+        summary.setdefault(run["method"], {}).setdefault(str(run["n_train"]), []).append(run)
+    for method, sizes in summary.items():
+        for size, group in sizes.items():
+            entry = {key: {"mean": float(np.mean([r[key] for r in group])), "std": float(np.std([r[key] for r in group]))}
+                     for key in SCALARS}
+            entry["folds"] = len(group)
+            entry["histograms"] = {name: {key: float(np.mean([r["histograms"][name][key] for r in group]))
+                                          for key in ("rmse", "nrmse", "coverage_68", "coverage_95")}
+                                   for name in group[0]["histograms"]}
+            sizes[size] = entry
+    return summary
+
+
+def run(theta, y, layout, methods=GPEmulator.METHODS, k=5, train_sizes=None, jobs=1, seed=43, **settings):
+    """Benchmark report of ``methods`` on design points ``theta`` and predictions ``y`` (points x Layout bins).
+
+    ``train_sizes`` (default: only the full k-fold training sets) gives the
+    learning curve; sizes above a fold's training set are clipped to it.
+    ``settings`` go to every Emulator (n_starts, var_explained, ...).
+    """
+    theta, y = np.asarray(theta, dtype=float), np.asarray(y, dtype=float)
+    blocks = [(f"{b['system']}/{b['analysis']}/{b['histogram']}", slice(b['start'], b['stop'])) for b in layout.blocks]
+    splits = folds(len(theta), k, seed)
+    full = min(len(train) for train, _ in splits)
+    sizes = sorted({min(int(n), full) for n in train_sizes}) if train_sizes else [full]
+    tasks = [(method, n, fold, theta[train[:n]], y[train[:n]], theta[test], y[test], blocks, {"seed": seed, **settings})
+             for method in methods for n in sizes for fold, (train, test) in enumerate(splits)]
+    print(f"📏 Emulator benchmark: {len(methods)} method(s) x {len(sizes)} size(s) x {k} folds = {len(tasks)} fits "
+          f"on {jobs} process(es)")
+
+    import sklearn.gaussian_process  # noqa: F401 -- imported before forking, so it does not count as fit memory
+
+    start = time.time()
+    # maxtasksperchild=1: a fresh fork per fit, even with jobs=1 (ru_maxrss only grows within a process),
+    # so peak_mem_mb is that fit's own
+    with multiprocessing.get_context("fork").Pool(max(1, min(jobs, len(tasks))), initializer=GPEmulator._init_worker,
+                                                  maxtasksperchild=1) as pool:
+        runs = pool.map(_run_task, tasks, chunksize=1)
+
+    return {"settings": {"k": k, "train_sizes": sizes, "n_points": len(theta), "n_bins": y.shape[1],
+                         "methods": list(methods), "jobs": jobs, "seed": seed, **settings,
+                         "elapsed_s": time.time() - start},
+            "histograms": [name for name, _ in blocks],
+            "runs": runs,
+            "summary": _summary(runs)}
+
+
+def write_report(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(report, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+
+def print_summary(report):
+    print(f"{'method':>6} {'n_train':>7} {'rmse':>10} {'nrmse':>7} {'cov68':>6} {'cov95':>6} {'train s':>8} {'ms/1k':>8} {'MB':>7}")
+    for method, sizes in report["summary"].items():
+        for size, s in sizes.items():
+            print(f"{method:>6} {size:>7} {s['rmse']['mean']:>10.4g} {s['nrmse']['mean']:>7.3f} "
+                  f"{s['coverage_68']['mean']:>6.2f} {s['coverage_95']['mean']:>6.2f} {s['train_s']['mean']:>8.2f} "
+                  f"{s['predict_ms_per_1k']['mean']:>8.2f} {s['model_bytes']['mean'] / 2 ** 20:>7.2f}")
@@ -0,0 +1,147 @@
+"""Bounded local worker pool for the model/Rivet stage of Rivet_Main.py.
+
+Every task is one ``run_<model>.sh`` invocation (design point x collision
+system x pT-hat bin x seed chunk).  The heavy lifting happens in the child
+process, so a thread per slot is enough to keep ``jobs`` generators busy.
+"""
+
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def share_path(*parts):
+    """Path in the Bayes_HEP installation; $BAYES_HEP_SHARE points elsewhere (e.g. benchmark stand-ins)."""
+    return os.path.join(os.environ.get("BAYES_HEP_SHARE", "/usr/local/share/Bayes_HEP"), *parts)
+
+
+def pt_hat_bins(pt_edges, pt_min=-1, pt_max=-1):
+    """Return the list of (PT_Min, PT_Max) pairs to run.
+
+    With ``pt_edges`` the last bin is open ended (PT_Max = -1), matching
+    run_batch_array.slurm.  Without edges a single (pt_min, pt_max) bin is used.
+    """
+    if not pt_edges:
+        return [(pt_min, pt_max)]
+    bins = [(pt_edges[k], pt_edges[k + 1]) for k in range(len(pt_edges) - 1)]
+    bins.append((pt_edges[-1], -1))
+    return bins
+
+
+def chunk_seed(model_seed, bin_index, chunk, n_chunks):
+    """Seed for one (pT-hat bin, seed chunk); bin 0 / chunk 0 keeps model_seed."""
+    return model_seed + bin_index * n_chunks + chunk
+
+
+def model_command(task):
+    """run_<model>.sh command line of a task of build_model_tasks, built from its named fields."""
+    System, Energy = task['system'].split('_')
+    pt_lo, pt_hi = task['pt_bin']
+    return ['bash', task['script'], task['analyses'], task['input_dir'], task['project_dir'], System, Energy,
+            str(task['nevents']), str(task['seed']), task['param_tag'], task['merge_tag'], str(pt_lo), str(pt_hi)]
+
+
+def build_model_tasks(model, systems, analyses_list, design_points, parameter_names, param_tag_func,
+                      input_dir, project_dir, nevents, model_seed, pt_bins, n_chunks, dp_range, chunks=None):
+    """Expand DP x system x pT-hat bin x seed chunk into a flat list of tasks.
+
+    ``chunks`` restricts the seed chunks to build (default: all ``n_chunks``).
+    ``nevents`` is either one count for every run or a list with one count per pT-hat bin.
+    run_<model>.sh chooses where its YODA file goes; it is found afterwards from
+    the merge tag and seed (YodaIO.find_run_yoda).
+    """
+    script = share_path('Design_Points', 'Models', model, 'scripts', f'run_{model}.sh')
+    tasks = []
+    for system in systems:
+        system_analyses = analyses_list.get(system, [])
+        if not system_analyses:
+            print(f"⚠️ No analyses listed for {system}")
+            continue
+
+        for i in dp_range:
+            param_tag = param_tag_func(parameter_names, design_points[i])
+            merge_tag = f"DP_{i+1}"
+            for k, (pt_lo, pt_hi) in enumerate(pt_bins):
+                bin_events = nevents[k] if isinstance(nevents, (list, tuple)) else nevents
+                for j in (range(n_chunks) if chunks is None else chunks):
+                    task_seed = chunk_seed(model_seed, k, j, n_chunks)
+                    name = f"{system}_{merge_tag}_pt{pt_lo}-{pt_hi}_seed{task_seed}"
+                    task = {'name': name, 'system': system, 'dp': i + 1, 'pt_bin': (pt_lo, pt_hi),
+                            'seed': task_seed, 'chunk': j, 'nevents': bin_events, 'script': script,
+                            'analyses': ','.join(system_analyses), 'input_dir': input_dir,
+                            'project_dir': project_dir, 'param_tag': param_tag, 'merge_tag': merge_tag}
+                    task['cmd'] = model_command(task)
+                    tasks.append(task)
+    return tasks
+
+
+def run_task(task, log_dir=None):
+    """Run one task, capturing stdout/stderr in ``log_dir/<name>.log`` if given.
+
+    Never raises: failures are reported in the returned record so one bad
+    design point does not take the rest of the pool down with it.
+    """
+    start = time.time()
+    log_file = None
+    try:
+        if log_dir:
+            log_file = os.path.join(log_dir, f"{task['name']}.log")
+            with open(log_file, 'w') as log:
+                proc = subprocess.run(task['cmd'], stdout=log, stderr=subprocess.STDOUT)
+        else:
+            proc = subprocess.run(task['cmd'])
+        returncode = proc.returncode
+        error = None
+    except Exception as exc:  # e.g. missing script / interpreter
+        returncode = -1
+        error = str(exc)
+
+    record = dict(task)
+    record.update({'returncode': returncode, 'error': error, 'started': start, 'elapsed': time.time() - start,
+                   'log': log_file})
+    return record
+
+
+def run_tasks(tasks, jobs=1, log_dir=None):
+    """Run ``tasks`` on at most ``jobs`` concurrent workers and return their records."""
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    results = []
+    if jobs <= 1:
+        for task in tasks:
+            print(f"🚀 Running {task['name']}")
+            results.append(run_task(task, log_dir))
+        return results
+
+    print(f"🚀 Running {len(tasks)} tasks on {jobs} workers (logs in {log_dir})")
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run_task, task, log_dir): task for task in tasks}
+        for n, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            status = "✅" if result['returncode'] == 0 else "❌"
+            print(f"{status} [{n}/{len(tasks)}] {result['name']} ({result['elapsed']:.1f} s)")
+            results.append(result)
+    return results
+
+
+def print_summary(results, tail=20):
+    """Print a run summary and the tail of each failed task's log. Returns the failures.
+
+    A task fails when it exits non-zero or its record carries an ``error``.
+    """
+    failed = [r for r in results if r['returncode'] != 0 or r['error']]
+    total_time = sum(r['elapsed'] for r in results)
+    print(f"\n📊 {len(results) - len(failed)}/{len(results)} tasks succeeded "
+          f"({total_time:.1f} s of task time)")
+
+    for r in failed:
+        print(f"❌ {r['name']} exited with {r['returncode']}" + (f": {r['error']}" if r['error'] else ""))
+        if r['log'] and os.path.exists(r['log']):
+            with open(r['log']) as f:
+                lines = f.readlines()[-tail:]
+            print(f"   --- last {len(lines)} lines of {r['log']} ---")
+            for line in lines:
+                print(f"   {line.rstrip()}")
+    return failed
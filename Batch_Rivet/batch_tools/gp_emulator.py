@@ -0,0 +1,284 @@
+"""Gaussian-process emulators whose independent fits run in a process pool.
+
+Each emulator is a set of independent scikit-learn GPs over the design
+parameters:
+
+* ``indGP`` -- one GP per output bin (squared-exponential kernel);
+* ``PCGP``  -- outputs standardised and projected on the principal components
+  explaining ``var_explained`` of the variance, one GP per component;
+  the dropped components are kept as a constant extra variance;
+* ``GP``    -- one GP per output bin with a Matern 5/2 kernel.
+
+Every (output, multi-start) pair is a separate task, so a fit with 300 bins
+and 3 starts is 900 tasks spread over ``jobs`` processes.  Start 0 begins at
+the default hyperparameters, the others at points drawn from
+``SeedSequence([seed, output, start])``; the best log marginal likelihood
+wins (lowest start on ties).  The result does not depend on ``jobs``, so
+``jobs=1`` reproduces a parallel fit exactly.
+
+Trained emulators are cached under a fingerprint of their training points,
+outputs, observable names and settings (``cached_fit``), so a rerun on the
+same inputs loads them and any change retrains.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+METHODS = ("PCGP", "indGP", "GP")
+LABELS = {"PCGP": "gp_PCGP", "indGP": "gp_indGP", "GP": "gp_Matern"}
+
+
+def label(method):
+    """Name of a method's results (printouts, figures, chains): never mistaken for a surmise emulator."""
+    return LABELS[method]
+
+
+def pool_size(npool=None):
+    """Processes for training: ``npool`` if given, else the CPUs of the allocation."""
+    if npool:
+        return int(npool)
+    for var in ("SLURM_CPUS_PER_TASK", "SLURM_NTASKS"):
+        if os.environ.get(var, "").isdigit():
+            return int(os.environ[var])
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+############################ Single fits ############################
+
+def _init_worker():
+    # One BLAS thread per process: the pool already fills the cores.
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=1)
+    except ImportError:
+        pass
+
+
+def _kernel(method, dim):
+    from sklearn.gaussian_process.kernels import RBF, ConstantKernel, Matern, WhiteKernel
+
+    if method == "GP":
+        shape = Matern(length_scale=np.ones(dim), length_scale_bounds=(1e-2, 1e2), nu=2.5)
+    else:
+        shape = RBF(length_scale=np.ones(dim), length_scale_bounds=(1e-2, 1e2))
+    return ConstantKernel(1.0, (1e-3, 1e3)) * shape + WhiteKernel(1e-3, (1e-8, 1e0))
+
+
+def _fit_one(task):
+    """(output, start, log marginal likelihood, fitted GP) of one multi-start."""
+    from sklearn.gaussian_process import GaussianProcessRegressor
+
+    method, theta, target, output, start, seed = task
+    kernel = _kernel(method, theta.shape[1])
+    if start > 0:
+        rng = np.random.default_rng(np.random.SeedSequence([seed, output, start]))
+        bounds = kernel.bounds
+        kernel = kernel.clone_with_theta(rng.uniform(bounds[:, 0], bounds[:, 1]))
+    gp = GaussianProcessRegressor(kernel=kernel, normalize_y=True, n_restarts_optimizer=0)
+    gp.fit(theta, target)
+    return output, start, gp.log_marginal_likelihood_value_, gp
+
+
+def _fit_task(task):
+    key, fit = task
+    return key, _fit_one(fit)
+
+
+def fit_gps_many(problems, jobs=1):
+    """Best-of-multi-start GPs of several fitting problems sharing one pool.
+
+    ``problems`` is a list of (method, theta, targets, n_starts, seed); returns
+    one list of GPs (one per target column) per problem.  Each fit is seeded
+    as if its problem were fitted alone.
+    """
+    tasks = [((p, k), (method, theta, targets[:, k], k, start, seed))
+             for p, (method, theta, targets, n_starts, seed) in enumerate(problems)
+             for k in range(targets.shape[1]) for start in range(n_starts)]
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(tasks)), initializer=_init_worker) as pool:
+            results = list(pool.map(_fit_task, tasks, chunksize=max(1, len(tasks) // (4 * jobs))))
+    else:
+        results = [_fit_task(task) for task in tasks]
+
+    best = {}
+    for key, (_, start, lml, gp) in results:
+        if key not in best or lml > best[key][0]:
+            best[key] = (lml, gp)
+    return [[best[(p, k)][1] for k in range(problem[2].shape[1])] for p, problem in enumerate(problems)]
+
+
+def fit_gps(method, theta, targets, n_starts=3, seed=43, jobs=1):
+    """Best of ``n_starts`` GP fits for every column of ``targets``, fitted on ``jobs`` processes."""
+    return fit_gps_many([(method, theta, targets, n_starts, seed)], jobs)[0]
+
+
+############################ Emulator ############################
+
+class Emulator:
+    """Independent GPs over the outputs (or principal components) of the training predictions."""
+
+    def __init__(self, method="PCGP", var_explained=0.99, npc=None, n_starts=3, seed=43):
+        if method not in METHODS:
+            raise ValueError(f"Unknown emulator method {method}, expected one of {METHODS}")
+        self.method = method
+        self.var_explained = var_explained
+        self.npc = npc
+        self.n_starts = n_starts
+        self.seed = seed
+        self.key = None  # fingerprint of the training inputs, set by cached_fit_many
+
+    def fit(self, theta, y, jobs=1):
+        """Train on design points ``theta`` (n x dim) and predictions ``y`` (n x outputs)."""
+        return fit_many([self], [(theta, y)], jobs)[0]
+
+    def _targets(self, y):
+        """What the GPs are fitted to: the outputs, or their principal components."""
+        self.n_outputs = y.shape[1]
+        if self.method == "PCGP":
+            self.mean = y.mean(axis=0)
+            self.scale = y.std(axis=0)
+            self.scale[self.scale == 0] = 1.0
+            _, s, vt = np.linalg.svd((y - self.mean) / self.scale, full_matrices=False)
+            variance = s ** 2 / len(y)
+            npc = self.npc or int(np.searchsorted(np.cumsum(variance) / variance.sum(), self.var_explained) + 1)
+            npc = min(npc, len(s))
+            self.basis = vt[:npc].T  # outputs x npc, orthonormal columns
+            # Variance of the dropped components, per output
+            self.residual_var = (variance[npc:, None] * vt[npc:] ** 2).sum(axis=0) * self.scale ** 2
+            return ((y - self.mean) / self.scale) @ self.basis
+        return y
+
+    def predict_components(self, theta):
+        """(mean, variance) of every GP at ``theta``: n x (outputs or components)."""
+        theta = np.atleast_2d(np.asarray(theta, dtype=float))
+        mean = np.empty((len(theta), len(self.gps)))
+        var = np.empty_like(mean)
+        for k, gp in enumerate(self.gps):
+            mean[:, k], std = gp.predict(theta, return_std=True)
+            var[:, k] = std ** 2
+        return mean, var
+
+    def predict(self, theta):
+        """(mean, variance) of the outputs at ``theta`` (n x outputs each)."""
+        mean, var = self.predict_components(theta)
+        if self.method != "PCGP":
+            return mean, var
+        y = self.mean + (mean @ self.basis.T) * self.scale
+        y_var = (var @ (self.basis.T ** 2)) * self.scale ** 2 + self.residual_var
+        return y, y_var
+
+
+def fit_many(emulators, data, jobs=1):
+    """Train several emulators on their (theta, y) at once, all GP fits in one pool."""
+    start = time.time()
+    problems = []
+    for emulator, (theta, y) in zip(emulators, data):
+        theta, y = np.asarray(theta, dtype=float), np.asarray(y, dtype=float)
+        problems.append((emulator.method, theta, emulator._targets(y), emulator.n_starts, emulator.seed))
+    for emulator, gps in zip(emulators, fit_gps_many(problems, jobs)):
+        emulator.gps = gps
+        emulator.train_time = time.time() - start
+    n_gps = sum(len(e.gps) for e in emulators)
+    print(f"🧠 {'/'.join(sorted({e.method for e in emulators}))}: {len(emulators)} emulator(s), {n_gps} GP(s) "
+          f"on {jobs} process(es) in {time.time() - start:.1f} s")
+    return emulators
+
+
+def save(emulator, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".tmp", 'wb') as f:
+        pickle.dump(emulator, f)
+    os.replace(path + ".tmp", path)
+
+
+def load(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def rmse(emulator, theta, y):
+    """Root mean square error of the emulator mean, per output."""
+    mean, _ = emulator.predict(theta)
+    return np.sqrt(np.mean((mean - np.asarray(y)) ** 2, axis=0))
+
+
+############################ Cache ############################
+
+def fingerprint(theta, y, observables, **settings):
+    """Hash of what an emulator is trained on: design points, outputs, observable names and settings."""
+    h = hashlib.sha256()
+    for array in (theta, y):
+        array = np.ascontiguousarray(array, dtype=np.float64)
+        h.update(str(array.shape).encode())
+        h.update(array.tobytes())
+    h.update(json.dumps({"observables": list(observables), **settings}, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def cached_file(cache_dir, name, method, key):
+    return os.path.join(cache_dir, f"{name}_{method}_{key[:16]}.pkl")
+
+
+def cached_fit_many(cache_dir, specs, jobs=1, train=None):
+    """Emulators trained on exactly these inputs, loaded from ``cache_dir`` or fitted (together) and stored.
+
+    ``specs`` are dicts with name, method, theta, y, observables and settings
+    (Emulator keyword arguments).  ``train`` True always refits, False always
+    loads the latest emulator of each name/method (stale or not) and None
+    (auto) refits only on a fingerprint mismatch.
+    """
+    emulators, to_fit = [None] * len(specs), []
+    for i, spec in enumerate(specs):
+        name, method, settings = spec['name'], spec['method'], spec.get('settings', {})
+        key = fingerprint(spec['theta'], spec['y'], spec['observables'], method=method, **settings)
+        path = cached_file(cache_dir, name, method, key)
+        if train is False:
+            candidates = sorted(glob.glob(cached_file(cache_dir, name, method, "*")), key=os.path.getmtime)
+            if not candidates:
+                raise FileNotFoundError(f"No {name} {method} emulator in {cache_dir}")
+            if candidates[-1] != path:
+                print(f"⚠️ {os.path.basename(candidates[-1])} was trained on other inputs than the current ones")
+            emulators[i] = load(candidates[-1])
+            if getattr(emulators[i], 'key', None) is None:
+                emulators[i].key = os.path.basename(candidates[-1])
+        elif train is None and os.path.exists(path):
+            print(f"⏭️ {name} {method} emulator matches the inputs ({os.path.basename(path)})")
+            emulators[i] = load(path)
+            emulators[i].key = key
+        else:
+            to_fit.append((i, path, key, Emulator(method, **settings)))
+    if to_fit:
+        fit_many([e for *_, e in to_fit], [(specs[i]['theta'], specs[i]['y']) for i, *_ in to_fit], jobs)
+        for i, path, key, emulator in to_fit:
+            emulator.key = key  # what it was trained on, e.g. for a calibration deciding whether to resume
+            save(emulator, path)
+            emulators[i] = emulator
+    return emulators
+
+
+def cached_fit(cache_dir, name, method, theta, y, observables, jobs=1, train=None, **settings):
+    """The emulator trained on exactly these inputs, loaded from ``cache_dir`` or fitted and stored."""
+    spec = {'name': name, 'method': method, 'theta': theta, 'y': y, 'observables': observables, 'settings': settings}
+    return cached_fit_many(cache_dir, [spec], jobs, train)[0]
+
+
+def matches(cache_dir, name, key):
+    """True if the fingerprint recorded for an externally saved emulator ``name`` is ``key``."""
+    path = os.path.join(cache_dir, f"{name}.fingerprint")
+    if not os.path.exists(path):
+        return False
+    with open(path) as f:
+        return f.read().strip() == key
+
+
+def record(cache_dir, name, key):
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, f"{name}.fingerprint"), 'w') as f:
+        f.write(key + "\n")
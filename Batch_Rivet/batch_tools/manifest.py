@@ -0,0 +1,129 @@
+"""Per-stage manifest on top of the registry's ``runs`` table.
+
+Every unit of work (model run, merge, report, write) is recorded with a
+fingerprint of what produced it (command, seed, nevents, upstream hashes, ...)
+and the SHA-1 of each output file.  A unit is complete when it is recorded as
+done, its fingerprint still matches and its outputs are unchanged on disk;
+anything else is redone.  File hashes are cached by (size, mtime) in the
+registry so checking an unchanged tree does not re-read the YODA files.
+"""
+
+import hashlib
+import json
+import os
+import subprocess
+
+from batch_tools import executor as Executor
+from batch_tools import registry as Registry
+from batch_tools import yoda_io as YodaIO
+
+STAGES = ("model", "merge", "report", "write")
+
+
+def fingerprint(**parts):
+    """Stable hash of the inputs of one unit of work."""
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def hash_file(conn, path):
+    """SHA-1 of a file, reusing the cached value while size and mtime are unchanged."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    cached = conn.execute("SELECT size, mtime_ns, sha1 FROM file_hashes WHERE path = ?", (path,)).fetchone()
+    if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+        return cached[2]
+
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    digest = sha1.hexdigest()
+    conn.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                 (path, stat.st_size, stat.st_mtime_ns, digest))
+    return digest
+
+
+def hash_files(conn, paths):
+    """{path: sha1} of the given files (None for missing ones)."""
+    return {path: hash_file(conn, path) for path in sorted(paths)}
+
+
+def record(conn, dg, dp, system, stage, inputs, outputs, status="done", seed=-1, nevents=None, pt_bin=None):
+    """Record one unit with its fingerprint and the hashes of its output files.
+
+    A unit without outputs, or with a missing one, is recorded as failed.
+    """
+    hashes = hash_files(conn, outputs)
+    if not hashes or any(h is None for h in hashes.values()):
+        status = "failed"
+    Registry.record_run(conn, dg, dp, system, stage, status, seed, nevents, inputs, json.dumps(hashes), pt_bin)
+
+
+def is_complete(conn, dg, dp, system, stage, inputs, seed=-1):
+    """True if the unit is done, was produced from ``inputs`` and its outputs are intact."""
+    run = Registry.get_run(conn, dg, dp, system, stage, seed)
+    if run is None:
+        return False
+    status, recorded_inputs, outputs = run
+    if status != "done" or recorded_inputs != inputs:
+        return False
+    outputs = json.loads(outputs or "{}")
+    return all(hash_file(conn, path) == sha1 for path, sha1 in outputs.items())
+
+
+def stage_outputs(conn, dg, dp, system, stage):
+    """{path: sha1} recorded for every done unit of one DP/system/stage."""
+    outputs = {}
+    for _, status, _, recorded in Registry.get_runs(conn, dg, dp, system, stage):
+        if status == "done" and recorded:
+            outputs.update(json.loads(recorded))
+    return outputs
+
+
+def upstream(conn, dg, dp, system, stage):
+    """Fingerprint of the recorded units of an upstream stage, used as the input of the next one."""
+    return fingerprint(stage=stage, runs=[(seed, status, inputs, outputs)
+                                          for seed, status, inputs, outputs in Registry.get_runs(conn, dg, dp, system, stage)])
+
+
+def run_model_tasks(conn, dg, tasks, project_dir, model, nevents, jobs=1, log_dir=None, force=False):
+    """Run the model tasks that are not complete yet and record them. Returns the run records."""
+    # The command line carries the parameters, seed, nevents and pT-hat bin of the run.
+    for task in tasks:
+        task['inputs'] = fingerprint(stage='model', cmd=task['cmd'])
+    if not force:
+        pending = [task for task in tasks
+                   if not is_complete(conn, dg, task['dp'], task['system'], 'model', task['inputs'], task['seed'])]
+        if len(pending) < len(tasks):
+            print(f"⏭️ Skipping {len(tasks) - len(pending)} model runs that are already complete")
+        tasks = pending
+
+    results = Executor.run_tasks(tasks, jobs, log_dir if jobs > 1 else None)
+    for r in results:
+        # Streamed runs are given their file; run_<model>.sh names its own after the merge tag and seed.
+        if r['returncode'] == 0 and not r.get('output'):
+            System, Energy = r['system'].split('_')
+            r['output'] = YodaIO.find_run_yoda(project_dir, model, System, Energy, r['merge_tag'], r['seed'],
+                                               r['started'])
+            if r['output'] is None:
+                r['error'] = f"no YODA file of {r['merge_tag']} seed {r['seed']} under {project_dir}/Models/{model}"
+        record(conn, dg, r['dp'], r['system'], 'model', r['inputs'], [r['output']] if r.get('output') else [],
+               'done' if r['returncode'] == 0 else 'failed', r['seed'], r.get('nevents', nevents), r['pt_bin'])
+    return results
+
+
+def merge_dp(conn, dg, project_dir, model, system, dp, force=False):
+    """Run merge.sh for one DP unless its model runs are unchanged. Returns the merged YODA file."""
+    System, Energy = system.split('_')
+    merge_tag = f"DP_{dp}"
+    merge_inputs = upstream(conn, dg, dp, system, 'model')
+    if force or not is_complete(conn, dg, dp, system, 'merge', merge_inputs):
+        subprocess.run(['bash', Executor.share_path('Design_Points', 'Rivet_Analyses', 'merge.sh'),
+                        project_dir, model, System, Energy, merge_tag], check=True)
+        merged = YodaIO.find_merged_yoda(project_dir, model, System, Energy, merge_tag)
+        record(conn, dg, dp, system, 'merge', merge_inputs, [merged] if merged else [])
+        return merged
+    print(f"⏭️ {system} {merge_tag}: merge is up to date")
+    return YodaIO.find_merged_yoda(project_dir, model, System, Energy, merge_tag)
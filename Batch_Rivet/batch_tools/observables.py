@@ -0,0 +1,98 @@
+"""Stacked observables of several collision systems for a joint calibration.
+
+``Layout`` indexes one long observable vector by system / analysis /
+histogram: every histogram is a block of consecutive bins and every system a
+contiguous run of blocks, so a likelihood can be block diagonal over the
+systems (see calibration.JointLikelihood).  ``load_systems`` fills it from the
+prediction cache (or the merged text files with ``use_cache=False``) and the
+input/Data files:
+
+    {'layout': Layout, 'systems': {system: {'y_data', 'y_err', 'y_train', 'y_val', 'x', 'names'}}}
+
+with y_train / y_val as design points x bins of that system.
+"""
+
+import os
+
+import numpy as np
+
+from batch_tools import prediction_cache as PredCache
+
+
+class Layout:
+    """Blocks of bins: dicts with system, analysis, histogram, start, stop."""
+
+    def __init__(self):
+        self.blocks = []
+
+    def add(self, system, analysis, histogram, n_bins):
+        start = self.blocks[-1]['stop'] if self.blocks else 0
+        self.blocks.append({'system': system, 'analysis': analysis, 'histogram': histogram,
+                            'start': start, 'stop': start + n_bins})
+
+    @property
+    def n_bins(self):
+        return self.blocks[-1]['stop'] if self.blocks else 0
+
+    @property
+    def systems(self):
+        return list(dict.fromkeys(b['system'] for b in self.blocks))
+
+    def system_slice(self, system):
+        blocks = [b for b in self.blocks if b['system'] == system]
+        return slice(blocks[0]['start'], blocks[-1]['stop'])
+
+    def select(self, system=None, analysis=None, histogram=None):
+        """Indices of the bins matching the given keys."""
+        index = [np.arange(b['start'], b['stop']) for b in self.blocks
+                 if (system is None or b['system'] == system) and (analysis is None or b['analysis'] == analysis)
+                 and (histogram is None or b['histogram'] == histogram)]
+        return np.concatenate(index) if index else np.array([], dtype=int)
+
+
+def _names(path, model):
+    """(analysis, histogram) of a Prediction__{model}__{E}__{S}__{analysis}__{hist}__values.dat file."""
+    parts = os.path.basename(path)[len(f"Prediction__{model}__"):-len("__values.dat")].split("__")
+    return parts[2], "__".join(parts[3:])
+
+
+def load_system(main_dir, model, system, train_indices, validation_indices, layout, merged_dir=None, data_dir=None,
+                use_cache=True):
+    """Data and predictions of one system, its histograms appended to ``layout``."""
+    data_dir = data_dir or f"{main_dir}/input/Data"
+    System, Energy = system.split('_')
+    y_data, y_err, x, train, val, names = [], [], [], [], [], []
+    predictions = PredCache.read_predictions(main_dir, model, system, merged_dir=merged_dir, data_dir=data_dir,
+                                             use_cache=use_cache)
+    for pred in predictions:
+        analysis, histogram = _names(pred['FileName'], model)
+        data_file = f"{data_dir}/Data__{Energy}__{System}__{analysis}__{histogram}.dat"
+        if not os.path.exists(data_file):
+            print(f"⚠️ No {os.path.basename(data_file)}: {analysis}/{histogram} left out of {system}")
+            continue
+        data = np.loadtxt(data_file, comments='#', ndmin=2)
+        prediction = np.asarray(pred['Prediction'])  # DPs x bins
+        if len(data) != prediction.shape[1]:
+            print(f"⚠️ {analysis}/{histogram}: {len(data)} data bins, {prediction.shape[1]} predicted; left out of {system}")
+            continue
+        layout.add(system, analysis, histogram, len(data))
+        names.append(f"{analysis}/{histogram}")
+        x.append(0.5 * (data[:, 0] + data[:, 1]))
+        y_data.append(data[:, 2])
+        y_err.append(data[:, 3])
+        train.append(prediction[train_indices])
+        val.append(prediction[validation_indices])
+    if not names:
+        raise ValueError(f"No histograms with both data and predictions for {system}")
+    return {'y_data': np.concatenate(y_data), 'y_err': np.concatenate(y_err), 'x': np.concatenate(x),
+            'y_train': np.hstack(train), 'y_val': np.hstack(val), 'names': names}
+
+
+def load_systems(main_dir, model, systems, train_indices, validation_indices, merged_dir=None, data_dir=None,
+                 use_cache=True):
+    """Stacked observables of every system (see the module docstring)."""
+    layout = Layout()
+    stacked = {system: load_system(main_dir, model, system, train_indices, validation_indices, layout,
+                                   merged_dir, data_dir, use_cache) for system in systems}
+    print(f"📚 {layout.n_bins} bins in {len(layout.blocks)} histograms over {len(stacked)} system(s)")
+    return {'layout': layout, 'systems': stacked}
@@ -0,0 +1,283 @@
+"""Declarative design -> generate -> merge -> write -> emulate -> calibrate -> plot pipeline.
+
+The stages are described once in ``STAGES``: which script runs them, the
+stage flags that switch everything else off, how they fan out (once, per
+collision system or per batch of design points) and what they wait for.
+``expand()`` turns that into a DAG of tasks, e.g. ``merge:pp_200:2`` waits
+only for ``generate:pp_200:2``, so one system or DP batch moves on while
+the others are still generating.
+
+Backends run a DAG:
+
+* ``LocalBackend``  -- subprocesses on this node, each task starts as soon as its deps succeed;
+* ``SlurmBackend``  -- submits the whole DAG up front, one job array per stage
+  (per system), with ``aftercorr`` between matching batches and ``afterok`` otherwise;
+* ``FakeBackend``   -- an in-process stand-in for Slurm that records the
+  submissions and "runs" them in dependency order, for checking a DAG without a cluster.
+"""
+
+import os
+import shlex
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from batch_tools import executor as Executor
+
+RIVET_OFF = {"--Get_Design_Points": "False", "--Rivet_Setup": "False", "--Run_Model": "False",
+             "--Rivet_Merge": "False", "--Write_input_Rivet": "False", "--clear_rivet_models": "False"}
+BAYES_OFF = {"--clear_output": "False", "--Train_Surmise": "auto", "--Train_Scikit": "auto",
+             "--Run_Calibration": "False", "--Load_Calibration": "False", "--Result_plots": "False"}
+
+# name: (script, fan-out, upstream stage, stage flags)
+STAGES = {
+    "design":    ("rivet", "once",   None,       {"--Get_Design_Points": "True", "--Rivet_Setup": "True"}),
+    "generate":  ("rivet", "batch",  "design",   {"--Run_Model": "True", "--Run_Batch": "True"}),
+    "merge":     ("rivet", "batch",  "generate", {"--Rivet_Merge": "True", "--Run_Batch": "True"}),
+    "write":     ("rivet", "system", "merge",    {"--Write_input_Rivet": "True", "--Run_Batch": "False"}),
+    "emulate":   ("bayes", "once",   "write",    {}),  # emulators (re)train when their inputs changed
+    "calibrate": ("bayes", "once",   "emulate",  {"--Run_Calibration": "True"}),
+    "plot":      ("bayes", "once",   "calibrate", {"--Load_Calibration": "True", "--Result_plots": "True"}),
+}
+
+
+############################ DAG ############################
+
+def dp_batches(n_points, dp_per_task):
+    """[(start, end)) batches of design point indices covering every DP."""
+    return [(start, min(start + dp_per_task, n_points)) for start in range(0, n_points, dp_per_task)]
+
+
+def _command(config, script, flags, systems, positional=()):
+    main = config['rivet_main'] if script == 'rivet' else config['bayes_main']
+    base = dict(RIVET_OFF if script == 'rivet' else BAYES_OFF)
+    base.update(flags)
+    cmd = ['python', main, *[str(p) for p in positional], '--main_dir', config['main_dir']]
+    for flag, value in base.items():
+        cmd += [flag, value]
+    cmd += ['--Coll_System', *systems]
+    return cmd + shlex.split(config.get(f'{script}_args', ''))
+
+
+def expand(config, stages=None):
+    """{task name: task} for the selected stages.
+
+    ``config`` holds main_dir, rivet_main, bayes_main, systems, n_points,
+    dp_per_task and optional rivet_args / bayes_args (passed through to every
+    command).  Dependencies on stages that are not selected are dropped, so
+    e.g. ``stages=['merge', 'write']`` reruns the tail on existing runs.
+    """
+    stages = [s for s in STAGES if stages is None or s in stages]
+    batches = dp_batches(config['n_points'], config['dp_per_task'])
+    systems = config['systems']
+
+    def names(stage, system=None, batch=None):
+        fan_out = STAGES[stage][1]
+        if fan_out == "once":
+            return [stage]
+        if fan_out == "system":
+            return [f"{stage}:{s}" for s in ([system] if system else systems)]
+        return [f"{stage}:{s}:{b}" for s in ([system] if system else systems)
+                for b in ([batch] if batch is not None else range(len(batches)))]
+
+    tasks = {}
+    for stage in stages:
+        script, fan_out, upstream, flags = STAGES[stage]
+        units = [(None, None)] if fan_out == "once" else \
+            [(s, None) for s in systems] if fan_out == "system" else \
+            [(s, b) for s in systems for b in range(len(batches))]
+        for system, batch in units:
+            positional = batches[batch] if batch is not None else ()
+            cmd = _command(config, script, flags, [system] if system else systems, positional)
+
+            deps = []
+            if upstream in stages:
+                up_fan_out = STAGES[upstream][1]
+                if up_fan_out == "batch" and fan_out == "batch":
+                    deps = names(upstream, system, batch)
+                elif up_fan_out != "once" and fan_out != "once":
+                    deps = names(upstream, system)
+                else:
+                    deps = names(upstream)
+            name = names(stage, system, batch)[0] if fan_out != "once" else stage
+            tasks[name] = {'name': name, 'stage': stage, 'system': system, 'batch': batch, 'cmd': cmd,
+                           'deps': deps}
+    return tasks
+
+
+def topological(tasks):
+    """Task names in an order where every task comes after its deps."""
+    order, state = [], {}
+
+    def visit(name):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Dependency cycle at {name}")
+        state[name] = 'visiting'
+        for dep in tasks[name]['deps']:
+            visit(dep)
+        state[name] = 'done'
+        order.append(name)
+
+    for name in tasks:
+        visit(name)
+    return order
+
+
+def array_groups(tasks):
+    """Tasks packed into job arrays: {(stage, system): [names in batch order]} (system None for 'once' stages)."""
+    groups = {}
+    for name in topological(tasks):
+        task = tasks[name]
+        key = (task['stage'], task['system'])
+        groups.setdefault(key, []).append(name)
+    return groups
+
+
+############################ Backends ############################
+
+class LocalBackend:
+    """Run the DAG on this node with at most ``jobs`` tasks at a time."""
+
+    def __init__(self, jobs=1, log_dir=None):
+        self.jobs = jobs
+        self.log_dir = log_dir
+
+    def run(self, tasks):
+        if self.log_dir:
+            os.makedirs(self.log_dir, exist_ok=True)
+        status = {name: 'pending' for name in tasks}
+        results = []
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            running = {}
+            while True:
+                for name in topological(tasks):
+                    if status[name] != 'pending':
+                        continue
+                    deps = [status[d] for d in tasks[name]['deps']]
+                    if any(d in ('failed', 'skipped') for d in deps):
+                        status[name] = 'skipped'
+                        print(f"⏭️ {name}: skipped, an upstream task failed")
+                    elif all(d == 'done' for d in deps) and len(running) < self.jobs:
+                        print(f"🚀 {name}")
+                        status[name] = 'running'
+                        running[pool.submit(Executor.run_task, tasks[name], self.log_dir)] = name
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    result = future.result()
+                    status[name] = 'done' if result['returncode'] == 0 else 'failed'
+                    print(f"{'✅' if status[name] == 'done' else '❌'} {name} ({result['elapsed']:.1f} s)")
+                    results.append(result)
+        return status, results
+
+
+class SlurmBackend:
+    """Submit the DAG with sbatch: one array job per stage (and system), chained by dependencies.
+
+    ``prefix`` wraps every command (e.g. ``apptainer exec --bind ... image.sif``),
+    ``sbatch_args`` are added to every submission (account, partition, ...) and
+    ``resources`` = {stage: [extra sbatch args]} sizes the stages.
+    """
+
+    def __init__(self, work_dir, prefix="", sbatch_args="", resources=None, submit=None):
+        self.work_dir = work_dir
+        self.prefix = prefix
+        self.sbatch_args = shlex.split(sbatch_args)
+        self.resources = resources or {}
+        self.submit = submit or self._sbatch
+
+    def _sbatch(self, args):
+        out = subprocess.run(['sbatch', '--parsable', *args], capture_output=True, text=True, check=True)
+        return out.stdout.strip().split(';')[0]
+
+    def _script(self, key, names, tasks):
+        stage, system = key
+        tag = stage if system is None else f"{stage}_{system}"
+        cmd_file = os.path.join(self.work_dir, f"{tag}.cmds")
+        with open(cmd_file, 'w') as f:
+            for name in names:
+                f.write(" ".join(filter(None, [self.prefix, shlex.join(tasks[name]['cmd'])])) + "\n")
+        script = os.path.join(self.work_dir, f"{tag}.sh")
+        with open(script, 'w') as f:
+            f.write("#!/bin/bash\n"
+                    f"# {len(names)} task(s) of stage {tag}, one per array index\n"
+                    f'CMD=$(sed -n "$((${{SLURM_ARRAY_TASK_ID:-0}} + 1))p" {shlex.quote(cmd_file)})\n'
+                    'echo "🚀 $CMD"\n'
+                    'eval "$CMD"\n')
+        return tag, script
+
+    def run(self, tasks):
+        os.makedirs(self.work_dir, exist_ok=True)
+        groups = array_groups(tasks)
+        job_of, index_of = {}, {}
+        for names in groups.values():
+            for k, name in enumerate(names):
+                index_of[name] = k
+
+        job_ids = {}
+        for key, names in groups.items():
+            tag, script = self._script(key, names, tasks)
+            upstream = {}
+            for name in names:
+                for dep in tasks[name]['deps']:
+                    upstream.setdefault(job_of[dep], set()).add((index_of[name], index_of[dep]))
+            deps = []
+            for job, pairs in upstream.items():
+                # Element-wise deps (batch k after batch k) let each array task start on its own.
+                if len(names) > 1 and len(pairs) == len(names) and all(i == j for i, j in pairs):
+                    deps.append(f"aftercorr:{job}")
+                else:
+                    deps.append(f"afterok:{job}")
+            args = [f"--job-name={tag}", f"--array=0-{len(names) - 1}", *self.sbatch_args,
+                    *self.resources.get(key[0], [])]
+            if deps:
+                args.append("--dependency=" + ",".join(sorted(deps)))
+            job_ids[key] = self.submit(args + [script])
+            for name in names:
+                job_of[name] = job_ids[key]
+            print(f"📤 {tag}: {len(names)} task(s) as job {job_ids[key]}" + (f" after {', '.join(sorted(deps))}" if deps else ""))
+        return job_ids
+
+
+class FakeBackend(SlurmBackend):
+    """SlurmBackend with an in-process scheduler: submissions are recorded and run in dependency order.
+
+    ``fail`` is a set of task names that should fail; their dependants are cancelled like
+    Slurm does for unsatisfiable ``afterok``/``aftercorr`` dependencies.
+    """
+
+    def __init__(self, work_dir, prefix="", sbatch_args="", resources=None, fail=()):
+        super().__init__(work_dir, prefix, sbatch_args, resources, submit=self._record)
+        self.fail = set(fail)
+        self.jobs = []
+
+    def _record(self, args):
+        self.jobs.append(args)
+        return str(1000 + len(self.jobs))
+
+    def run(self, tasks):
+        job_ids = super().run(tasks)
+        status = {}
+        for name in topological(tasks):
+            if any(status[d] != 'done' for d in tasks[name]['deps']):
+                status[name] = 'cancelled'
+            else:
+                status[name] = 'failed' if name in self.fail else 'done'
+        self.finished = status
+        return job_ids
+
+
+def run(tasks, backend):
+    """Run a DAG on a backend and print a short summary. Returns the backend result."""
+    start = time.time()
+    print(f"🧵 {len(tasks)} task(s) in {len(array_groups(tasks))} group(s) on {type(backend).__name__}")
+    result = backend.run(tasks)
+    if isinstance(backend, LocalBackend):
+        status, _ = result
+        counts = {s: list(status.values()).count(s) for s in set(status.values())}
+        print(f"📊 {counts} in {time.time() - start:.1f} s")
+    return result
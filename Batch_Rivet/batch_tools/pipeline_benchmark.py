@@ -0,0 +1,305 @@
+"""End-to-end throughput benchmark of the Rivet_Main / Bayes_Main stages on stand-in scripts.
+
+The Bayes_HEP model and Rivet scripts are replaced by the deterministic
+stand-ins of ``standins.py`` (``$BAYES_HEP_SHARE`` points at them), and every
+stage is driven through the same batch_tools calls as the two scripts:
+
+    design       augmented maximin LHS + registry wave
+    generate     run_<model>.sh per DP (executor pool, manifest records)
+    merge        seed chunks / pT-hat bins per DP (python or merge.sh)
+    html         mkhtml.sh per DP (only with --html)
+    write        Data / Prediction files from the merged YODA files
+    predictions  incremental Prediction_Merged + merged design
+    load         stacked observables from the binary cache (cold, then warm)
+    emulator     batch_tools GP emulator training
+    mcmc         emcee on the batched likelihood (steps per second)
+
+for every requested scale (DPs x histograms x bins).  Histograms come from
+synthetic analyses (``--analyses synthetic``: ``--hists`` histograms of
+``--bins`` bins, reference data written alongside) or from the repository's
+analyses_list.txt and Rivet_Analyses.  Results go to a JSON file;
+``--baseline`` compares them with an earlier one and exits non-zero on a
+regression.
+
+From Batch_Rivet::
+
+    python -m batch_tools.pipeline_benchmark --dps 10 100 1000 5000 --hists 20 --bins 25 --jobs 8 --output bench.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from batch_tools import calibration as GPCalibration
+from batch_tools import design as Design
+from batch_tools import executor as Executor
+from batch_tools import gp_emulator as GPEmulator
+from batch_tools import manifest as Manifest
+from batch_tools import observables as Observables
+from batch_tools import prediction_merge as PredMerge
+from batch_tools import pthat as PtHat
+from batch_tools import registry as Registry
+from batch_tools import rivet_writer as RivetWriter
+from batch_tools import standins as Standins
+from batch_tools import yoda_io as YodaIO
+from batch_tools import yoda_merge as YodaMerge
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+STAGES = ("design", "generate", "merge", "html", "write", "predictions", "load_cold", "load_warm", "emulator", "mcmc")
+
+
+############################ Project setup ############################
+
+def param_tag(names, point):
+    return '_'.join(f"{name}_{value:.6g}" for name, value in zip(names, point))
+
+
+def synthetic_analyses(analyses_dir, n_hists, n_bins, centre, per_analysis=10):
+    """{analysis: [hists]} of ``n_hists`` synthetic histograms, reference data at the prior centre."""
+    edges = np.geomspace(0.5, 20.0, n_bins + 1)
+    analyses = {}
+    for k in range(n_hists):
+        analysis = f"BENCH_{k // per_analysis + 1:03d}"
+        analyses.setdefault(analysis, []).append(f"d{k % per_analysis + 1:02d}-x01-y01")
+    tag = param_tag([f"p{i}" for i in range(len(centre))], centre)
+    for analysis, hists in analyses.items():
+        os.makedirs(f"{analyses_dir}/{analysis}", exist_ok=True)
+        objects = {}
+        for hist in hists:
+            y = Standins.truth(f"/{analysis}/{hist}", edges[:-1], edges[1:], Standins.parameters(tag))
+            objects[f"/REF/{analysis}/{hist}"] = (edges[:-1], edges[1:], y, 0.05 * y)
+        YodaIO.write_estimates(f"{analyses_dir}/{analysis}/{analysis}.yoda", objects)
+        with open(f"{analyses_dir}/{analysis}/{analysis}.plot", 'w') as f:
+            for hist in hists:
+                f.write(f"BEGIN PLOT /{analysis}/{hist}\nXLabel=$p_T$ [GeV]\nYLabel=$dN/dp_T$\nEND PLOT\n\n")
+    return analyses
+
+
+def setup(work_dir, systems, analyses_source, n_hists, n_bins):
+    """main_dir of a fresh benchmark project and its {system: {analysis: [hists]}}."""
+    main_dir = f"{work_dir}/project"
+    project_dir = f"{main_dir}/rivet"
+    os.makedirs(f"{main_dir}/input/Rivet", exist_ok=True)
+    shutil.copy(f"{REPO_DIR}/input/Rivet/parameter_prior_list.dat", f"{main_dir}/input/Rivet/")
+    _, lower, upper = Design.read_prior_ranges(f"{main_dir}/input/Rivet/parameter_prior_list.dat")
+
+    if analyses_source == "synthetic":
+        os.makedirs(f"{project_dir}/Rivet_Analyses", exist_ok=True)
+        analyses = synthetic_analyses(f"{project_dir}/Rivet_Analyses", n_hists, n_bins, (lower + upper) / 2)
+        histograms = {system: analyses for system in systems}
+    else:
+        shutil.copytree(f"{REPO_DIR}/rivet/Rivet_Analyses", f"{project_dir}/Rivet_Analyses")
+        histograms = {}
+        for system in systems:
+            listed = PtHat.read_analyses_list(f"{REPO_DIR}/input/Rivet/analyses_list.txt", system)
+            histograms[system] = {}
+            for analysis, hists in listed.items():
+                try:
+                    YodaIO.find_reference(f"{project_dir}/Rivet_Analyses", analysis)
+                    histograms[system][analysis] = hists
+                except FileNotFoundError:
+                    print(f"⚠️ No reference data for {analysis}: left out of the benchmark")
+
+    with open(f"{main_dir}/input/Rivet/analyses_list.txt", 'w') as f:
+        for system, analyses in histograms.items():
+            f.write(f"{system}:\n" + ''.join(f"{a} {' '.join(h)}\n" for a, h in analyses.items()) + "\n")
+    return main_dir, histograms
+
+
+############################ One scale point ############################
+
+@contextlib.contextmanager
+def _timed(stages, name):
+    start = time.perf_counter()
+    yield
+    stages[name] = time.perf_counter() - start
+    print(f"⏱️ {name}: {stages[name]:.2f} s")
+
+
+def run_point(work_dir, n_dp, args):
+    """Stage timings of one scale point in a fresh project under ``work_dir``."""
+    model, systems, jobs = args.model, args.systems, args.jobs
+    main_dir, histograms = setup(work_dir, systems, args.analyses, args.hists, args.bins)
+    project_dir, input_dir = f"{main_dir}/rivet", f"{main_dir}/input/Rivet"
+    names, lower, upper = Design.read_prior_ranges(f"{input_dir}/parameter_prior_list.dat")
+    os.environ["BAYES_HEP_SHARE"] = Standins.install(f"{work_dir}/share", model)
+    stages, rates = {}, {}
+
+    with _timed(stages, "design"):
+        design_points = Design.augment_maximin_lhs(np.empty((0, len(names))), n_dp, lower, upper, args.seed)
+        conn = Registry.connect(main_dir)
+        dg = Registry.new_wave(conn, design_points, names, args.seed)
+
+    analyses_list = {system: list(histograms[system]) for system in systems}
+    dps = list(range(1, n_dp + 1))
+    with _timed(stages, "generate"):
+        tasks = Executor.build_model_tasks(model, systems, analyses_list, design_points, names, param_tag, input_dir,
+                                           project_dir, args.nevents, args.seed,
+                                           Executor.pt_hat_bins(args.pt_edges), args.chunks, range(n_dp))
+        results = Manifest.run_model_tasks(conn, dg, tasks, project_dir, model, args.nevents, jobs,
+                                           f"{project_dir}/logs")
+    if Executor.print_summary(results):
+        raise RuntimeError("Stand-in model runs failed")
+    rates["model_runs_per_s"] = len(tasks) / stages["generate"]
+
+    with _timed(stages, "merge"):
+        if args.merge_engine == "python":
+            if YodaMerge.merge_dps(conn, dg, project_dir, model, systems, dps, jobs):
+                raise RuntimeError("Merges failed")
+        else:
+            for system in systems:
+                for dp in dps:
+                    Manifest.merge_dp(conn, dg, project_dir, model, system, dp)
+
+    if args.html:
+        with _timed(stages, "html"):
+            for system in systems:
+                System, Energy = system.split('_')
+                for dp in dps:
+                    subprocess.run(['bash', Executor.share_path('Design_Points', 'Rivet_Analyses', 'mkhtml.sh'),
+                                    project_dir, model, System, Energy, f"DP_{dp}"], check=True)
+
+    with _timed(stages, "write"):
+        os.makedirs(f"{main_dir}/input/Data", exist_ok=True)
+        os.makedirs(f"{main_dir}/input/Prediction", exist_ok=True)
+        for system in systems:
+            RivetWriter.write_inputs(main_dir, project_dir, model, system, analyses_list[system], histograms[system],
+                                     n_dp, dg, jobs, 'yoda')
+
+    with _timed(stages, "predictions"):
+        _, merged_dir = PredMerge.merge_all(conn, main_dir)
+
+    n_train = max(2, int(0.8 * n_dp))
+    train, validation = np.arange(n_train), np.arange(n_train, n_dp)
+    for stage in ("load_cold", "load_warm"):
+        with _timed(stages, stage):
+            stacked = Observables.load_systems(main_dir, model, systems, train, validation, merged_dir)
+    blocks = stacked['systems']
+    n_bins = stacked['layout'].n_bins
+
+    emulator_points = train[:args.max_train]
+    with _timed(stages, "emulator"):
+        emulators = {system: GPEmulator.Emulator(args.method, n_starts=1, seed=args.seed)
+                     for system in blocks}
+        GPEmulator.fit_many(list(emulators.values()), [(design_points[emulator_points], block['y_train'][:args.max_train])
+                                                      for block in blocks.values()], jobs)
+
+    likelihood = GPCalibration.JointLikelihood(
+        GPCalibration.Likelihood(emulators[system], block['y_data'], block['y_err'], lower, upper)
+        for system, block in blocks.items())
+    with _timed(stages, "mcmc"):
+        GPCalibration.run_calibration(likelihood, args.nwalkers, args.mcmc_steps, 0, f"{work_dir}/output", "bench",
+                                      args.seed, checkpoint_every=args.mcmc_steps, resume=False)
+    rates["mcmc_steps_per_s"] = args.mcmc_steps / stages["mcmc"]
+    rates["likelihood_walkers_per_s"] = args.mcmc_steps * args.nwalkers / stages["mcmc"]
+    conn.close()
+
+    return {"n_dp": n_dp, "systems": systems, "n_histograms": sum(len(b['names']) for b in blocks.values()),
+            "n_bins": n_bins, "n_model_runs": len(tasks), "n_emulator_points": len(emulator_points),
+            "stages": stages, "rates": rates, "total_s": sum(stages.values()),
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+
+############################ Report / comparison ############################
+
+def _key(result):
+    return result["n_dp"], tuple(result["systems"]), result["n_histograms"], result["n_bins"]
+
+
+def compare(report, baseline, tolerance=1.25, min_seconds=0.5):
+    """Stages slower than ``tolerance`` x the baseline (and by more than ``min_seconds``) at matching scales."""
+    previous = {_key(r): r for r in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get(_key(result))
+        if old is None:
+            continue
+        for stage, seconds in result["stages"].items():
+            before = old["stages"].get(stage)
+            if before and seconds > tolerance * before and seconds - before > min_seconds:
+                regressions.append({"scale": list(_key(result)), "stage": stage, "baseline_s": before,
+                                    "current_s": seconds, "ratio": seconds / before})
+    return regressions
+
+
+def print_table(report):
+    stages = [s for s in STAGES if any(s in r["stages"] for r in report["results"])]
+    print(f"{'DPs':>6} {'hists':>6} {'bins':>6} " + ' '.join(f"{s:>11}" for s in stages) + f" {'steps/s':>8}")
+    for r in report["results"]:
+        print(f"{r['n_dp']:>6} {r['n_histograms']:>6} {r['n_bins']:>6} "
+              + ' '.join(f"{r['stages'].get(s, float('nan')):>11.2f}" for s in stages)
+              + f" {r['rates']['mcmc_steps_per_s']:>8.1f}")
+
+
+def _parser():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark on stand-in model / Rivet scripts.")
+    parser.add_argument("--dps", type=int, nargs="+", default=[10, 100, 1000], help="Design points per scale point")
+    parser.add_argument("--analyses", choices=["synthetic", "repo"], default="synthetic",
+                        help="Synthetic histograms (--hists x --bins) or the repository's analyses_list.txt")
+    parser.add_argument("--hists", type=int, default=20, help="Synthetic histograms")
+    parser.add_argument("--bins", type=int, default=20, help="Bins per synthetic histogram")
+    parser.add_argument("--systems", nargs="+", default=["pp_200"])
+    parser.add_argument("--model", type=str, default="pythia8")
+    parser.add_argument("--nevents", type=int, default=10000)
+    parser.add_argument("--chunks", type=int, default=1, help="Seed chunks per DP")
+    parser.add_argument("--pt_edges", type=float, nargs="*", default=[], help="pT-hat bin edges (stitched on merge)")
+    parser.add_argument("--merge_engine", choices=["python", "merge.sh"], default="python")
+    parser.add_argument("--html", action="store_true", help="Also time the mkhtml.sh stand-in")
+    parser.add_argument("--method", choices=GPEmulator.METHODS, default="PCGP")
+    parser.add_argument("--max_train", type=int, default=1000, help="At most this many emulator training points")
+    parser.add_argument("--nwalkers", type=int, default=50)
+    parser.add_argument("--mcmc_steps", type=int, default=200)
+    parser.add_argument("--jobs", type=int, default=None, help="Processes (default: the CPUs of the allocation)")
+    parser.add_argument("--seed", type=int, default=43)
+    parser.add_argument("--work_dir", type=str, default=None, help="Keep the benchmark projects here (default: a temporary directory)")
+    parser.add_argument("--output", type=str, default="pipeline_benchmark.json")
+    parser.add_argument("--baseline", type=str, default=None, help="Earlier report to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Slowdown factor counted as a regression")
+    return parser
+
+
+if __name__ == "__main__":
+    args = _parser().parse_args()
+    args.jobs = args.jobs or GPEmulator.pool_size()
+    report = {"machine": {"host": platform.node(), "cpus": GPEmulator.pool_size(), "python": platform.python_version(),
+                          "numpy": np.__version__, "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "settings": {k: v for k, v in vars(args).items() if k not in ("work_dir", "output", "baseline")},
+              "results": []}
+    root = args.work_dir or tempfile.mkdtemp(prefix="pipeline_benchmark_")
+    try:
+        for n_dp in args.dps:
+            work_dir = f"{root}/dp{n_dp}"
+            shutil.rmtree(work_dir, ignore_errors=True)
+            print(f"\n📐 {n_dp} design points")
+            report["results"].append(run_point(work_dir, n_dp, args))
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    with open(args.output + ".tmp", 'w') as f:
+        json.dump(report, f, indent=1)
+    os.replace(args.output + ".tmp", args.output)
+    print_table(report)
+    print(f"📄 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not {_key(r) for r in report["results"]} & {_key(r) for r in baseline["results"]}:
+            print(f"⚠️ No scale of this run is in {args.baseline}: nothing compared")
+        regressions = compare(report, baseline, args.tolerance)
+        for r in regressions:
+            print(f"❌ {r['stage']} at {r['scale']}: {r['baseline_s']:.2f} s -> {r['current_s']:.2f} s (x{r['ratio']:.2f})")
+        if regressions:
+            sys.exit(1)
+        print(f"✅ No stage slower than {args.tolerance} x {args.baseline}")
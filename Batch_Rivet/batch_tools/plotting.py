@@ -0,0 +1,231 @@
+"""Headless plotting stage for Bayes_Main.py: figures render in background processes.
+
+``FigureQueue`` takes figure jobs (a module-level plotting function and its
+arguments) tagged with a group -- design, emulators, traces, posterior,
+results -- and runs them on a process pool with the non-interactive Agg
+backend, so the main script carries on (or exits) without waiting for
+matplotlib.  Groups can be switched off; ``jobs=0`` renders in-process, and
+so does a job submitted with ``local=True`` (arguments that cannot be
+pickled, such as Bayes_HEP's surmise emulators).
+
+The plots of the batch_tools engine aggregate large point clouds: hexbin
+pair plots for the design, 2D histograms for the posterior and percentile
+bands instead of one line per walker for the traces.  ``results`` is that
+engine's counterpart of Bayes_HEP's Plots.results: prior and posterior
+predictive bands of every histogram against the data.
+"""
+
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+GROUPS = ("design", "emulators", "traces", "posterior", "results")
+
+
+def headless():
+    """Switch matplotlib to Agg (no window, nothing blocks on plt.show())."""
+    import matplotlib
+    matplotlib.use("Agg", force=True)
+
+
+def _run(func, args, kwargs, path, title):
+    headless()
+    import matplotlib.pyplot as plt
+
+    start = time.time()
+    try:
+        func(*args, **kwargs)
+        if title:
+            plt.suptitle(title, fontsize=18)
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            plt.savefig(path)
+        return None, time.time() - start
+    except Exception:
+        return traceback.format_exc(), time.time() - start
+    finally:
+        plt.close('all')
+
+
+class FigureQueue:
+    """Figure jobs on ``jobs`` background processes (0: in-process), skipping the groups in ``skip``."""
+
+    def __init__(self, jobs=2, skip=()):
+        self.skip = set(skip)
+        self.pool = ProcessPoolExecutor(max_workers=jobs, initializer=headless) if jobs > 0 else None
+        self.futures = []
+
+    def submit(self, group, func, *args, path=None, title=None, local=False, **kwargs):
+        """Queue ``func(*args, **kwargs)``; ``path`` saves the current figure afterwards (for functions that do not).
+
+        ``local`` renders it here and now, for arguments that cannot go to a worker process.
+        """
+        if group in self.skip:
+            return
+        name = f"{group}:{getattr(func, '__name__', func)}"
+        if self.pool is None or local:
+            self.futures.append((name, _run(func, args, kwargs, path, title)))
+        else:
+            self.futures.append((name, self.pool.submit(_run, func, args, kwargs, path, title)))
+
+    def wait(self):
+        """Wait for every queued figure; prints failures. Returns the number of failed jobs."""
+        failed = 0
+        for name, future in self.futures:
+            try:
+                error, _ = future if isinstance(future, tuple) else future.result()
+            except Exception as exc:  # the worker itself died (e.g. out of memory)
+                error = repr(exc)
+            if error:
+                failed += 1
+                print(f"❌ Plot {name} failed:\n{error}")
+        if self.pool is not None:
+            self.pool.shutdown()
+        if self.futures:
+            print(f"🖼️ {len(self.futures) - failed}/{len(self.futures)} figure job(s) done")
+        self.futures = []
+        return failed
+
+
+############################ batch_tools engine plots ############################
+
+def _pair_axes(dim, size=2.2):
+    import matplotlib.pyplot as plt
+    fig, axes = plt.subplots(dim, dim, figsize=(size * dim, size * dim), squeeze=False)
+    for i in range(dim):
+        for j in range(dim):
+            if j > i:
+                axes[i, j].axis('off')
+    return fig, axes
+
+
+def design_pairs(train_points, validation_points, names, lower, upper, path, max_scatter=2000):
+    """Pair plot of the design; hexbin density once there are more than ``max_scatter`` points."""
+    points = np.vstack([train_points, validation_points])
+    dim = points.shape[1]
+    fig, axes = _pair_axes(dim)
+    dense = len(points) > max_scatter
+    for i in range(dim):
+        axes[i, i].hist(points[:, i], bins=30, range=(lower[i], upper[i]), color='grey')
+        for j in range(i):
+            ax = axes[i, j]
+            if dense:
+                ax.hexbin(points[:, j], points[:, i], gridsize=30, cmap='Blues', mincnt=1,
+                          extent=(lower[j], upper[j], lower[i], upper[i]))
+            else:
+                ax.scatter(train_points[:, j], train_points[:, i], s=4, label='train')
+                ax.scatter(validation_points[:, j], validation_points[:, i], s=4, label='validation')
+            ax.set_xlim(lower[j], upper[j])
+            ax.set_ylim(lower[i], upper[i])
+        axes[dim - 1, i].set_xlabel(names[i])
+        axes[i, 0].set_ylabel(names[i])
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def emulator_validation(predictions, y_val, path):
+    """Emulator mean against the simulation on the validation points, as a density per emulator."""
+    import matplotlib.pyplot as plt
+    fig, axes = plt.subplots(1, len(predictions), figsize=(5 * len(predictions), 4.5), squeeze=False)
+    truth = np.ravel(y_val)
+    for ax, (name, (mean, _)) in zip(axes[0], predictions.items()):
+        ax.hexbin(truth, np.ravel(mean), gridsize=60, bins='log', cmap='viridis', mincnt=1)
+        lo, hi = np.nanmin(truth), np.nanmax(truth)
+        ax.plot([lo, hi], [lo, hi], 'r--', lw=1)
+        ax.set_title(name)
+        ax.set_xlabel("simulation")
+        ax.set_ylabel("emulator")
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def trace_bands(traces, names, path):
+    """Median and 16-84 / 2.5-97.5 % bands over the walkers at every step (traces: steps x walkers x dim)."""
+    import matplotlib.pyplot as plt
+    dim = traces.shape[2]
+    fig, axes = plt.subplots(dim, 1, figsize=(9, 1.8 * dim), sharex=True, squeeze=False)
+    steps = np.arange(len(traces))
+    q = np.percentile(traces, [2.5, 16, 50, 84, 97.5], axis=1)
+    for k, ax in enumerate(axes[:, 0]):
+        ax.fill_between(steps, q[0, :, k], q[4, :, k], alpha=0.2, color='C0')
+        ax.fill_between(steps, q[1, :, k], q[3, :, k], alpha=0.4, color='C0')
+        ax.plot(steps, q[2, :, k], color='C0', lw=1)
+        ax.set_ylabel(names[k])
+    axes[-1, 0].set_xlabel("stored step")
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def posterior_corner(samples, names, lower, upper, path, bins=50, map_point=None):
+    """Corner plot of the posterior from 1D/2D histograms (cost independent of the number of samples)."""
+    dim = samples.shape[1]
+    fig, axes = _pair_axes(dim)
+    for i in range(dim):
+        axes[i, i].hist(samples[:, i], bins=bins, range=(lower[i], upper[i]), histtype='step', color='k')
+        for j in range(i):
+            axes[i, j].hist2d(samples[:, j], samples[:, i], bins=bins, cmap='Greys',
+                              range=[[lower[j], upper[j]], [lower[i], upper[i]]])
+            if map_point is not None:
+                axes[i, j].plot(map_point[j], map_point[i], 'r+', ms=10)
+        axes[dim - 1, i].set_xlabel(names[i])
+        axes[i, 0].set_ylabel(names[i])
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+def _predict(emulator, theta, chunk=500):
+    """Emulator mean at ``theta``, in chunks to bound the memory of large sample sets."""
+    return np.vstack([emulator.predict(theta[k:k + chunk])[0] for k in range(0, len(theta), chunk)])
+
+
+def results(size, layout, x, y_data, y_err, samples_results, emulators, lower, upper, output_dir, seed=43,
+            ncols=3):
+    """Prior and posterior predictive bands of every histogram against the data (the engine's Plots.results).
+
+    ``size`` points drawn from the prior box and from each posterior go through the
+    emulators; one page per emulator and system, one panel per histogram, in
+    ``output/plots/results/Results_<emulator>_<system>.png``.
+    """
+    import matplotlib.pyplot as plt
+    rng = np.random.default_rng(seed)
+    lower, upper = np.asarray(lower, dtype=float), np.asarray(upper, dtype=float)
+    prior = lower + (upper - lower) * rng.random((size, len(lower)))
+    os.makedirs(f"{output_dir}/plots/results", exist_ok=True)
+    for name, samples in samples_results.items():
+        samples = np.asarray(samples)
+        if not len(samples):
+            continue
+        posterior = samples[rng.choice(len(samples), min(size, len(samples)), replace=False)]
+        for system in layout.systems:
+            columns = layout.system_slice(system)
+            bands = {label: np.percentile(_predict(emulators[name][system], theta), [2.5, 16, 50, 84, 97.5], axis=0)
+                     for label, theta in (("prior", prior), ("posterior", posterior))}
+            blocks = [b for b in layout.blocks if b['system'] == system]
+            nrows = -(-len(blocks) // ncols)
+            fig, axes = plt.subplots(nrows, ncols, figsize=(5 * ncols, 3.6 * nrows), squeeze=False)
+            for ax, block in zip(axes.flat, blocks):
+                rows = slice(block['start'], block['stop'])
+                local = slice(block['start'] - columns.start, block['stop'] - columns.start)
+                centres = x[rows]
+                prior_q, post_q = bands["prior"][:, local], bands["posterior"][:, local]
+                ax.fill_between(centres, prior_q[0], prior_q[4], color='grey', alpha=0.3, step='mid', label='prior 95%')
+                ax.fill_between(centres, post_q[0], post_q[4], color='C0', alpha=0.3, step='mid',
+                                label='posterior 95%')
+                ax.fill_between(centres, post_q[1], post_q[3], color='C0', alpha=0.5, step='mid',
+                                label='posterior 68%')
+                ax.step(centres, post_q[2], where='mid', color='C0', lw=1)
+                ax.errorbar(centres, y_data[rows], yerr=y_err[rows], fmt='ko', ms=3, label='data')
+                values = y_data[rows]
+                if np.all(values > 0) and values.max() > 100 * values.min():
+                    ax.set_yscale('log')
+                ax.set_title(f"{block['analysis']}/{block['histogram']}", fontsize=9)
+            for ax in list(axes.flat)[len(blocks):]:
+                ax.axis('off')
+            axes[0, 0].legend(fontsize=8)
+            fig.suptitle(f"{name} {system}")
+            fig.tight_layout()
+            fig.savefig(f"{output_dir}/plots/results/Results_{name}_{system}.png")
+            plt.close(fig)
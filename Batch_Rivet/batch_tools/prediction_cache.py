@@ -0,0 +1,167 @@
+"""Binary, memory-mapped cache of the merged prediction files for Bayes_Main.py.
+
+Every ``Prediction_Merged/Prediction__{model}__{E}__{S}__*__values.dat`` of a
+system (and its ``__errors.dat``) is parsed once into a cache directory::
+
+    input/Prediction_Cache/{model}__{E}__{S}/
+        values.npy   all histograms side by side: (DPs, total bins) float64
+        errors.npy   same shape
+        edges.npy    (total bins, 2) xmin/xmax from input/Data (nan if there is no data file)
+        index.json   columns of each histogram, header, size + mtime of every source file
+
+Later runs only stat the source files: if nothing changed the arrays are
+opened with ``mmap_mode='r'`` and each histogram is a view of its columns.
+Nothing is parsed, and since a design point is one contiguous row, picking
+the training / validation DPs only pages in those rows.  Any added, removed
+or modified source file (or a cache in an older layout) rebuilds the
+system's cache.
+
+``read_predictions()`` returns dicts laid out like ``Reader.ReadPrediction``
+(``FileName``, ``DataFile``, ``DesignFile``, ``Prediction`` as DPs x bins)
+plus ``Errors`` and ``Edges``, in the order of the files asked for.  With
+``use_cache=False`` the same dicts are parsed straight from the text files.
+"""
+
+import glob
+import json
+import os
+
+import numpy as np
+
+CACHE_DIR = "Prediction_Cache"
+LAYOUT = "dp_major"  # stored in index.json; caches in another layout are rebuilt
+
+
+def _stat(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _header(path):
+    """Header keys of a prediction file, like Reader.ReadPrediction."""
+    header = {"Version": None, "DataFile": None, "DesignFile": None}
+    with open(path) as f:
+        for line in f:
+            if not line.startswith('#'):
+                break
+            items = line.split()
+            if len(items) >= 3 and items[1] in ("Version", "Data", "Design"):
+                key = items[1] if items[1] == "Version" else items[1] + "File"
+                header[key] = items[2]
+    return header
+
+
+def _load_text(path):
+    return np.loadtxt(path, comments='#', ndmin=2)
+
+
+def _edges(data_file, n_bins):
+    if data_file and os.path.exists(data_file):
+        table = _load_text(data_file)
+        if table.shape[0] == n_bins and table.shape[1] >= 2:
+            return table[:, :2]
+    return np.full((n_bins, 2), np.nan)
+
+
+def sources(merged_dir, data_dir, model, system):
+    """{values file: [errors file, data file]} of one system."""
+    System, Energy = system.split('_')
+    out = {}
+    for values in sorted(glob.glob(os.path.join(merged_dir, f"Prediction__{model}__{Energy}__{System}__*__values.dat"))):
+        hist = os.path.basename(values)[len(f"Prediction__{model}__"):-len("__values.dat")]
+        out[values] = [values[:-len("values.dat")] + "errors.dat", os.path.join(data_dir, f"Data__{hist}.dat")]
+    return out
+
+
+def _state(files):
+    state = {}
+    for values, (errors, data) in files.items():
+        for path in (values, errors, data):
+            state[path] = _stat(path) if os.path.exists(path) else None
+    return state
+
+
+############################ Build / load ############################
+
+def parse(files):
+    """(histograms, {values, errors, edges}) of one system parsed from its text files."""
+    histograms, values, errors, edges, start = [], [], [], [], 0
+    for values_file, (errors_file, data_file) in files.items():
+        v = _load_text(values_file)
+        e = _load_text(errors_file) if os.path.exists(errors_file) else np.zeros_like(v)
+        if e.shape != v.shape:
+            raise ValueError(f"{errors_file} is {e.shape}, {values_file} is {v.shape}")
+        if values and v.shape[1] != values[0].shape[1]:
+            raise ValueError(f"{values_file} has {v.shape[1]} design points, expected {values[0].shape[1]}")
+        histograms.append({"file": values_file, "start": start, "stop": start + v.shape[0], **_header(values_file)})
+        values.append(v)
+        errors.append(e)
+        edges.append(_edges(data_file, v.shape[0]))
+        start += v.shape[0]
+
+    n_dp = values[0].shape[1] if values else 0
+    arrays = {"values": np.vstack(values).T if values else np.empty((n_dp, 0)),
+              "errors": np.vstack(errors).T if errors else np.empty((n_dp, 0)),
+              "edges": np.vstack(edges) if edges else np.empty((0, 2))}
+    return histograms, arrays
+
+
+def build(cache_dir, files):
+    """Parse the text files of one system into ``cache_dir``. Returns the index."""
+    os.makedirs(cache_dir, exist_ok=True)
+    histograms, arrays = parse(files)
+    for name, array in arrays.items():
+        with open(os.path.join(cache_dir, f"{name}.npy.tmp"), 'wb') as f:
+            np.save(f, np.ascontiguousarray(array, dtype=np.float64))
+        os.replace(os.path.join(cache_dir, f"{name}.npy.tmp"), os.path.join(cache_dir, f"{name}.npy"))
+
+    index = {"histograms": histograms, "sources": _state(files), "n_dp": arrays["values"].shape[0],
+             "layout": LAYOUT}
+    with open(os.path.join(cache_dir, "index.json.tmp"), 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(os.path.join(cache_dir, "index.json.tmp"), os.path.join(cache_dir, "index.json"))  # last: marks the cache valid
+    return index
+
+
+def load(main_dir, model, system, merged_dir=None, data_dir=None):
+    """(index, {values, errors, edges} memmaps) of one system, rebuilt first if a source changed."""
+    merged_dir = merged_dir or f"{main_dir}/input/Prediction_Merged"
+    data_dir = data_dir or f"{main_dir}/input/Data"
+    cache_dir = f"{main_dir}/input/{CACHE_DIR}/{model}__{system.split('_')[1]}__{system.split('_')[0]}"
+    files = sources(merged_dir, data_dir, model, system)
+
+    index = None
+    index_file = os.path.join(cache_dir, "index.json")
+    if os.path.exists(index_file):
+        with open(index_file) as f:
+            index = json.load(f)
+        if index.get("layout") != LAYOUT or index["sources"] != _state(files):
+            index = None
+    if index is None:
+        print(f"🔁 Building the prediction cache of {system} ({len(files)} histograms)")
+        index = build(cache_dir, files)
+    else:
+        print(f"⏭️ Prediction cache of {system} is up to date ({len(files)} histograms, {index['n_dp']} DPs)")
+    arrays = {name: np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode='r')
+              for name in ("values", "errors", "edges")}
+    return index, arrays
+
+
+def read_predictions(main_dir, model, system, prediction_files=None, merged_dir=None, data_dir=None,
+                     use_cache=True):
+    """Reader.ReadPrediction-like dicts for ``prediction_files`` (default: all values files of the system)."""
+    if use_cache:
+        index, arrays = load(main_dir, model, system, merged_dir, data_dir)
+        histograms = index["histograms"]
+    else:
+        histograms, arrays = parse(sources(merged_dir or f"{main_dir}/input/Prediction_Merged",
+                                           data_dir or f"{main_dir}/input/Data", model, system))
+    by_file = {h["file"]: h for h in histograms}
+    out = []
+    for path in prediction_files if prediction_files is not None else list(by_file):
+        h = by_file[path]
+        cols = slice(h["start"], h["stop"])
+        out.append({"FileName": path, "Version": h["Version"], "DataFile": h["DataFile"],
+                    "DesignFile": h["DesignFile"], "Prediction": arrays["values"][:, cols],
+                    "Errors": arrays["errors"][:, cols], "Edges": arrays["edges"][cols]})
+    return out
@@ -0,0 +1,198 @@
+"""Incremental merge of the per-wave design and prediction files for Bayes_Main.py.
+
+``Design__Rivet__Merged.dat`` and ``input/Prediction_Merged`` hold every DG
+wave side by side.  Instead of rebuilding them on every run, an index
+(``input/Prediction_Merged/merge_index.json``) remembers which wave files
+went into each merged file, by SHA-1; a wave file is only re-hashed when its
+size or mtime changed, so a copied or touched file does not count as new:
+
+* nothing changed            -> nothing is read or written;
+* new waves only             -> their columns are appended row by row as text;
+* an already merged wave changed, vanished or arrived out of order
+                             -> that merged file alone is rebuilt from its waves.
+
+Columns are ordered by DG then DP, the same order as the registry's design rows.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+
+from batch_tools import registry as Registry
+
+INDEX_FILE = "merge_index.json"
+PREDICTION_RE = re.compile(r"^(Prediction__.+)__DG_(\d+)__(values|errors)\.dat$")
+
+
+def _stat(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _hash(path, stat, previous):
+    """SHA-1 of a wave file, reusing ``previous`` ([size, mtime_ns, sha1]) while the stat is unchanged."""
+    if previous and previous[:2] == stat:
+        return previous[2]
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def load_index(merged_dir):
+    path = os.path.join(merged_dir, INDEX_FILE)
+    if not os.path.exists(path):
+        return {"design": None, "predictions": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_index(merged_dir, index):
+    path = os.path.join(merged_dir, INDEX_FILE)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+############################ Design ############################
+
+def merge_design(conn, prior_file, merged_file, index):
+    """Write the merged design file unless the waves and prior list are unchanged. Returns the row count."""
+    waves = [[dg, len(Registry.wave_rows(conn, dg))] for dg in Registry.waves(conn)]
+    state = {"waves": waves, "prior": _stat(prior_file), "file": merged_file}
+    total = sum(n for _, n in waves)
+    if index.get("design") == state and os.path.exists(merged_file):
+        print(f"⏭️ {os.path.basename(merged_file)} is up to date ({total} design points)")
+        return total
+
+    rows = Registry.all_design_rows(conn)
+    with open(prior_file) as f:
+        prior = f.read()
+    with open(merged_file, 'w') as f:
+        f.write(prior)
+        f.write(f"\n\n# Total Design Points Merged = {len(rows)}")
+        f.write('\n' + "# Design point indices (row index): " + ' '.join(str(i) for i in range(len(rows))) + '\n')
+        f.write("\n".join(rows) + "\n")
+    index["design"] = state
+    print(f"➕ Wrote {len(rows)} design points to {merged_file}")
+    return len(rows)
+
+
+############################ Predictions ############################
+
+def group_prediction_files(prediction_dir):
+    """{merged file name: {dg: source path}} of the per-wave prediction files."""
+    groups = {}
+    for path in glob.glob(os.path.join(prediction_dir, "Prediction__*__DG_*__*.dat")):
+        match = PREDICTION_RE.match(os.path.basename(path))
+        if match:
+            base, dg, suffix = match.groups()
+            groups.setdefault(f"{base}__{suffix}.dat", {})[int(dg)] = path
+    return groups
+
+
+def _read(path):
+    """(header lines without the design_point line, data rows) of a prediction file, rows kept as text."""
+    header, rows = [], []
+    with open(path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line.startswith('# design_point'):
+                continue  # renumbered on write
+            if line.startswith('#'):
+                header.append(line)
+            elif line.strip():
+                rows.append(line.strip())
+    return header, rows
+
+
+def _columns(row):
+    return len(row.split())
+
+
+def _design_line(n_columns):
+    return "# " + ' '.join(f"design_point{dp}" for dp in range(1, n_columns + 1))
+
+
+def _write(path, header, rows):
+    with open(path + ".tmp", 'w') as f:
+        f.write('\n'.join(header + rows) + '\n')
+    os.replace(path + ".tmp", path)
+
+
+def _rebuild(merged_path, sources):
+    header, merged_rows, n_columns = None, None, 0
+    for dg in sorted(sources):
+        wave_header, rows = _read(sources[dg])
+        if header is None:
+            header, merged_rows = wave_header, rows
+        elif len(rows) != len(merged_rows):
+            raise ValueError(f"{sources[dg]} has {len(rows)} bins, expected {len(merged_rows)}")
+        else:
+            merged_rows = [a + ' ' + b for a, b in zip(merged_rows, rows)]
+        n_columns += _columns(rows[0]) if rows else 0
+    _write(merged_path, header + [_design_line(n_columns)], merged_rows)
+    return n_columns
+
+
+def _append(merged_path, sources, new_dgs):
+    header, merged_rows = _read(merged_path)
+    n_columns = _columns(merged_rows[0]) if merged_rows else 0
+    for dg in new_dgs:
+        _, rows = _read(sources[dg])
+        if len(rows) != len(merged_rows):
+            raise ValueError(f"{sources[dg]} has {len(rows)} bins, expected {len(merged_rows)}")
+        merged_rows = [a + ' ' + b for a, b in zip(merged_rows, rows)]
+        n_columns += _columns(rows[0]) if rows else 0
+    _write(merged_path, header + [_design_line(n_columns)], merged_rows)
+    return n_columns
+
+
+def merge_predictions(prediction_dir, merged_dir, index):
+    """Bring ``merged_dir`` up to date with the per-wave prediction files. Returns {action: count}."""
+    os.makedirs(merged_dir, exist_ok=True)
+    done = index.setdefault("predictions", {})
+    actions = {"unchanged": 0, "appended": 0, "rebuilt": 0}
+    for name, sources in sorted(group_prediction_files(prediction_dir).items()):
+        merged_path = os.path.join(merged_dir, name)
+        seen = done.get(name, {}).get("files", {})
+        files = {}
+        for dg, path in sources.items():
+            stat = _stat(path)
+            files[str(dg)] = stat + [_hash(path, stat, seen.get(str(dg)))]
+        state = {dg: entry[2] for dg, entry in files.items()}
+        previous = done.get(name, {}).get("waves", {})
+        if previous == state and os.path.exists(merged_path):
+            done[name]["files"] = files
+            actions["unchanged"] += 1
+            continue
+
+        new_dgs = sorted(int(dg) for dg in state if dg not in previous)
+        appendable = (previous and new_dgs and os.path.exists(merged_path)
+                      and all(state.get(dg) == sha1 for dg, sha1 in previous.items())
+                      and min(new_dgs) > max(int(dg) for dg in previous))
+        if appendable:
+            columns = _append(merged_path, sources, new_dgs)
+            actions["appended"] += 1
+        else:
+            columns = _rebuild(merged_path, sources)
+            actions["rebuilt"] += 1
+        done[name] = {"waves": state, "files": files, "columns": columns}
+
+    for name in set(done) - set(group_prediction_files(prediction_dir)):
+        del done[name]  # source files removed: forget them (the merged file is left alone)
+    return actions
+
+
+def merge_all(conn, main_dir):
+    """Merged design file and Prediction_Merged of ``main_dir``, updated incrementally."""
+    merged_dir = f"{main_dir}/input/Prediction_Merged"
+    os.makedirs(merged_dir, exist_ok=True)
+    index = load_index(merged_dir)
+    n_points = merge_design(conn, f"{main_dir}/input/Rivet/parameter_prior_list.dat",
+                            f"{main_dir}/input/Design/Design__Rivet__Merged.dat", index)
+    actions = merge_predictions(f"{main_dir}/input/Prediction", merged_dir, index)
+    save_index(merged_dir, index)
+    print(f"🔁 Prediction_Merged: {actions['appended']} appended, {actions['rebuilt']} rebuilt, "
+          f"{actions['unchanged']} unchanged")
+    return n_points, merged_dir
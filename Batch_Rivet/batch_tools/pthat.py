@@ -0,0 +1,234 @@
+"""pT-hat binning: pilot-based edge/event-budget optimisation and cross-section-weighted stitching.
+
+Optimisation
+    A short pilot runs one design point on a fine grid of pT-hat bins.  From the
+    RAW (pre-finalize) histograms, ``_XSEC`` and ``_EVCOUNT`` of each bin we get
+    the cross-section sigma_k and the per-event first/second moments of every
+    target histogram bin.  For a coarse bin K (a run of fine bins) the
+    stitched relative variance is A_K / N_K, so for a fixed CPU budget the
+    optimal events are N_K ~ sqrt(A_K / c_K) (c_K = CPU per event) and the
+    total variance is (sum_K sqrt(A_K c_K))**2 / budget.  The edges minimising
+    that sum are found exactly by dynamic programming over the fine edges.
+
+Stitching
+    The runs of each bin are combined with cross-section weights by
+    yoda_merge.py, using the pT-hat bin recorded with every model run.
+
+Command line, from Batch_Rivet (one collision system)::
+
+    python -m batch_tools.pthat --main_dir <dir> --system pp_200 --fine_edges 5 7 9 11 13 15 20 25 30 40 60 \
+        --n_bins 6 --pilot_events 2000 --budget 600000
+"""
+
+import argparse
+import subprocess
+
+import numpy as np
+
+from batch_tools import executor as Executor
+from batch_tools import registry as Registry
+from batch_tools import yoda_io as YodaIO
+
+TARGET_ANALYSES = ("STAR_2003_I631869", "STAR_2020_I1783875", "STAR_2021_I1853218")
+
+
+############################ Reading runs ############################
+
+def read_run(path, keys):
+    """Cross-section, event count, finalised and RAW histograms of one YODA file."""
+    wanted = [f"/{a}/{h}" for a, h in keys] + [f"/RAW/{a}/{h}" for a, h in keys] + ["/_XSEC", "/_EVCOUNT"]
+    objects = {YodaIO.canonical(p): obj for p, obj in YodaIO.read_objects(path, wanted).items()}
+    run = {'xsec': np.nan, 'nevents': np.nan, 'final': {}, 'raw': {}}
+    if '/XSEC' in objects:
+        run['xsec'] = YodaIO.scalar(objects['/XSEC'])
+    if '/EVCOUNT' in objects:
+        run['nevents'] = YodaIO.scalar(objects['/EVCOUNT'])
+    for key in keys:
+        for kind, prefix in (('final', ''), ('raw', '/RAW')):
+            obj = objects.get(YodaIO.canonical(f"{prefix}/{key[0]}/{key[1]}"))
+            if obj is not None:
+                run[kind][key] = YodaIO.to_bins(obj)
+    return run
+
+
+############################ Optimisation ############################
+
+def pilot_moments(bins, keys):
+    """sigma (F,), per-event first/second moments (F, B) of the RAW target histograms."""
+    sigma = np.array([b['xsec'] for b in bins])
+    m1, m2 = [], []
+    for b in bins:
+        n = b['nevents']
+        cols1, cols2 = [], []
+        for key in keys:
+            if all(key in other['raw'] for other in bins):
+                xmin, xmax, y, yerr = b['raw'][key]
+                cols1.append(y / n)
+                cols2.append(yerr ** 2 / n)
+        m1.append(np.concatenate(cols1) if cols1 else np.zeros(0))
+        m2.append(np.concatenate(cols2) if cols2 else np.zeros(0))
+    return sigma, np.array(m1), np.array(m2)
+
+
+def segment_terms(sigma, m1, m2, cost, h):
+    """A_K and c_K of every contiguous run [i, j) of fine bins, as (F+1, F+1) tables."""
+    F = len(sigma)
+    A = np.full((F + 1, F + 1), np.inf)
+    c = np.full((F + 1, F + 1), np.inf)
+    good = h > 0
+    for i in range(F):
+        for j in range(i + 1, F + 1):
+            s = sigma[i:j]
+            S = s.sum()
+            if S <= 0:
+                continue
+            e1 = (s[:, None] * m1[i:j]).sum(0) / S
+            e2 = (s[:, None] * m2[i:j]).sum(0) / S
+            A[i, j] = (S ** 2 * np.maximum(e2 - e1 ** 2, 0.0))[good].dot(1.0 / h[good] ** 2)
+            c[i, j] = s.dot(cost[i:j]) / S
+    return A, c
+
+
+def optimise_edges(fine_edges, sigma, m1, m2, cost, n_bins):
+    """Best ``n_bins`` coarse bins out of the fine ones.
+
+    ``fine_edges`` are the lower edges of the fine bins, the last one open ended.
+    Returns (edges, A, c, objective) with objective = sum_K sqrt(A_K c_K).
+    """
+    F = len(fine_edges)
+    n_bins = min(n_bins, F)
+    h = (sigma[:, None] * m1).sum(0)
+    A, c = segment_terms(sigma, m1, m2, cost, h)
+    g = np.sqrt(A * c)
+
+    best = np.full((n_bins + 1, F + 1), np.inf)
+    prev = np.zeros((n_bins + 1, F + 1), dtype=int)
+    best[0, 0] = 0.0
+    for k in range(1, n_bins + 1):
+        for j in range(k, F + 1):
+            options = best[k - 1, :j] + g[:j, j]
+            prev[k, j] = int(np.argmin(options))
+            best[k, j] = options[prev[k, j]]
+
+    cuts, j = [F], F
+    for k in range(n_bins, 0, -1):
+        j = prev[k, j]
+        cuts.append(j)
+    cuts = cuts[::-1]
+    segments = list(zip(cuts[:-1], cuts[1:]))
+    edges = [fine_edges[i] for i, _ in segments]
+    return (edges, np.array([A[i, j] for i, j in segments]), np.array([c[i, j] for i, j in segments]),
+            best[n_bins, F])
+
+
+def allocate(A, c, budget):
+    """Events per bin minimising sum A_K / N_K for sum c_K N_K = budget (Neyman allocation)."""
+    n = np.sqrt(A / c)
+    n *= budget / n.dot(c)
+    return np.maximum(np.round(n), 1).astype(int)
+
+
+def variance(A, n):
+    return float(np.sum(A / n))
+
+
+############################ Pilot ############################
+
+def read_analyses_list(path, system):
+    """{analysis: [hists]} of one system block of analyses_list.txt."""
+    analyses, tag = {}, None
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.endswith(':'):
+                tag = line[:-1]
+            elif tag == system:
+                parts = line.split()
+                analyses[parts[0]] = parts[1:]
+    return analyses
+
+
+def run_pilot(main_dir, model, system, fine_edges, pilot_events, seed, dp=1, jobs=1):
+    """Run one DP on every fine pT-hat bin (one merge tag per bin) and return the merged files."""
+    from Bayes_HEP.Design_Points import design_points as DesignPoints
+
+    conn = Registry.connect(main_dir)
+    dg = Registry.latest_wave(conn)
+    names = Registry.parameter_names(conn)
+    design_points = Registry.rows_to_array(Registry.wave_rows(conn, dg), len(names))
+    input_dir, project_dir = f"{main_dir}/input/Rivet", f"{main_dir}/rivet"
+    analyses = {system: list(read_analyses_list(f"{input_dir}/analyses_list.txt", system))}
+    System, Energy = system.split('_')
+
+    pt_bins = Executor.pt_hat_bins(fine_edges)
+    tasks = Executor.build_model_tasks(model, [system], analyses, design_points, names,
+                                       DesignPoints.generate_param_tag, input_dir, project_dir, pilot_events,
+                                       seed, pt_bins, 1, [dp - 1])
+    for k, task in enumerate(tasks):
+        task['merge_tag'] = f"PILOT_{k + 1}"  # keep every bin apart
+        task['name'] = f"{system}_PILOT_{k + 1}_pt{task['pt_bin'][0]}-{task['pt_bin'][1]}"
+        task['cmd'] = Executor.model_command(task)
+    results = Executor.run_tasks(tasks, jobs, f"{main_dir}/rivet/logs" if jobs > 1 else None)
+    if Executor.print_summary(results):
+        raise RuntimeError("Pilot runs failed")
+
+    files, cost = [], []
+    for k, r in enumerate(results):
+        subprocess.run(['bash', Executor.share_path('Design_Points', 'Rivet_Analyses', 'merge.sh'),
+                        project_dir, model, System, Energy, f"PILOT_{k + 1}"], check=True)
+        files.append(YodaIO.find_merged_yoda(project_dir, model, System, Energy, f"PILOT_{k + 1}"))
+        cost.append(r['elapsed'] / pilot_events)
+    return files, np.array(cost)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimise pT-hat bin edges and per-bin event budgets.")
+    parser.add_argument("--main_dir", type=str, required=True)
+    parser.add_argument("--system", type=str, default="pp_200")
+    parser.add_argument("--model", type=str, default="pythia8")
+    parser.add_argument("--fine_edges", nargs="+", type=int, required=True,
+                        help="Fine pilot pT-hat edges; the last bin is open ended")
+    parser.add_argument("--n_bins", type=int, default=6, help="Number of coarse bins to propose")
+    parser.add_argument("--pilot_events", type=int, default=2000)
+    parser.add_argument("--budget", type=float, default=None,
+                        help="Total events of the equivalent flat allocation (default: n_bins x pilot_events x 50)")
+    parser.add_argument("--analyses", nargs="+", default=list(TARGET_ANALYSES))
+    parser.add_argument("--dp", type=int, default=1, help="Design point used for the pilot")
+    parser.add_argument("--seed", type=int, default=9001)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--pilot_files", nargs="*", default=None,
+                        help="Reuse merged pilot YODA files (one per fine bin) instead of running the pilot")
+    args = parser.parse_args()
+
+    histograms = read_analyses_list(f"{args.main_dir}/input/Rivet/analyses_list.txt", args.system)
+    keys = [(a, h) for a in args.analyses for h in histograms.get(a, [])]
+    if not keys:
+        raise SystemExit(f"❌ None of {args.analyses} is listed for {args.system}")
+
+    if args.pilot_files:
+        files, cost = args.pilot_files, np.ones(len(args.pilot_files))
+    else:
+        files, cost = run_pilot(args.main_dir, args.model, args.system, args.fine_edges, args.pilot_events,
+                                args.seed, args.dp, args.jobs)
+    bins = [read_run(f, keys) for f in files]
+    sigma, m1, m2 = pilot_moments(bins, keys)
+    if m1.shape[1] == 0:
+        raise SystemExit("❌ Pilot files contain no RAW histograms for the target analyses")
+
+    edges, A, c, _ = optimise_edges(args.fine_edges, sigma, m1, m2, cost / cost.mean(), args.n_bins)
+    budget = args.budget or len(edges) * args.pilot_events * 50
+    flat = np.full(len(edges), budget / len(edges))
+    events = allocate(A, c, c.dot(flat))  # same CPU as the flat allocation
+
+    print(f"📈 Cross-section per fine bin: {', '.join(f'{s:.3g}' for s in sigma)}")
+    print(f"✂️ Proposed edges: {edges} (last bin open ended)")
+    print(f"🎯 Events per bin: {events.tolist()}")
+    print(f"📉 Relative variance vs flat allocation at equal CPU: {variance(A, events) / variance(A, flat):.3f}")
+
+    out = f"{args.main_dir}/input/Rivet/pthat_bins_{args.system}.txt"
+    with open(out, 'w') as f:
+        f.write(f"PT_EDGES=({' '.join(str(e) for e in edges)})\n")
+        f.write(f"PT_EVENTS=({' '.join(str(n) for n in events)})\n")
+    print(f"📝 Wrote {out}")
@@ -0,0 +1,268 @@
+"""SQLite registry of design waves, design points and per-stage run status.
+
+The registry lives next to the design files (``input/Design/design_registry.sqlite``)
+and replaces globbing/parsing ``Design__Rivet__*.dat`` to find the current wave.
+The text design files are still written, since Reader.ReadDesign consumes them.
+
+Command line use (for the Slurm scripts)::
+
+    python registry.py --main_dir <dir> latest     # newest DG index
+    python registry.py --main_dir <dir> count      # design points in the newest wave
+    python registry.py --main_dir <dir> status     # per-stage status counts
+    python registry.py --main_dir <dir> import     # register Design__Rivet__N.dat waves added by hand
+"""
+
+import argparse
+import glob
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+REGISTRY_FILE = "input/Design/design_registry.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS waves (
+    dg          INTEGER PRIMARY KEY,
+    lhs_seed    INTEGER,
+    nsamples    INTEGER,
+    design_file TEXT,
+    created     REAL
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    position INTEGER PRIMARY KEY,
+    name     TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS design_points (
+    dg     INTEGER NOT NULL,
+    dp     INTEGER NOT NULL,
+    params TEXT NOT NULL,
+    PRIMARY KEY (dg, dp)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    dg      INTEGER NOT NULL,
+    dp      INTEGER NOT NULL,
+    system  TEXT NOT NULL,
+    stage   TEXT NOT NULL,
+    seed    INTEGER NOT NULL DEFAULT -1,
+    nevents INTEGER,
+    status  TEXT NOT NULL,
+    updated REAL,
+    inputs  TEXT,
+    outputs TEXT,
+    pt_min  REAL,
+    pt_max  REAL,
+    PRIMARY KEY (dg, dp, system, stage, seed)
+);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path     TEXT PRIMARY KEY,
+    size     INTEGER,
+    mtime_ns INTEGER,
+    sha1     TEXT
+);
+"""
+
+RUN_COLUMNS = "(dg, dp, system, stage, seed, nevents, status, updated, inputs, outputs, pt_min, pt_max)"
+
+
+def format_row(row):
+    """Text form of one design point, identical to what Rivet_Main writes to the .dat files."""
+    return ' '.join(f"{val:.18e}" for val in row)
+
+
+def connect(main_dir, timeout=300, import_designs=False):
+    """Open (and create if needed) the registry of ``main_dir``.
+
+    A long busy timeout lets concurrent array tasks queue on the write lock
+    instead of failing.  The design directory is only scanned when the
+    registry is created (importing the existing waves) or with
+    ``import_designs`` (waves added by hand); other connections, such as
+    those of array tasks, never glob it.
+    """
+    path = os.path.join(main_dir, REGISTRY_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    created = not os.path.exists(path)
+    conn = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    if created or import_designs:
+        import_design_files(conn, os.path.dirname(path))
+    return conn
+
+
+MIGRATIONS = (("inputs", "TEXT"), ("outputs", "TEXT"), ("pt_min", "REAL"), ("pt_max", "REAL"))
+
+
+def _missing_columns(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(runs)")}
+    return [(column, kind) for column, kind in MIGRATIONS if column not in columns]
+
+
+def _migrate(conn):
+    """Add columns introduced after a registry was first created.
+
+    Checked again under the write lock, so tasks upgrading the same registry
+    at once add every column exactly once.
+    """
+    if not _missing_columns(conn):
+        return
+    with transaction(conn):
+        for column, kind in _missing_columns(conn):
+            conn.execute(f"ALTER TABLE runs ADD COLUMN {column} {kind}")
+
+
+@contextmanager
+def transaction(conn):
+    """BEGIN IMMEDIATE ... COMMIT, rolling back on error.
+
+    Taking the write lock up front makes read-modify-write sequences such as
+    allocating the next DG index safe against concurrent array tasks.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _read_design_file(design_file):
+    names, seed, rows = [], None, []
+    with open(design_file) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("#"):
+                if line.startswith("# Parameter "):
+                    names = line.split()[2:]
+                elif "LHS Seed =" in line:
+                    seed = int(line.split("LHS Seed =")[1].split(";")[0])
+                continue
+            rows.append(format_row(float(val) for val in line.split()))
+    return names, seed, rows
+
+
+def import_design_files(conn, design_dir):
+    """Register every numbered Design__Rivet__N.dat wave that is not yet known."""
+    known = set(waves(conn))
+    for design_file in sorted(glob.glob(os.path.join(design_dir, "Design__Rivet__*.dat"))):
+        tag = design_file.split("__")[-1].split(".")[0]
+        if not tag.isdigit() or int(tag) in known:
+            continue
+        names, seed, rows = _read_design_file(design_file)
+        with transaction(conn):
+            inserted = conn.execute("INSERT OR IGNORE INTO waves VALUES (?, ?, ?, ?, ?)",
+                                    (int(tag), seed, len(rows), os.path.basename(design_file),
+                                     os.path.getmtime(design_file))).rowcount
+            if inserted:
+                _insert_points(conn, int(tag), rows)
+                _set_parameters(conn, names)
+        if inserted:
+            print(f"Registered {len(rows)} design points from {os.path.basename(design_file)}")
+
+
+def _set_parameters(conn, names):
+    if names:
+        conn.executemany("INSERT OR REPLACE INTO parameters VALUES (?, ?)", list(enumerate(names)))
+
+
+def _insert_points(conn, dg, rows):
+    conn.executemany("INSERT OR REPLACE INTO design_points VALUES (?, ?, ?)",
+                     [(dg, dp, row) for dp, row in enumerate(rows, start=1)])
+
+
+def new_wave(conn, design_points, parameter_names, lhs_seed):
+    """Atomically allocate the next DG index and store its design points."""
+    rows = [format_row(row) for row in design_points]
+    with transaction(conn):
+        dg = conn.execute("SELECT COALESCE(MAX(dg), 0) + 1 FROM waves").fetchone()[0]
+        conn.execute("INSERT INTO waves VALUES (?, ?, ?, ?, ?)",
+                     (dg, lhs_seed, len(rows), f"Design__Rivet__{dg}.dat", time.time()))
+        _insert_points(conn, dg, rows)
+        _set_parameters(conn, parameter_names)
+    return dg
+
+
+def latest_wave(conn):
+    """Newest DG index, or 0 if no design has been registered."""
+    return conn.execute("SELECT COALESCE(MAX(dg), 0) FROM waves").fetchone()[0]
+
+
+def waves(conn):
+    return [dg for (dg,) in conn.execute("SELECT dg FROM waves ORDER BY dg")]
+
+
+def parameter_names(conn):
+    return [name for (name,) in conn.execute("SELECT name FROM parameters ORDER BY position")]
+
+
+def wave_rows(conn, dg):
+    """Design point rows (text) of one wave, ordered by DP."""
+    return [row for (row,) in conn.execute("SELECT params FROM design_points WHERE dg = ? ORDER BY dp", (dg,))]
+
+
+def all_design_rows(conn):
+    """Design point rows of every wave, ordered by (DG, DP)."""
+    return [row for (row,) in conn.execute("SELECT params FROM design_points ORDER BY dg, dp")]
+
+
+def rows_to_array(rows, dim):
+    import numpy as np
+    return np.array([[float(v) for v in row.split()] for row in rows]).reshape(-1, dim)
+
+
+def _run_row(dg, dp, system, stage, status, seed=-1, nevents=None, inputs=None, outputs=None, pt_bin=None):
+    pt_min, pt_max = pt_bin if pt_bin is not None else (None, None)
+    return (dg, dp, system, stage, -1 if seed is None else seed, nevents, status, time.time(), inputs, outputs,
+            pt_min, pt_max)
+
+
+def record_run(conn, dg, dp, system, stage, status, seed=-1, nevents=None, inputs=None, outputs=None, pt_bin=None):
+    """Insert/update the status of one (DG, DP, system, stage, seed) unit.
+
+    ``inputs`` / ``outputs`` are the manifest fingerprint and output hashes (see manifest.py),
+    ``pt_bin`` the (PT_Min, PT_Max) of a model run.
+    """
+    conn.execute(f"INSERT OR REPLACE INTO runs {RUN_COLUMNS} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                 _run_row(dg, dp, system, stage, status, seed, nevents, inputs, outputs, pt_bin))
+
+
+def get_run(conn, dg, dp, system, stage, seed=-1):
+    """(status, inputs, outputs) of one unit, or None if it was never recorded."""
+    return conn.execute("SELECT status, inputs, outputs FROM runs WHERE dg = ? AND dp = ? AND system = ? "
+                        "AND stage = ? AND seed = ?", (dg, dp, system, stage, seed)).fetchone()
+
+
+def get_run_bins(conn, dg, dp, system, stage):
+    """[((pt_min, pt_max), status, outputs)] of every recorded unit of one DP/system/stage."""
+    return [((pt_min, pt_max), status, outputs) for pt_min, pt_max, status, outputs in conn.execute(
+        "SELECT pt_min, pt_max, status, outputs FROM runs WHERE dg = ? AND dp = ? AND system = ? AND stage = ? "
+        "ORDER BY seed", (dg, dp, system, stage))]
+
+
+def get_runs(conn, dg, dp, system, stage):
+    """[(seed, status, inputs, outputs)] of every recorded unit of one DP/system/stage."""
+    return conn.execute("SELECT seed, status, inputs, outputs FROM runs WHERE dg = ? AND dp = ? AND system = ? "
+                        "AND stage = ? ORDER BY seed", (dg, dp, system, stage)).fetchall()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the design/run registry.")
+    parser.add_argument("--main_dir", type=str, required=True)
+    parser.add_argument("query", choices=["latest", "count", "status", "import"])
+    parser.add_argument("--dg", type=int, default=None, help="Wave to query (default: latest)")
+    args = parser.parse_args()
+
+    conn = connect(args.main_dir, import_designs=args.query == "import")
+    dg = args.dg if args.dg is not None else latest_wave(conn)
+    if args.query in ("latest", "import"):
+        print(dg)
+    elif args.query == "count":
+        print(len(wave_rows(conn, dg)))
+    else:
+        for system, stage, status, n in conn.execute(
+                "SELECT system, stage, status, COUNT(DISTINCT dp) FROM runs WHERE dg = ? "
+                "GROUP BY system, stage, status ORDER BY system, stage", (dg,)):
+            print(f"{system} {stage} {status} {n}")
@@ -0,0 +1,222 @@
+"""Bulk writer for the Write_input_Rivet stage.
+
+Instead of appending one design point column at a time to every
+``Prediction__...__DG_N`` file, all DPs of a histogram are collected in memory
+(bins x DPs) and each Data / Prediction values / errors file is written once.
+
+Two sources are supported: the per-DP ``__data.py`` files of the HTML reports
+(read in parallel, see read_report_data), or the merged per-DP ``.yoda`` files
+read directly with yoda_io, which needs no HTML report at all.  Either way the
+Data / Prediction files are written by write_data / write_prediction only.
+"""
+
+import os
+import runpy
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_tools import yoda_io as YodaIO
+
+
+def report_base(project_dir, model, System, Energy, DP, analysis, hist):
+    return f"{project_dir}/Models/{model}/html_reports/{model}_{System}_{Energy}_DP_{DP}_report.html/{analysis}/{hist}"
+
+
+def data_name(main_dir, Energy, System, analysis, hist):
+    return f"{main_dir}/input/Data/Data__{Energy}__{System}__{analysis}__{hist}"
+
+
+def prediction_name(main_dir, model, Energy, System, analysis, hist, dg):
+    return f"{main_dir}/input/Prediction/Prediction__{model}__{Energy}__{System}__{analysis}__{hist}__DG_{dg}"
+
+
+def source_files(project_dir, model, system, system_analyses, histograms, DP, source='html'):
+    """Files write_inputs reads for one DP (empty if any of them is missing)."""
+    System, Energy = system.split('_')
+    if source == 'yoda':
+        yoda_file = YodaIO.find_merged_yoda(project_dir, model, System, Energy, f"DP_{DP}")
+        return [yoda_file] if yoda_file else []
+    files = [report_base(project_dir, model, System, Energy, DP, analysis, hist) + suffix
+             for analysis in system_analyses for hist in histograms[analysis] for suffix in ("__data.py", ".py")]
+    return files if all(os.path.exists(f) for f in files) else []
+
+
+def output_files(main_dir, model, system, system_analyses, histograms, dg):
+    """Data and Prediction files write_inputs produces for one system."""
+    System, Energy = system.split('_')
+    files = []
+    for analysis in system_analyses:
+        for hist in histograms[analysis]:
+            pred_name = prediction_name(main_dir, model, Energy, System, analysis, hist, dg)
+            files += [data_name(main_dir, Energy, System, analysis, hist) + ".dat",
+                      f"{pred_name}__values.dat", f"{pred_name}__errors.dat"]
+    return files
+
+
+def write_prediction(pred_name, data_file, obs, subobs, dp_labels, values, errors):
+    """Write ``<pred_name>__values.dat`` and ``__errors.dat`` (bins x DPs) in one go."""
+    header = [
+        "# Version 0.0",
+        f"# Data {data_file}",
+        f"# Observable: {obs}",
+        f"# Subobservable: {subobs}",
+        "# Design Design_Rivet.dat",
+        "# " + ' '.join(f"design_point{dp}" for dp in dp_labels),
+    ]
+    for suffix, matrix in (("values", values), ("errors", errors)):
+        with open(f"{pred_name}__{suffix}.dat", 'w') as f:
+            f.write('\n'.join(header) + '\n')
+            for row in np.atleast_2d(matrix):
+                f.write(' '.join(f"{val:.6e}" for val in row) + '\n')
+
+
+def write_data(data_name, obs, subobs, bins):
+    """Write ``<data_name>.dat`` from (xmin, xmax, y, yerr), in RivetParser's format."""
+    with open(f"{data_name}.dat", 'w') as f:
+        f.write("# Version 0.0\n")
+        f.write(f"# Observable: {obs} \n")
+        f.write(f"# Subobservable: {subobs} \n")
+        f.write("# Label xmin xmax y y_err\n")
+        for row in np.column_stack(bins):
+            f.write(' '.join(f"{val:.6e}" for val in row) + '\n')
+
+
+def read_report_data(datafile, model):
+    """{curve: (xmin, xmax, y, yerr)} of one rivet-mkhtml ``<hist>__data.py``.
+
+    The file is a python module with ``xmin``/``xmax`` arrays and ``yvals``/``yerrs``
+    dicts keyed by curve: the ``model`` curve and, if present, ``'REF'``.
+    """
+    namespace = runpy.run_path(datafile)
+    xmin, xmax = np.asarray(namespace['xmin'], dtype=float), np.asarray(namespace['xmax'], dtype=float)
+    return {curve: (xmin, xmax, np.asarray(namespace['yvals'][curve], dtype=float),
+                    np.asarray(namespace['yerrs'][curve], dtype=float))
+            for curve in (model, 'REF') if curve in namespace['yvals']}
+
+
+def _extract_dp(job):
+    """Worker: {key: curves} of every histogram of one DP."""
+    DP, entries, model = job
+    return DP, {key: read_report_data(datafile, model) for key, datafile in entries}
+
+
+def _read_dp_yoda(job):
+    """Worker: (xmin, xmax, y, yerr) of every histogram of one DP, from its merged YODA file."""
+    DP, yoda_file, keys = job
+    bins = YodaIO.read_histograms(yoda_file, keys)
+    return DP, bins if len(bins) == len(keys) else None
+
+
+def _map(func, work, jobs):
+    if jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            return dict(pool.map(func, work))
+    return dict(map(func, work))
+
+
+def write_inputs(main_dir, project_dir, model, system, system_analyses, histograms, n_design_points, dg,
+                 jobs=1, source='html'):
+    """Write Data and Prediction files of one collision system for DPs 1..n_design_points.
+
+    ``source`` is 'html' (mkhtml.sh reports) or 'yoda' (merged YODA files).
+    Returns {DP: 'done' | 'missing'}.
+    """
+    if source == 'yoda':
+        return _write_inputs_yoda(main_dir, project_dir, model, system, system_analyses, histograms,
+                                  n_design_points, dg, jobs)
+
+    from Bayes_HEP.Design_Points import rivet_html_parser as RivetParser
+
+    System, Energy = system.split('_')
+    keys = [(analysis, hist) for analysis in system_analyses for hist in histograms[analysis]]
+    DPs = list(range(1, n_design_points + 1))
+
+    # Labels and reference data do not depend on the DP: parse them once.
+    labels, available = {}, {}
+    for DP in DPs:
+        missing = [k for k in keys if not os.path.exists(report_base(project_dir, model, System, Energy, DP, *k) + "__data.py")]
+        if missing:
+            print(f"[WARN] Missing data file for DP {DP}: "
+                  f"{report_base(project_dir, model, System, Energy, DP, *missing[0])}__data.py — skipping DP {DP}")
+            continue
+        available[DP] = True
+        for key in keys:
+            if key not in labels:
+                labels[key] = RivetParser.extract_labels(report_base(project_dir, model, System, Energy, DP, *key) + ".py")
+
+    status = {DP: 'done' if DP in available else 'missing' for DP in DPs}
+    if not available:
+        return status
+
+    work = [(DP, [(key, report_base(project_dir, model, System, Energy, DP, *key) + "__data.py") for key in keys],
+             model)
+            for DP in available]
+    curves = _map(_extract_dp, work, jobs)
+
+    dp_labels = sorted(curves)
+    first = curves[dp_labels[0]]
+    for key in keys:
+        analysis, hist = key
+        obs, subobs = labels[key]
+        input_data_name = data_name(main_dir, Energy, System, analysis, hist)
+        input_pred_name = prediction_name(main_dir, model, Energy, System, analysis, hist, dg)
+
+        # Reference data does not depend on the DP: taken from the first complete one.
+        if 'REF' not in first[key]:
+            raise ValueError(f"❌ No reference data in the {analysis}/{hist} report of DP {dp_labels[0]}")
+        write_data(input_data_name, obs, subobs, first[key]['REF'])
+        values = np.column_stack([curves[DP][key][model][2] for DP in dp_labels])
+        errors = np.column_stack([curves[DP][key][model][3] for DP in dp_labels])
+        write_prediction(input_pred_name, f"{input_data_name}.dat", obs, subobs, dp_labels, values, errors)
+
+    print(f"📝 Wrote {len(keys)} histograms x {len(dp_labels)} design points for {system}")
+    return status
+
+
+def _write_inputs_yoda(main_dir, project_dir, model, system, system_analyses, histograms, n_design_points, dg,
+                       jobs=1):
+    System, Energy = system.split('_')
+    keys = [(analysis, hist) for analysis in system_analyses for hist in histograms[analysis]]
+    DPs = list(range(1, n_design_points + 1))
+
+    work = []
+    for DP in DPs:
+        yoda_file = YodaIO.find_merged_yoda(project_dir, model, System, Energy, f"DP_{DP}")
+        if yoda_file is None:
+            print(f"[WARN] Missing merged YODA file for DP {DP} — skipping DP {DP}")
+            continue
+        work.append((DP, yoda_file, keys))
+
+    bins = {DP: dp_bins for DP, dp_bins in _map(_read_dp_yoda, work, jobs).items() if dp_bins is not None}
+    for DP, _, _ in work:
+        if DP not in bins:
+            print(f"[WARN] Histograms missing from the merged YODA file of DP {DP} — skipping DP {DP}")
+
+    status = {DP: 'done' if DP in bins else 'missing' for DP in DPs}
+    if not bins:
+        return status
+
+    dp_labels = sorted(bins)
+    first = bins[dp_labels[0]]
+    analyses_dir = f"{project_dir}/Rivet_Analyses"
+    for analysis in system_analyses:
+        hists = histograms[analysis]
+        labels = YodaIO.read_plot_labels(analyses_dir, analysis, hists)
+        # Discrete reference axes take the prediction binning, as in the HTML reports.
+        reference = YodaIO.read_reference(analyses_dir, analysis, hists,
+                                          {hist: first[(analysis, hist)][:2] for hist in hists})
+        for hist in hists:
+            if hist not in reference:
+                raise ValueError(f"❌ No reference data for /REF/{analysis}/{hist}")
+            obs, subobs = labels.get(hist, ('', ''))
+            input_data_name = data_name(main_dir, Energy, System, analysis, hist)
+            input_pred_name = prediction_name(main_dir, model, Energy, System, analysis, hist, dg)
+
+            write_data(input_data_name, obs, subobs, reference[hist])
+            values = np.column_stack([bins[DP][(analysis, hist)][2] for DP in dp_labels])
+            errors = np.column_stack([bins[DP][(analysis, hist)][3] for DP in dp_labels])
+            write_prediction(input_pred_name, f"{input_data_name}.dat", obs, subobs, dp_labels, values, errors)
+
+    print(f"📝 Wrote {len(keys)} histograms x {len(dp_labels)} design points for {system} (from YODA)")
+    return status
@@ -0,0 +1,216 @@
+"""Deterministic stand-ins for the Bayes_HEP model / Rivet scripts, for benchmarks without Pythia or Rivet.
+
+``install(share_dir, model)`` writes a ``Design_Points`` tree with the same
+layout as ``/usr/local/share/Bayes_HEP``::
+
+    Design_Points/Models/<model>/scripts/run_<model>.sh
+    Design_Points/Rivet_Analyses/{run_analysis,merge,mkhtml}.sh
+
+each a thin wrapper around this module; point ``$BAYES_HEP_SHARE`` at
+``share_dir`` (see executor.share_path) and the pipeline runs them instead of
+the real scripts, with the same arguments.
+
+* ``run_model``    -- one YODA file per run under ``Models/<model>/yoda``,
+  named after the system, merge tag, pT-hat bin and seed (the pipeline finds
+  it from the merge tag and seed, as for the real script), with every
+  histogram of analyses_list.txt for the system, binned like the reference data (10 uniform bins if there is none).  The values are a smooth function of the
+  parameters found in the parameter tag, with statistical noise seeded by
+  the run seed and scaled by the number of events, plus /_EVCOUNT and /_XSEC;
+* ``merge``        -- merges the runs of one DP with yoda_merge (pT-hat bins
+  stitched) into ``<model>_<Sys>_<E>_<DP>.yoda``, where merge.sh puts it;
+* ``mkhtml``       -- writes ``<hist>__data.py`` / ``<hist>.py`` of every
+  histogram in the html_reports tree of the merged file;
+* ``run_analysis`` -- marks every analysis as built in ``analyses.log``.
+
+The same inputs always give byte-identical outputs.
+"""
+
+import argparse
+import glob
+import os
+import re
+import sys
+import zlib
+
+import numpy as np
+
+from batch_tools import pthat as PtHat
+from batch_tools import yoda_io as YodaIO
+from batch_tools import yoda_merge as YodaMerge
+
+SCRIPTS = {"run_analysis.sh": "run_analysis", "merge.sh": "merge", "mkhtml.sh": "mkhtml"}
+
+
+def install(share_dir, model="pythia8", python=sys.executable):
+    """Write the stand-in scripts under ``share_dir``. Returns ``share_dir``."""
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    scripts = {os.path.join("Models", model, "scripts", f"run_{model}.sh"): f"run_model {model}",
+               **{os.path.join("Rivet_Analyses", name): command for name, command in SCRIPTS.items()}}
+    for path, command in scripts.items():
+        path = os.path.join(share_dir, "Design_Points", path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(f'#!/bin/bash\n# Benchmark stand-in (batch_tools.standins)\n'
+                    f'PYTHONPATH="{package_dir}${{PYTHONPATH:+:$PYTHONPATH}}" exec "{python}" -m batch_tools.standins {command} "$@"\n')
+        os.chmod(path, 0o755)
+    return share_dir
+
+
+############################ Model ############################
+
+def _stable_seed(*parts):
+    return zlib.crc32('/'.join(str(p) for p in parts).encode())
+
+
+def parameters(param_tag):
+    """Numbers of a parameter tag, whatever its format (digits inside names such as pT0Ref are skipped)."""
+    return np.array([float(v) for v in re.findall(r"(?<![A-Za-z\d.])[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?", param_tag)])
+
+
+def binning(analyses_dir, analysis, hists):
+    """{hist: (xmin, xmax)} of the reference data; 10 uniform bins in [0, 1] without one."""
+    try:
+        reference = YodaIO.read_reference(analyses_dir, analysis, hists)
+    except (FileNotFoundError, OSError):
+        reference = {}
+    uniform = (np.linspace(0, 1, 11)[:-1], np.linspace(0, 1, 11)[1:])
+    return {hist: reference[hist][:2] if hist in reference else uniform for hist in hists}
+
+
+def truth(path, xmin, xmax, params):
+    """Smooth, parameter-dependent spectrum of one histogram (fixed shape per histogram path)."""
+    rng = np.random.default_rng(_stable_seed(path))
+    coeffs = rng.uniform(-0.5, 0.5, max(len(params), 1))
+    scaled = np.resize(params, len(coeffs)) if len(params) else np.zeros(1)
+    scaled = scaled / (1 + np.abs(scaled))  # bounded, whatever the parameter units
+    x = 0.5 * (np.asarray(xmin, dtype=float) + np.asarray(xmax, dtype=float))
+    span = np.ptp(x) or 1.0
+    u = (x - x.min()) / span
+    slope = rng.uniform(1, 4) * (1 + 0.5 * np.tanh(coeffs @ scaled))
+    return rng.uniform(0.5, 50) * np.exp(-slope * u) * (1 + 0.3 * np.sin(np.pi * u * (1 + coeffs[0] * scaled[0])))
+
+
+def _histo(path, xmin, xmax, sumw, sumw2, entries):
+    edges = list(xmin) + [xmax[-1]]
+    lines = [f"BEGIN YODA_HISTO1D_V3 {path}", f"Path: {path}", "Type: Histo1D", "---",
+             "Edges(A1): [" + ", ".join(f"{e:.6e}" for e in edges) + "]",
+             "# sumW\tsumW2\tsumW(A1)\tsumW2(A1)\tnumEntries",
+             "0.000000e+00\t0.000000e+00\t0.000000e+00\t0.000000e+00\t0.000000e+00"]
+    centres = 0.5 * (np.asarray(xmin) + np.asarray(xmax))
+    lines += [f"{w:.6e}\t{w2:.6e}\t{w * c:.6e}\t{w2 * c * c:.6e}\t{n:.6e}"
+              for w, w2, c, n in zip(sumw, sumw2, centres, entries)]
+    lines += ["0.000000e+00\t0.000000e+00\t0.000000e+00\t0.000000e+00\t0.000000e+00", "END YODA_HISTO1D_V3"]
+    return lines
+
+
+def _scatter(path, xmin, xmax, y, yerr):
+    # Non-contiguous reference bins cannot be histogram edges: write a scatter like rivet does for them.
+    x = 0.5 * (np.asarray(xmin) + np.asarray(xmax))
+    lines = [f"BEGIN YODA_SCATTER2D_V2 {path}", f"Path: {path}", "Type: Scatter2D", "---",
+             "# xval\txerr-\txerr+\tyval\tyerr-\tyerr+"]
+    lines += [f"{c:.6e}\t{c - lo:.6e}\t{hi - c:.6e}\t{v:.6e}\t{e:.6e}\t{e:.6e}"
+              for c, lo, hi, v, e in zip(x, xmin, xmax, y, yerr)]
+    return lines + ["END YODA_SCATTER2D_V2"]
+
+
+def _counters(nevents, xsec):
+    return ["BEGIN YODA_COUNTER_V3 /_EVCOUNT", "Path: /_EVCOUNT", "Type: Counter", "---",
+            "# sumW\tsumW2\tnumEntries", f"{nevents:.6e}\t{nevents:.6e}\t{nevents:.6e}", "END YODA_COUNTER_V3", "",
+            "BEGIN YODA_ESTIMATE0D_V3 /_XSEC", "Path: /_XSEC", "Type: Estimate0D", "---",
+            'ErrorLabels: ["stat"]', "# value\terrDn(1)\terrUp(1)",
+            f"{xsec:.6e}\t{-0.01 * xsec:.6e}\t{0.01 * xsec:.6e}", "END YODA_ESTIMATE0D_V3"]
+
+
+def run_file(project_dir, model, System, Energy, merge_tag, pt_lo, pt_hi, seed):
+    """YODA file the run_model stand-in writes for one run."""
+    return f"{project_dir}/Models/{model}/yoda/{model}_{System}_{Energy}_{merge_tag}_pt{pt_lo}-{pt_hi}_seed{seed}.yoda"
+
+
+def run_model(model, analyses, input_dir, project_dir, System, Energy, nevents, seed, param_tag, merge_tag,
+              pt_lo="-1", pt_hi="-1"):
+    """Stand-in for run_<model>.sh (same arguments): writes the run's YODA file to ``run_file``."""
+    nevents, params = int(nevents), parameters(param_tag)
+    histograms = PtHat.read_analyses_list(f"{input_dir}/analyses_list.txt", f"{System}_{Energy}")
+    xsec = 3.0e10 / (1 + max(float(pt_lo), 0.0)) ** 4
+    rng = np.random.default_rng(_stable_seed(System, Energy, merge_tag, pt_lo, seed))
+    lines = _counters(nevents, xsec)
+    for analysis in analyses.split(','):
+        hists = histograms.get(analysis, [])
+        for hist, (xmin, xmax) in binning(f"{project_dir}/Rivet_Analyses", analysis, hists).items():
+            path = f"/{analysis}/{hist}"
+            width = np.asarray(xmax) - np.asarray(xmin)
+            y = truth(path, xmin, xmax, params)
+            entries = np.maximum(nevents * y / y.sum(), 1.0)  # events per bin
+            rel = 1 / np.sqrt(entries)
+            value = y * (1 + rel * rng.standard_normal(len(y)))
+            lines.append("")
+            if np.allclose(xmin[1:], xmax[:-1]):
+                sumw = value * width
+                lines += _histo(path, xmin, xmax, sumw, (sumw * rel) ** 2, np.round(entries))
+            else:
+                lines += _scatter(path, xmin, xmax, value, np.abs(value) * rel)
+    out = run_file(project_dir, model, System, Energy, merge_tag, pt_lo, pt_hi, seed)
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out + ".tmp", 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(out + ".tmp", out)
+
+
+############################ Merge / HTML / build ############################
+
+def merged_file(project_dir, model, System, Energy, merge_tag):
+    return f"{project_dir}/Models/{model}/{model}_{System}_{Energy}_{merge_tag}.yoda"
+
+
+def merge(project_dir, model, System, Energy, merge_tag):
+    """Stand-in for merge.sh: seed chunks averaged, pT-hat bins stitched, like yoda_merge."""
+    runs = glob.glob(run_file(project_dir, model, System, Energy, merge_tag, "*", "*", "*"))
+    groups = {}
+    for path in sorted(runs):
+        groups.setdefault(re.search(r"_pt(.*)_seed", os.path.basename(path)).group(1), []).append(path)
+    if not groups:
+        raise SystemExit(f"No runs of {model} {System} {Energy} {merge_tag} in {project_dir}")
+    ordered = sorted(groups, key=lambda pt: float(pt.split('-')[0]) if pt[0] != '-' else -1.0)
+    YodaMerge.merge_groups([groups[pt] for pt in ordered], merged_file(project_dir, model, System, Energy, merge_tag))
+
+
+def mkhtml(project_dir, model, System, Energy, merge_tag):
+    """Stand-in for mkhtml.sh: per-histogram ``__data.py`` (bins, MC and reference values) and ``.py`` files."""
+    report = f"{project_dir}/Models/{model}/html_reports/{model}_{System}_{Energy}_{merge_tag}_report.html"
+    analyses_dir = f"{project_dir}/Rivet_Analyses"
+    for obj in YodaIO.iter_objects(merged_file(project_dir, model, System, Energy, merge_tag)):
+        if obj['path'].startswith('/_') or obj['path'].count('/') != 2:
+            continue
+        _, analysis, hist = obj['path'].split('/')
+        xmin, xmax, y, yerr = YodaIO.to_bins(obj)
+        try:
+            ref = YodaIO.read_reference(analyses_dir, analysis, [hist]).get(hist)
+        except FileNotFoundError:
+            ref = None
+        os.makedirs(f"{report}/{analysis}", exist_ok=True)
+        with open(f"{report}/{analysis}/{hist}__data.py", 'w') as f:
+            f.write("import numpy as np\n\n")
+            f.write(f"xedges = np.array({np.append(xmin, xmax[-1]).tolist()})\n")
+            f.write(f"xmin = np.array({list(xmin)})\nxmax = np.array({list(xmax)})\n")
+            if ref is not None:
+                f.write(f"yvals = {{'REF': np.array({list(ref[2])}), '{model}': np.array({list(y)})}}\n")
+                f.write(f"yerrs = {{'REF': np.array({list(ref[3])}), '{model}': np.array({list(yerr)})}}\n")
+            else:
+                f.write(f"yvals = {{'{model}': np.array({list(y)})}}\nyerrs = {{'{model}': np.array({list(yerr)})}}\n")
+        with open(f"{report}/{analysis}/{hist}.py", 'w') as f:
+            f.write(f"title = '/{analysis}/{hist}'\nxlabel = 'x'\nylabel = '{hist}'\n")
+
+
+def run_analysis(analyses, project_dir):
+    """Stand-in for run_analysis.sh: every analysis builds."""
+    os.makedirs(project_dir, exist_ok=True)
+    with open(f"{project_dir}/analyses.log", 'w') as f:
+        f.write(''.join(f"{analysis} build_success\n" for analysis in analyses.split(',')))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark stand-ins for the Bayes_HEP model / Rivet scripts.")
+    parser.add_argument("command", choices=["run_model", "merge", "mkhtml", "run_analysis"])
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+    {"run_model": run_model, "merge": merge, "mkhtml": mkhtml, "run_analysis": run_analysis}[args.command](*args.args)
@@ -0,0 +1,274 @@
+"""Generator -> Rivet streaming for the Run_Model stage: events never touch the shared filesystem.
+
+Each model run becomes two processes joined by a named pipe in node-local
+scratch ($TMPDIR, else /tmp): the generator writes HepMC3 into the FIFO and
+``rivet`` reads it, so only the final YODA file is written to the project
+directory.  If a FIFO cannot be made (or ``--file`` is given) the events go
+to a temporary file in the same scratch directory instead, which is removed
+afterwards.  Rivet_Main falls back to the ``run_<model>.sh`` scripts when the
+generator or rivet is not available.
+
+Generators:
+
+* ``pythia8`` -- the Pythia 8 python bindings with the settings of
+  input/Rivet/parameter.cmnd, the design point's tuning parameters, seed,
+  beam energy and pT-hat bin;
+* ``toy``     -- a small pure-python HepMC3 writer (beams + pions whose
+  multiplicity and pT slope follow the first two parameters), standing in
+  for Pythia in tests.
+
+This file is self-contained so it can be run directly as the model command::
+
+    python stream.py run --generator toy --analyses STAR_2012_I930463 --output out.yoda \
+        --nevents 1000 --seed 1 --energy 200 --params pT0Ref=2.0
+"""
+
+import argparse
+import importlib.util
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+GENERATORS = ("pythia8", "toy")
+POLL = 0.2  # s between checks that rivet is still reading
+GRACE = 5.0  # s a generator gets to exit on its own once rivet is gone
+
+
+############################ Settings ############################
+
+def _initials(group):
+    return ''.join(c for c in group if c.isupper())
+
+
+def cmnd_lines(template, params, nevents, seed, energy, pt_lo=-1, pt_hi=-1):
+    """Lines of a Pythia .cmnd file: the template with the design point's values filled in.
+
+    A template key ``Group:name`` takes parameter ``name`` or ``<initials of Group>name``
+    (e.g. ``ColourReconnection:range`` <- ``CRrange``).
+    """
+    lines, used = [], set()
+    with open(template) as f:
+        for line in f:
+            key = line.split('=', 1)[0].strip() if '=' in line and not line.lstrip().startswith('!') else None
+            if key and ':' in key:
+                group, name = key.split(':', 1)
+                for candidate in (name, _initials(group) + name):
+                    if candidate in params:
+                        line = f"{key} = {params[candidate]}\n"
+                        used.add(candidate)
+                        break
+            lines.append(line.rstrip('\n'))
+    missing = set(params) - used
+    if missing:
+        raise ValueError(f"Parameters not found in {template}: {sorted(missing)}")
+
+    lines += ["", "! Set per run", f"Main:numberOfEvents = {nevents}", "Random:setSeed = on",
+              f"Random:seed = {seed % 900000000}", f"Beams:eCM = {energy}", "Next:numberCount = 0"]
+    if pt_lo >= 0:
+        lines += ["HardQCD:all = on", "SoftQCD:all = off", f"PhaseSpace:pTHatMin = {pt_lo}"]
+        if pt_hi >= 0:
+            lines.append(f"PhaseSpace:pTHatMax = {pt_hi}")
+    return lines
+
+
+############################ Generators ############################
+
+def generate_pythia8(output, cmnd):
+    import pythia8
+
+    pythia = pythia8.Pythia("", False)
+    pythia.readFile(cmnd)
+    if not pythia.init():
+        raise RuntimeError(f"Pythia failed to initialise from {cmnd}")
+    writer = pythia8.Pythia8ToHepMC(output)
+    for _ in range(pythia.mode("Main:numberOfEvents")):
+        if pythia.next():
+            writer.writeNextEvent(pythia)
+    pythia.stat()
+
+
+def generate_toy(output, nevents, seed, energy, params):
+    """Minimal HepMC3 ASCII events: two beam protons and a Poisson number of charged pions."""
+    rng = random.Random(seed)
+    values = list(params.values()) + [1.0, 1.0]
+    mean_mult = 6.0 + 4.0 / max(values[0], 0.1)  # smaller pT0Ref-like parameter -> more activity
+    slope = 0.3 + 0.2 * values[1]
+    pz = energy / 2
+    m_p, m_pi = 0.938272, 0.139570
+    e_beam = math.sqrt(pz ** 2 + m_p ** 2)
+    xsec = 3.0e10  # pb, roughly sigma_inel at RHIC
+
+    with open(output, 'w') as out:
+        out.write("HepMC::Version 3.02.05\nHepMC::Asciiv3-START_EVENT_LISTING\n")
+        for event in range(nevents):
+            n = max(_poisson(rng, mean_mult), 1)
+            out.write(f"E {event} 1 {n + 2}\nU GEV MM\nW 1\n")
+            out.write(f"A 0 GenCrossSection {xsec:.6e} {xsec * 0.01:.6e} {event + 1} {event + 1}\n")
+            out.write(f"P 1 0 2212 0 0 {pz:.6e} {e_beam:.6e} {m_p:.6e} 4\n")
+            out.write(f"P 2 0 2212 0 0 {-pz:.6e} {e_beam:.6e} {m_p:.6e} 4\n")
+            out.write("V -1 0 [1,2]\n")
+            for k in range(n):
+                pt = rng.expovariate(1.0 / slope)
+                eta = rng.uniform(-4.0, 4.0)
+                phi = rng.uniform(0.0, 2 * math.pi)
+                px, py, p_z = pt * math.cos(phi), pt * math.sin(phi), pt * math.sinh(eta)
+                e = math.sqrt(px ** 2 + py ** 2 + p_z ** 2 + m_pi ** 2)
+                out.write(f"P {k + 3} -1 {rng.choice((211, -211))} {px:.6e} {py:.6e} {p_z:.6e} {e:.6e} {m_pi:.6e} 1\n")
+        out.write("HepMC::Asciiv3-END_EVENT_LISTING\n")
+
+
+def _poisson(rng, mean):
+    # Knuth's method; the means here are small.
+    limit, k, p = math.exp(-mean), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+def available(generator):
+    """True if the streaming path can run here (rivet on PATH, generator importable)."""
+    if shutil.which('rivet') is None:
+        return False
+    return generator != 'pythia8' or importlib.util.find_spec('pythia8') is not None
+
+
+############################ Streaming ############################
+
+def scratch_dir():
+    """Node-local scratch for the FIFO / fallback event file (never the project directory)."""
+    return tempfile.mkdtemp(prefix='stream_', dir=os.environ.get('TMPDIR') or '/tmp')
+
+
+def stream(args):
+    """Run generator and rivet joined by a FIFO (or a temporary file). Returns the exit code."""
+    work = scratch_dir()
+    events = os.path.join(work, 'events.hepmc')
+    use_fifo = not args.file
+    if use_fifo:
+        try:
+            os.mkfifo(events)
+        except (AttributeError, OSError) as exc:
+            print(f"⚠️ No FIFO in {work} ({exc}); writing the events to a local file instead")
+            use_fifo = False
+
+    gen_cmd = [sys.executable, os.path.abspath(__file__), 'generate', '--generator', args.generator,
+               '--events_file', events, '--nevents', str(args.nevents), '--seed', str(args.seed),
+               '--energy', str(args.energy), '--pt_min', str(args.pt_min), '--pt_max', str(args.pt_max),
+               '--template', args.template or '', '--params', *args.params, '--cmnd', os.path.join(work, 'run.cmnd')]
+    rivet_cmd = ['rivet', '--analysis', args.analyses, '--histo-file', args.output, events]
+    env = dict(os.environ)
+    if args.analysis_path:
+        for var in ('RIVET_ANALYSIS_PATH', 'RIVET_DATA_PATH'):
+            env[var] = os.pathsep.join(filter(None, [args.analysis_path, env.get(var)]))
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+
+    try:
+        if use_fifo:
+            # Both ends open the FIFO; whichever comes first blocks until the other arrives.
+            rivet = subprocess.Popen(rivet_cmd, env=env)
+            generator = subprocess.Popen(gen_cmd)
+            while generator.poll() is None:
+                if rivet.poll() is not None:
+                    # rivet is gone (bad analysis, environment, ...): free a writer stuck in open(), then stop it.
+                    _stop_writer(events, generator)
+                    break
+                time.sleep(POLL)
+            gen_code = generator.wait()
+            _release(events)
+            rivet_code = rivet.wait()
+        else:
+            gen_code = subprocess.run(gen_cmd).returncode
+            rivet_code = subprocess.run(rivet_cmd, env=env).returncode if gen_code == 0 else -1
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    mode = "FIFO" if use_fifo else "file"
+    if gen_code or rivet_code:
+        print(f"❌ Streaming ({mode}) failed: generator exit {gen_code}, rivet exit {rivet_code}")
+        return gen_code or rivet_code
+    print(f"✅ Streamed {args.nevents} events ({mode}) into {args.output}")
+    return 0
+
+
+def _release(fifo):
+    """Unblock a reader still waiting to open the FIFO (generator died before opening it): it sees EOF."""
+    try:
+        os.close(os.open(fifo, os.O_WRONLY | os.O_NONBLOCK))
+    except OSError:  # no reader left
+        pass
+
+
+def _stop_writer(fifo, generator):
+    """Stop a generator whose reader has exited, opening the FIFO as reader first so its open() returns."""
+    try:
+        fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+    except OSError:
+        fd = None
+    try:
+        generator.wait(timeout=GRACE)  # rivet may simply have seen EOF just before the generator exits
+    except subprocess.TimeoutExpired:
+        generator.kill()
+        generator.wait()
+    if fd is not None:
+        os.close(fd)
+
+
+def generate(args):
+    params = dict(p.split('=', 1) for p in args.params)
+    if args.generator == 'toy':
+        generate_toy(args.events_file, args.nevents, args.seed, args.energy,
+                     {k: float(v) for k, v in params.items()})
+        return 0
+    with open(args.cmnd, 'w') as f:
+        f.write('\n'.join(cmnd_lines(args.template, params, args.nevents, args.seed, args.energy,
+                                     args.pt_min, args.pt_max)) + '\n')
+    generate_pythia8(args.events_file, args.cmnd)
+    return 0
+
+
+def stream_task(task, point, parameter_names, input_dir, project_dir, model, generator='pythia8'):
+    """Turn a run_<model>.sh task of Executor.build_model_tasks into a streaming task (same name/seed/DP)."""
+    System, Energy = task['system'].split('_')
+    pt_lo, pt_hi = task['pt_bin']
+    output = (f"{project_dir}/Models/{model}/stream/"
+              f"{model}_{System}_{Energy}_DP_{task['dp']}_pt{pt_lo}-{pt_hi}_seed{task['seed']}.yoda")
+    cmd = [sys.executable, os.path.abspath(__file__), 'run', '--generator', generator,
+           '--analyses', task['analyses'], '--output', output, '--nevents', str(task['nevents']),
+           '--seed', str(task['seed']), '--energy', Energy, '--pt_min', str(pt_lo), '--pt_max', str(pt_hi),
+           '--template', f"{input_dir}/parameter.cmnd", '--analysis_path', f"{project_dir}/Rivet_Analyses",
+           '--params', *[f"{name}={value:.10g}" for name, value in zip(parameter_names, point)]]
+    streamed = dict(task)
+    streamed.update({'cmd': cmd, 'output': output})
+    return streamed
+
+
+def _parser():
+    parser = argparse.ArgumentParser(description="Stream generator events into rivet without event files.")
+    parser.add_argument("mode", choices=["run", "generate"])
+    parser.add_argument("--generator", choices=GENERATORS, default="pythia8")
+    parser.add_argument("--analyses", type=str, default="", help="Comma separated Rivet analyses")
+    parser.add_argument("--output", type=str, default="out.yoda")
+    parser.add_argument("--nevents", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--energy", type=float, default=200.0)
+    parser.add_argument("--pt_min", type=float, default=-1)
+    parser.add_argument("--pt_max", type=float, default=-1)
+    parser.add_argument("--template", type=str, default=None, help="parameter.cmnd template (pythia8)")
+    parser.add_argument("--params", nargs="*", default=[], help="name=value tuning parameters")
+    parser.add_argument("--analysis_path", type=str, default=None, help="Directory of the built analyses")
+    parser.add_argument("--file", action="store_true", help="Use a local temporary file instead of a FIFO")
+    parser.add_argument("--events_file", type=str, default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--cmnd", type=str, default=None, help=argparse.SUPPRESS)
+    return parser
+
+
+if __name__ == "__main__":
+    args = _parser().parse_args()
+    sys.exit(stream(args) if args.mode == "run" else generate(args))
@@ -0,0 +1,197 @@
+"""Pull-based work queue for the Run_Model stage, kept in the registry database.
+
+Instead of slicing the design points statically over array tasks, every
+worker enqueues the full list of model runs (DP x system x pT-hat bin x
+seed chunk; enqueuing is idempotent) and then keeps claiming the next
+pending unit until none is left.  Fast workers simply take more units, so
+a slow corner of parameter space no longer sets the wall time.
+
+A claimed unit is heartbeated while it runs.  Units whose heartbeat is
+older than ``stale_after`` belonged to a dead worker (node failure, wall
+time) and go back to pending; failed units are released for another try
+until ``max_attempts`` is reached.  Claims run in ``BEGIN IMMEDIATE``
+transactions, so two workers never get the same unit.
+
+Command line, from Batch_Rivet (progress of the latest wave)::
+
+    python -m batch_tools.work_queue --main_dir <dir> status
+    python -m batch_tools.work_queue --main_dir <dir> reset-failed
+"""
+
+import argparse
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from batch_tools import manifest as Manifest
+from batch_tools import registry as Registry
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    dg        INTEGER NOT NULL,
+    name      TEXT NOT NULL,
+    task      TEXT NOT NULL,
+    status    TEXT NOT NULL DEFAULT 'pending',
+    worker    TEXT,
+    attempts  INTEGER NOT NULL DEFAULT 0,
+    heartbeat REAL,
+    PRIMARY KEY (dg, name)
+);
+"""
+
+
+def connect(main_dir):
+    conn = Registry.connect(main_dir)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def worker_id():
+    """host:pid plus the Slurm array task, if any, for the logs and the queue table."""
+    array = os.environ.get("SLURM_ARRAY_JOB_ID")
+    tag = f"{array}_{os.environ.get('SLURM_ARRAY_TASK_ID')}" if array else os.environ.get("SLURM_JOB_ID", "local")
+    return f"{socket.gethostname()}:{os.getpid()}:{tag}"
+
+
+def enqueue(conn, dg, tasks):
+    """Add the tasks that are not queued yet. Returns the number added."""
+    with Registry.transaction(conn):
+        before = conn.total_changes
+        conn.executemany("INSERT OR IGNORE INTO queue (dg, name, task) VALUES (?, ?, ?)",
+                         [(dg, task['name'], json.dumps(task)) for task in tasks])
+        return conn.total_changes - before
+
+
+def _reclaim(conn, dg, stale_after, max_attempts):
+    now = time.time()
+    conn.execute("UPDATE queue SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, worker = NULL "
+                 "WHERE dg = ? AND status = 'claimed' AND heartbeat < ?", (max_attempts, dg, now - stale_after))
+
+
+def claim(conn, dg, worker, stale_after=900, max_attempts=3):
+    """Claim the next pending unit (reclaiming units of dead workers first). Returns the task or None."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _reclaim(conn, dg, stale_after, max_attempts)
+        row = conn.execute("SELECT name, task FROM queue WHERE dg = ? AND status = 'pending' ORDER BY rowid LIMIT 1",
+                           (dg,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE queue SET status = 'claimed', worker = ?, heartbeat = ?, attempts = attempts + 1 "
+                         "WHERE dg = ? AND name = ?", (worker, time.time(), dg, row[0]))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return json.loads(row[1]) if row else None
+
+
+def heartbeat(conn, dg, names, worker):
+    """Refresh the claims of ``worker``. Returns the names it no longer holds."""
+    lost = []
+    with Registry.transaction(conn):
+        for name in names:
+            cur = conn.execute("UPDATE queue SET heartbeat = ? WHERE dg = ? AND name = ? AND worker = ? "
+                               "AND status = 'claimed'", (time.time(), dg, name, worker))
+            if cur.rowcount == 0:
+                lost.append(name)
+    return lost
+
+
+def finish(conn, dg, name, worker, ok, max_attempts=3):
+    """Mark a claimed unit done, or release it for another attempt (failed after ``max_attempts``)."""
+    with Registry.transaction(conn):
+        if ok:
+            conn.execute("UPDATE queue SET status = 'done', heartbeat = ? WHERE dg = ? AND name = ?",
+                         (time.time(), dg, name))
+        else:
+            conn.execute("UPDATE queue SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                         "worker = NULL WHERE dg = ? AND name = ? AND worker = ?", (max_attempts, dg, name, worker))
+
+
+def counts(conn, dg):
+    """{status: units} of one wave."""
+    return dict(conn.execute("SELECT status, COUNT(*) FROM queue WHERE dg = ? GROUP BY status", (dg,)).fetchall())
+
+
+def reset_failed(conn, dg):
+    with Registry.transaction(conn):
+        return conn.execute("UPDATE queue SET status = 'pending', attempts = 0, worker = NULL "
+                            "WHERE dg = ? AND status = 'failed'", (dg,)).rowcount
+
+
+def run_worker(main_dir, dg, project_dir, model, nevents, jobs=1, log_dir=None, force=False,
+               heartbeat_every=60, stale_after=900, max_attempts=3, poll=30):
+    """Claim and run units on ``jobs`` slots until the queue of wave ``dg`` is drained.
+
+    Each unit runs through Manifest.run_model_tasks, so it is recorded in the
+    manifest (and skipped if it is already complete).  While other workers
+    still hold units the worker keeps polling, to pick up units they drop.
+    Returns the run records of this worker.
+    """
+    worker = worker_id()
+    held, results = set(), []
+    lock = threading.Lock()
+    stop = threading.Event()
+    if log_dir:
+        os.makedirs(log_dir, exist_ok=True)
+
+    def beat():
+        conn = connect(main_dir)
+        while not stop.wait(heartbeat_every):
+            with lock:
+                names = list(held)
+            for name in heartbeat(conn, dg, names, worker):
+                print(f"⚠️ Lost the claim on {name} (reclaimed as stale)")
+
+    def slot(n):
+        conn = connect(main_dir)
+        while True:
+            task = claim(conn, dg, worker, stale_after, max_attempts)
+            if task is None:
+                state = counts(conn, dg)
+                if not state.get('claimed'):
+                    return
+                time.sleep(poll)  # others still running: wait in case their units come back
+                continue
+            with lock:
+                held.add(task['name'])
+            print(f"🚀 [{n}] {task['name']}")
+            records = Manifest.run_model_tasks(conn, dg, [task], project_dir, model, nevents, jobs, log_dir, force)
+            ok = all(r['returncode'] == 0 and r.get('output') for r in records)  # recorded as done
+            finish(conn, dg, task['name'], worker, ok, max_attempts)
+            with lock:
+                held.discard(task['name'])
+                results.extend(records)
+            print(f"{'✅' if ok else '❌'} [{n}] {task['name']}" + ("" if records else " (already complete)"))
+
+    print(f"🧵 Worker {worker}: {jobs} slot(s), queue {counts(connect(main_dir), dg)}")
+    beater = threading.Thread(target=beat, daemon=True)
+    beater.start()
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            list(pool.map(slot, range(jobs)))
+    finally:
+        stop.set()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect the Run_Model work queue.")
+    parser.add_argument("--main_dir", type=str, required=True)
+    parser.add_argument("--dg", type=int, default=None, help="Wave (default: latest)")
+    parser.add_argument("command", choices=["status", "reset-failed"])
+    args = parser.parse_args()
+
+    conn = connect(args.main_dir)
+    dg = args.dg if args.dg is not None else Registry.latest_wave(conn)
+    if args.command == "status":
+        state = counts(conn, dg)
+        print(f"DG_{dg}: " + ", ".join(f"{k}={v}" for k, v in sorted(state.items())))
+        for name, worker, beat in conn.execute("SELECT name, worker, heartbeat FROM queue WHERE dg = ? "
+                                               "AND status = 'claimed'", (dg,)):
+            print(f"  {name}: {worker}, last heartbeat {time.time() - beat:.0f} s ago")
+    else:
+        print(f"🔁 {reset_failed(conn, dg)} failed unit(s) back to pending")
@@ -0,0 +1,268 @@
+"""Minimal streaming reader for YODA text files (.yoda / .yoda.gz).
+
+Only what the Data/Prediction writers need is decoded: bin edges, values and
+errors of 1D histograms, estimates and scatters, plus the event-count and
+cross-section counters.  Objects that were not asked for are skipped without
+being parsed, so pulling a handful of histograms out of a large merged file
+stays cheap.
+"""
+
+import glob
+import gzip
+import os
+import re
+
+import numpy as np
+
+
+def _open(path):
+    return gzip.open(path, 'rt') if path.endswith('.gz') else open(path)
+
+
+def canonical(name):
+    """Analysis names differ in underscores between analyses_list.txt and some plugins."""
+    return name.replace('_', '')
+
+
+def _wanted(obj_path, paths):
+    if paths is None:
+        return True
+    return obj_path in paths or canonical(obj_path) in paths
+
+
+def iter_objects(path, paths=None):
+    """Yield {'path', 'kind', 'meta', 'edges', 'rows', 'labels'} for each (wanted) object.
+
+    ``paths`` is an optional set of object paths such as ``/STAR_2003_I631869/d01-x01-y01``;
+    names are also matched with underscores removed (see ``canonical``).
+    """
+    if paths is not None:
+        paths = set(paths) | {canonical(p) for p in paths}
+
+    obj = None
+    with _open(path) as f:
+        for line in f:
+            if obj is None:
+                if line.startswith('BEGIN YODA'):
+                    _, kind, obj_path = line.split(None, 2)
+                    obj_path = obj_path.strip()
+                    if _wanted(obj_path, paths):
+                        obj = {'path': obj_path, 'kind': kind, 'meta': {}, 'edges': None,
+                               'labels': None, 'rows': [], 'body': False}
+                continue
+
+            line = line.strip()
+            if line.startswith('END YODA'):
+                obj['rows'] = _to_array(obj['rows'])
+                del obj['body']
+                yield obj
+                obj = None
+            elif line == '---':
+                obj['body'] = True
+            elif not obj['body']:
+                key, _, value = line.partition(':')
+                obj['meta'][key.strip()] = value.strip()
+            elif line.startswith('Edges(A1):'):
+                obj['edges'] = _parse_edges(line.split(':', 1)[1])
+            elif line.startswith('#'):
+                if obj['labels'] is None and not line.startswith(('# Mean', '# Area', '# Integral')):
+                    obj['labels'] = line[1:].split()
+            elif line and ':' not in line.split()[0]:
+                obj['rows'].append(line.split())
+
+
+def _parse_edges(text):
+    text = text.strip().strip('[]')
+    items = [item.strip() for item in text.split(',') if item.strip()]
+    try:
+        return np.array([float(item) for item in items])
+    except ValueError:  # discrete (string) axis
+        return np.array([item.strip('"') for item in items])
+
+
+def _to_array(rows):
+    def cell(value):
+        if value == '---':
+            return 0.0
+        try:
+            return float(value)
+        except ValueError:  # e.g. 'Total' / 'Underflow' in V2 histograms
+            return np.nan
+    return np.array([[cell(v) for v in row] for row in rows], dtype=float) if rows else np.zeros((0, 0))
+
+
+def read_objects(path, paths=None):
+    """{object path: object} for the wanted objects of one file."""
+    return {obj['path']: obj for obj in iter_objects(path, paths)}
+
+
+def is_discrete(obj):
+    """True for objects binned on a string axis (e.g. BinnedEstimate<s> reference data)."""
+    edges = obj['edges']
+    return edges is not None and edges.dtype.kind not in 'fi'
+
+
+def to_bins(obj, edges=None):
+    """Return (xmin, xmax, y, yerr) for a 1D histogram, estimate or scatter.
+
+    ``edges`` = (xmin, xmax) overrides the placeholder 1..N bins of a discrete axis.
+    """
+    kind, rows = obj['kind'], obj['rows']
+
+    if kind.startswith(('YODA_HISTO1D_V3', 'YODA_ESTIMATE1D', 'YODA_BINNEDESTIMATE')):
+        if not is_discrete(obj) and obj['edges'] is not None:
+            rows = rows[1:-1]  # drop under/overflow
+            xmin, xmax = obj['edges'][:-1], obj['edges'][1:]
+        elif edges is not None:
+            rows = rows[1:]
+            xmin, xmax = edges
+        else:
+            # Discrete axis: a single leading "other" bin, bins drawn at 1..N as in rivet-mkhtml.
+            rows = rows[1:]
+            centres = np.arange(1, len(rows) + 1, dtype=float)
+            xmin, xmax = centres - 0.5, centres + 0.5
+        if kind.startswith('YODA_HISTO1D'):
+            width = xmax - xmin
+            return xmin, xmax, rows[:, 0] / width, np.sqrt(rows[:, 1]) / width
+        # value, then (errDn, errUp) per error source: symmetrise, add in quadrature.
+        errs = np.abs(rows[:, 1:]).reshape(len(rows), -1, 2).mean(axis=2) if rows.shape[1] > 1 else np.zeros((len(rows), 1))
+        return xmin, xmax, rows[:, 0], np.sqrt((errs ** 2).sum(axis=1))
+
+    if kind.startswith('YODA_HISTO1D_V2'):
+        rows = rows[~np.isnan(rows[:, 0])]  # skip Total/Underflow/Overflow
+        xmin, xmax = rows[:, 0], rows[:, 1]
+        width = xmax - xmin
+        return xmin, xmax, rows[:, 2] / width, np.sqrt(rows[:, 3]) / width
+
+    if kind.startswith('YODA_SCATTER2D'):
+        x, xdn, xup, y, ydn, yup = (rows[:, k] for k in range(6))
+        return x - np.abs(xdn), x + np.abs(xup), y, 0.5 * (np.abs(ydn) + np.abs(yup))
+
+    raise ValueError(f"Unsupported YODA object {kind} ({obj['path']})")
+
+
+def read_histograms(path, keys):
+    """{(analysis, hist): (xmin, xmax, y, yerr)} of the MC histograms found in one file."""
+    objects = read_objects(path, [f"/{analysis}/{hist}" for analysis, hist in keys])
+    by_name = {canonical(obj_path): obj for obj_path, obj in objects.items()}
+    found = {}
+    for analysis, hist in keys:
+        obj = by_name.get(canonical(f"/{analysis}/{hist}"))
+        if obj is not None:
+            found[(analysis, hist)] = to_bins(obj)
+    return found
+
+
+def scalar(obj):
+    """Value of a Counter / Estimate0D / Scatter1D object (e.g. /_EVCOUNT, /_XSEC)."""
+    rows = obj['rows']
+    return float(rows[0, 0]) if rows.size else np.nan
+
+
+def find_reference(analyses_dir, analysis):
+    """Reference .yoda(.gz) of an analysis under rivet/Rivet_Analyses."""
+    for name in (analysis, *[d for d in os.listdir(analyses_dir) if canonical(d) == canonical(analysis)]):
+        for ext in ('.yoda', '.yoda.gz'):
+            path = os.path.join(analyses_dir, name, name + ext)
+            if os.path.exists(path):
+                return path
+    raise FileNotFoundError(f"No reference YODA file for {analysis} in {analyses_dir}")
+
+
+def read_reference(analyses_dir, analysis, hists, binning=None):
+    """{hist: (xmin, xmax, y, yerr)} of the reference data, reading the file once.
+
+    Discrete reference axes carry no numeric edges; ``binning`` = {hist: (xmin, xmax)}
+    (usually taken from a prediction) supplies them, as rivet-mkhtml does.
+    """
+    binning = binning or {}
+    ref_file = find_reference(analyses_dir, analysis)
+    wanted = {f"/REF/{analysis}/{hist}": hist for hist in hists}
+    wanted.update({canonical(path): hist for path, hist in list(wanted.items())})
+    found = {}
+    for obj in iter_objects(ref_file, wanted):
+        hist = wanted.get(obj['path']) or wanted.get(canonical(obj['path']))
+        found[hist] = to_bins(obj, binning.get(hist) if is_discrete(obj) else None)
+    return found
+
+
+def read_plot_labels(analyses_dir, analysis, hists):
+    """{hist: (observable, subobservable)} from the analysis .plot file (YLabel, XLabel)."""
+    plot_file = find_reference(analyses_dir, analysis).rsplit('.yoda', 1)[0] + '.plot'
+    labels, current = {}, None
+    if not os.path.exists(plot_file):
+        return labels
+    canon = {canonical(h): h for h in hists}
+    with open(plot_file) as f:
+        for line in f:
+            # Blocks are sometimes commented out ("# BEGIN PLOT ...") but still describe the histogram.
+            line = line.strip().lstrip('#').strip()
+            if line.startswith('BEGIN PLOT'):
+                current = canon.get(canonical(line.split()[-1].split('/')[-1]))
+                if current is not None:
+                    labels.setdefault(current, ['', ''])
+            elif line.startswith('END PLOT'):
+                current = None
+            elif current is not None and '=' in line:
+                key, value = line.split('=', 1)
+                if key.strip() == 'YLabel':
+                    labels[current][0] = value.strip()
+                elif key.strip() == 'XLabel':
+                    labels[current][1] = value.strip()
+    return {hist: tuple(value) for hist, value in labels.items()}
+
+
+def find_merged_yoda(project_dir, model, System, Energy, merge_tag):
+    """Merged YODA file that merge.sh produced for one DP (``<model>_<Sys>_<E>_<tag>.yoda[.gz]``)."""
+    name = f"{model}_{System}_{Energy}_{merge_tag}"
+    for ext in ('.yoda', '.yoda.gz'):
+        matches = [p for p in glob.glob(f"{project_dir}/Models/{model}/**/{name}{ext}", recursive=True)
+                   if 'html_reports' not in p]
+        if matches:
+            return max(matches, key=os.path.getmtime)
+    return None
+
+
+def find_run_yoda(project_dir, model, System, Energy, merge_tag, seed, since=0):
+    """YODA file one run_<model>.sh run wrote for ``merge_tag`` and ``seed`` at or after ``since``.
+
+    The run names its file after the system, energy and merge tag (what merge.sh
+    collects); with several candidates, the one whose name carries the seed
+    wins, since concurrent seed chunks of a DP write side by side.
+    """
+    tag = re.compile(rf"{System}_{Energy}.*{merge_tag}(?!\d)")
+    merged = {f"{model}_{System}_{Energy}_{merge_tag}{ext}" for ext in ('.yoda', '.yoda.gz')}
+    candidates = []
+    for path in glob.glob(f"{project_dir}/Models/{model}/**/*.yoda*", recursive=True):
+        name = os.path.basename(path)
+        if ('html_reports' in path or name in merged or not tag.search(name)
+                or not name.endswith(('.yoda', '.yoda.gz')) or os.path.getmtime(path) < since - 1):
+            continue
+        candidates.append(path)
+    seed_token = re.compile(rf"(?:^|_|seed){seed}(?=[_.]|$)")
+    seeded = [p for p in candidates if seed_token.search(tag.sub("", os.path.basename(p)))]
+    if seeded or len(candidates) == 1:
+        return max(seeded or candidates, key=os.path.getmtime)
+    return None
+
+
+def write_estimates(path, objects):
+    """Write {object path: (xmin, xmax, y, yerr)} as YODA_ESTIMATE1D_V3 objects (.yoda or .yoda.gz).
+
+    Bins must be contiguous; the error is written as a single symmetric source.
+    """
+    lines = []
+    for obj_path, (xmin, xmax, y, yerr) in objects.items():
+        edges = list(xmin) + [xmax[-1]]
+        lines += [f"BEGIN YODA_ESTIMATE1D_V3 {obj_path}",
+                  f"Path: {obj_path}",
+                  "Type: Estimate1D",
+                  "---",
+                  "Edges(A1): [" + ", ".join(f"{e:.6e}" for e in edges) + "]",
+                  'ErrorLabels: ["stat"]',
+                  "# value\terrDn(1)\terrUp(1)",
+                  "nan\t---\t---"]
+        lines += [f"{val:.6e}\t{-err:.6e}\t{err:.6e}" for val, err in zip(y, yerr)]
+        lines += ["nan\t---\t---", "END YODA_ESTIMATE1D_V3", ""]
+    with (gzip.open(path, 'wt') if path.endswith('.gz') else open(path, 'w')) as f:
+        f.write('\n'.join(lines) + '\n')
@@ -0,0 +1,384 @@
+"""In-python merging of the per-run YODA files of a design point.
+
+Runs of the same process (seed chunks) are equivalent: RAW objects and the
+``_EVCOUNT`` counter are summed, finalised objects are averaged with weights
+N_c / N (sumW-like columns scale with the weight, sumW2 with its square,
+numEntries is summed, estimate/scatter errors add in quadrature), so ratios
+such as the ``_e`` estimates built with divide() in finalize() stay ratios.
+
+pT-hat bins are different processes and are combined with cross-section
+weights that depend on how each histogram was normalised (see normalisation()).
+Every column of every object is kept, so the output is a normal YODA file.
+
+Command line, from Batch_Rivet (all DPs of the latest wave, one process per DP)::
+
+    python -m batch_tools.yoda_merge --main_dir <dir> --model pythia8 --Coll_System pp_200 --jobs 8
+"""
+
+import argparse
+import gzip
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from batch_tools import manifest as Manifest
+from batch_tools import registry as Registry
+from batch_tools import yoda_io as YodaIO
+
+
+############################ Reading / writing ############################
+
+def _cell(token):
+    if token == '---':
+        return np.nan
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+def read_file(path):
+    """{object path: object} keeping every non-data line so the object can be written back as is."""
+    objects, obj = {}, None
+    with YodaIO._open(path) as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if obj is None:
+                if line.startswith('BEGIN YODA'):
+                    _, kind, obj_path = line.split(None, 2)
+                    obj = {'path': obj_path.strip(), 'kind': kind, 'head': [line], 'labels': [],
+                           'rows': [], 'body': False}
+                continue
+            if line.startswith('END YODA'):
+                obj['end'] = line
+                _finish(obj)
+                objects[obj['path']] = obj
+                obj = None
+            elif not line.strip():
+                continue
+            elif not obj['body']:
+                obj['head'].append(line)
+                obj['body'] = line.strip() == '---'
+            elif line.startswith('#') or ':' in line.split()[0]:
+                # Edges, error labels, "# Mean:"-style summaries and the column header.
+                obj['head'].append(line)
+                if line.startswith('#') and not obj['labels'] and ':' not in line:
+                    obj['labels'] = line[1:].split()
+            else:
+                obj['rows'].append(line.split())
+    return objects
+
+
+def _finish(obj):
+    rows = obj['rows']
+    ncols = max((len(r) for r in rows), default=0)
+    values = np.full((len(rows), ncols), np.nan)
+    text = {}
+    for i, row in enumerate(rows):
+        for j, token in enumerate(row):
+            cell = _cell(token)
+            if cell is None:
+                text[(i, j)] = token
+            else:
+                values[i, j] = cell
+    obj['values'] = values
+    obj['dash'] = np.array([[token == '---' for token in row] + [False] * (ncols - len(row)) for row in rows],
+                           dtype=bool).reshape(len(rows), ncols)
+    obj['text'] = text
+    del obj['rows'], obj['body']
+
+
+def _format(obj):
+    lines = list(obj['head'])
+    for i, row in enumerate(obj['values']):
+        tokens = []
+        for j, val in enumerate(row):
+            if (i, j) in obj['text']:
+                tokens.append(obj['text'][(i, j)])
+            elif obj['dash'][i, j]:
+                tokens.append('---')
+            else:
+                tokens.append(f"{val:.6e}")
+        lines.append('\t'.join(tokens))
+    lines.append(obj.get('end', f"END {obj['kind']}"))
+    return '\n'.join(lines)
+
+
+def write_file(path, objects):
+    with (gzip.open(path, 'wt') if path.endswith('.gz') else open(path, 'w')) as f:
+        for obj in objects.values():
+            f.write(_format(obj) + '\n\n')
+
+
+############################ Combining ############################
+
+def column_power(label):
+    """Power of the run weight a column scales with: 1, 2 (sumW2), 0 (entries), 'err' or None (fixed)."""
+    name = label.lower()
+    if name == 'sumw2':
+        return 2
+    if name.startswith('sumw') or name in ('value', 'val', 'yval'):
+        return 1
+    if name in ('numentries', 'entries'):
+        return 0
+    if name.startswith(('err', 'total', 'yerr')):
+        return 'err'
+    return None
+
+
+def combine(objs, weights):
+    """Weighted combination of the same object from several runs (one vectorised pass per column role)."""
+    base = objs[0]
+    values = np.stack([o['values'] for o in objs])
+    w = np.asarray(weights, dtype=float)[:, None, None]
+    labels = base['labels']
+    # Labels may be fewer than columns (e.g. 'ID ID' prefixes of YODA1 histograms): align from the right.
+    offset = values.shape[2] - len(labels)
+    out = values[0].copy()
+    for j in range(values.shape[2]):
+        power = column_power(labels[j - offset]) if j >= offset else None
+        col = values[:, :, j]
+        if power is None:
+            continue
+        if power == 'err':
+            sign = np.sign(values[0, :, j])
+            sign[sign == 0] = 1.0
+            out[:, j] = sign * np.sqrt(np.nansum((w[:, :, 0] * col) ** 2, axis=0))
+        else:
+            out[:, j] = np.nansum(w[:, :, 0] ** power * col, axis=0)
+        out[np.all(np.isnan(col), axis=0), j] = np.nan  # e.g. 'nan' flow values of estimates
+    out[base['dash']] = np.nan
+    merged = dict(base)
+    merged['values'] = out
+    return merged
+
+
+def _run_info(objects):
+    xsec = objects.get('/_XSEC')
+    evcount = objects.get('/_EVCOUNT')
+    return (float(xsec['values'][0, 0]) if xsec is not None and xsec['values'].size else np.nan,
+            float(evcount['values'][0, 0]) if evcount is not None and evcount['values'].size else np.nan)
+
+
+def _is_summed(path):
+    return path.startswith('/RAW/') or path.startswith('/TMP/') or path == '/_EVCOUNT'
+
+
+def merge_equivalent(runs):
+    """Merge runs of one process (seed chunks). ``runs`` are read_file() dicts."""
+    info = [_run_info(r) for r in runs]
+    n = np.array([i[1] for i in info])
+    if not np.all(np.isfinite(n)) or n.sum() <= 0:
+        n = np.ones(len(runs))
+    merged = {}
+    for path in runs[0]:
+        present = [k for k, r in enumerate(runs) if path in r and r[path]['values'].shape == runs[0][path]['values'].shape]
+        weights = np.ones(len(present)) if _is_summed(path) else n[present] / n[present].sum()
+        merged[path] = combine([runs[k][path] for k in present], weights)
+    return merged
+
+
+def _bins_info(run, path):
+    """(xsec, nevents, final bins, raw bins) of one object in one merged pT-hat bin, for normalisation()."""
+    xsec, nevents = _run_info(run)
+    info = {'xsec': xsec, 'nevents': nevents, 'final': {}, 'raw': {}}
+    for kind, obj_path in (('final', path), ('raw', '/RAW' + path)):
+        obj = run.get(obj_path)
+        if obj is not None:
+            try:
+                info[kind][path] = YodaIO.to_bins({'kind': obj['kind'], 'path': obj_path, 'rows': obj['values'],
+                                                   'edges': _edges(obj)})
+            except (ValueError, IndexError):
+                pass
+    return info
+
+
+def _edges(obj):
+    for line in obj['head']:
+        if line.startswith('Edges(A1):'):
+            return YodaIO._parse_edges(line.split(':', 1)[1])
+    return None
+
+
+def _spread(values):
+    values = np.asarray(values, dtype=float)
+    return np.std(np.log(np.abs(values))) if np.all(np.isfinite(values)) and np.all(values != 0) else np.inf
+
+
+def normalisation(bins, key):
+    """'xsec', 'per_event', 'unit' (normalised) or None (no RAW: estimates/ratios) for one histogram.
+
+    ``bins`` are per pT-hat bin dicts with 'xsec', 'nevents' and (xmin, xmax, y, yerr)
+    tuples under 'final'/'raw'.  The finalised/RAW ratio of a cross-section scales
+    like sigma_k / N_k across bins, a per-event yield like 1 / N_k and a unit-area
+    histogram like 1 / sum(RAW_k); per-bin finalize factors cancel in the ratio.
+    """
+    if len(bins) < 2 or not all(key in b['raw'] and key in b['final'] for b in bins):
+        return None
+    ref = bins[0]
+    scales = []
+    for b in bins:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = (b['final'][key][2] / b['raw'][key][2]) / (ref['final'][key][2] / ref['raw'][key][2])
+        ratio = ratio[np.isfinite(ratio) & (ratio > 0)]
+        scales.append(np.median(ratio) if len(ratio) else np.nan)
+    scales = np.array(scales)
+    sigma = np.array([b['xsec'] for b in bins])
+    n = np.array([b['nevents'] for b in bins])
+    raw_sum = np.array([np.sum(b['raw'][key][2] * (b['raw'][key][1] - b['raw'][key][0])) for b in bins])
+    spreads = {'xsec': _spread(scales * n / sigma), 'per_event': _spread(scales * n),
+               'unit': _spread(scales * raw_sum)}
+    return min(spreads, key=spreads.get)
+
+
+def stitch_weights(bins, key, kind):
+    """Cross-section weights of the pT-hat bins for one finalised histogram."""
+    sigma = np.array([b['xsec'] for b in bins])
+    n = np.array([b['nevents'] for b in bins])
+    if kind == 'xsec':
+        return np.ones(len(bins))
+    if kind == 'unit':
+        raw_sum = np.array([np.sum(b['raw'][key][2] * (b['raw'][key][1] - b['raw'][key][0])) for b in bins])
+        w = sigma * raw_sum / n
+        return w / w.sum()
+    return sigma / sigma.sum()  # per-event yields; also used for estimates (ratios)
+
+
+def merge_pt_bins(bins):
+    """Stitch merged pT-hat bins (each a merge_equivalent() result) with cross-section weights."""
+    info = [_run_info(b) for b in bins]
+    sigma = np.array([i[0] for i in info])
+    n = np.array([i[1] for i in info])
+    merged, kinds = {}, {}
+    for path in bins[0]:
+        present = [k for k, b in enumerate(bins) if path in b and b[path]['values'].shape == bins[0][path]['values'].shape]
+        if path in ('/_XSEC', '/_EVCOUNT'):
+            weights = np.ones(len(present))
+        elif _is_summed(path):
+            # RAW fills become an equivalent sample of sum(N) events of the full process.
+            weights = sigma[present] / n[present] * n[present].sum() / sigma[present].sum()
+        else:
+            per_bin = [_bins_info(bins[k], path) for k in present]
+            kinds[path] = normalisation(per_bin, path)
+            weights = stitch_weights(per_bin, path, kinds[path])
+        merged[path] = combine([bins[k][path] for k in present], weights)
+    return merged, kinds
+
+
+def merge_groups(groups, out_path):
+    """Merge files grouped by pT-hat bin ([[chunk files of bin 0], ...]) into ``out_path``."""
+    merged_bins = [merge_equivalent([read_file(f) for f in files]) for files in groups if files]
+    if not merged_bins:
+        return None
+    if len(merged_bins) == 1:
+        merged, kinds = merged_bins[0], {}
+    else:
+        merged, kinds = merge_pt_bins(merged_bins)
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    write_file(out_path, merged)
+    return out_path, kinds
+
+
+def _merge_job(job):
+    key, groups, out_path = job
+    try:
+        return key, merge_groups(groups, out_path), None
+    except Exception as exc:  # report, keep the other DPs going
+        return key, None, f"{type(exc).__name__}: {exc}"
+
+
+def merge_many(jobs, n_procs=1):
+    """Run merge_groups over many (key, groups, out_path) jobs in a process pool; {key: (result, error)}."""
+    if n_procs > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=n_procs) as pool:
+            results = list(pool.map(_merge_job, jobs))
+    else:
+        results = [_merge_job(job) for job in jobs]
+    return {key: (result, error) for key, result, error in results}
+
+
+def merged_path(project_dir, model, System, Energy, dp):
+    return f"{project_dir}/Models/{model}/{model}_{System}_{Energy}_DP_{dp}.yoda"
+
+
+def dp_groups(conn, dg, dp, system):
+    """Recorded model output files of one DP, grouped by their recorded pT-hat bin in increasing PT_Min."""
+    groups = {}
+    for pt_bin, status, outputs in Registry.get_run_bins(conn, dg, dp, system, 'model'):
+        if status != 'done' or not outputs:
+            continue
+        files = groups.setdefault(pt_bin, [])
+        files += [path for path in json.loads(outputs) if os.path.exists(path) and path not in files]
+    # Runs recorded before the pT-hat bin was stored have none: one group, as before.
+    return [groups[pt_bin] for pt_bin in sorted(groups, key=lambda b: -np.inf if b[0] is None else b[0])]
+
+
+def _report(system, dp, kinds):
+    if kinds:
+        counts = {kind: list(kinds.values()).count(kind) for kind in set(kinds.values())}
+        print(f"🧵 {system} DP_{dp}: stitched pT-hat bins {counts}")
+
+
+def merge_dp(conn, dg, project_dir, model, system, dp, force=False):
+    """Merge one DP in-process unless its model runs are unchanged. Returns the merged YODA file."""
+    System, Energy = system.split('_')
+    out_path = merged_path(project_dir, model, System, Energy, dp)
+    merge_inputs = Manifest.upstream(conn, dg, dp, system, 'model')
+    if not force and Manifest.is_complete(conn, dg, dp, system, 'merge', merge_inputs):
+        print(f"⏭️ {system} DP_{dp}: merge is up to date")
+        return out_path
+    result = merge_groups(dp_groups(conn, dg, dp, system), out_path)
+    if result is None:
+        print(f"⚠️ {system} DP_{dp}: no recorded model outputs to merge")
+        Manifest.record(conn, dg, dp, system, 'merge', merge_inputs, [], 'failed')
+        return None
+    _report(system, dp, result[1])
+    Manifest.record(conn, dg, dp, system, 'merge', merge_inputs, [out_path])
+    return out_path
+
+
+def merge_dps(conn, dg, project_dir, model, systems, dps, jobs=1, force=False):
+    """merge_dp() for every (system, DP) at once, one process per DP. Returns the failures."""
+    work, inputs = [], {}
+    for system in systems:
+        System, Energy = system.split('_')
+        for dp in dps:
+            inputs[(system, dp)] = Manifest.upstream(conn, dg, dp, system, 'model')
+            if not force and Manifest.is_complete(conn, dg, dp, system, 'merge', inputs[(system, dp)]):
+                continue
+            work.append(((system, dp), dp_groups(conn, dg, dp, system),
+                         merged_path(project_dir, model, System, Energy, dp)))
+
+    skipped = len(systems) * len(dps) - len(work)
+    print(f"🧩 Merging {len(work)} design point(s) on {jobs} process(es)" +
+          (f", skipping {skipped} that are up to date" if skipped else ""))
+    failures = []
+    for (system, dp), (result, error) in sorted(merge_many(work, jobs).items()):
+        if error or result is None:
+            print(f"❌ {system} DP_{dp}: {error or 'no recorded model outputs to merge'}")
+            Manifest.record(conn, dg, dp, system, 'merge', inputs[(system, dp)], [], 'failed')
+            failures.append((system, dp))
+            continue
+        _report(system, dp, result[1])
+        Manifest.record(conn, dg, dp, system, 'merge', inputs[(system, dp)], [result[0]])
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the per-run YODA files of every design point.")
+    parser.add_argument("--main_dir", type=str, required=True)
+    parser.add_argument("--model", type=str, default="pythia8")
+    parser.add_argument("--Coll_System", nargs="+", default=["pp_200"])
+    parser.add_argument("--dg", type=int, default=None, help="Wave to merge (default: latest)")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    conn = Registry.connect(args.main_dir)
+    dg = args.dg if args.dg is not None else Registry.latest_wave(conn)
+    dps = range(1, len(Registry.wave_rows(conn, dg)) + 1)
+    failed = merge_dps(conn, dg, f"{args.main_dir}/rivet", args.model, args.Coll_System, list(dps), args.jobs,
+                       args.force)
+    raise SystemExit(1 if failed else 0)
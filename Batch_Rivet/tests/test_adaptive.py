@@ -0,0 +1,59 @@
+import numpy as np
+
+from batch_tools import adaptive as Adaptive
+from batch_tools import yoda_io as YodaIO
+
+KEYS = [("A", "h1"), ("A", "h2")]
+EDGES = np.arange(5.0)
+
+
+def _write(path, rel, empty_bin=False):
+    y = np.ones(4)
+    if empty_bin:
+        y[-1] = 0.0  # nothing expected there: must not hold the DP back
+    YodaIO.write_estimates(path, {f"/{a}/{h}": (EDGES[:-1], EDGES[1:], y, rel * np.ones(4)) for a, h in KEYS})
+    return path
+
+
+def test_precision_ignores_empty_bins_and_penalises_missing_histograms(tmp_path):
+    path = _write(str(tmp_path / "run.yoda"), 0.05, empty_bin=True)
+    overall, per_hist = Adaptive.precision(path, KEYS)
+    assert np.isclose(overall, 0.05) and all(np.isclose(v, 0.05) for v in per_hist.values())
+
+    overall, per_hist = Adaptive.precision(path, KEYS + [("A", "missing")])
+    assert overall == np.inf and per_hist[("A", "missing")] == np.inf
+    assert Adaptive.chunks_needed(0.2, 0.1, 1) == 4 and Adaptive.chunks_needed(np.inf, 0.1, 1) is None
+
+
+def test_design_points_stop_at_the_target_or_the_cap(tmp_path):
+    # relative error base / sqrt(chunks): DP 1 converges at once, DP 2 needs 4 chunks, DP 3 always fails
+    base, chunks, built = {1: 0.05, 2: 0.2, 3: 0.05}, {}, []
+
+    def build_tasks(chunk):
+        return [{'name': f"DP_{dp}_{chunk}", 'system': 'pp_200', 'dp': dp} for dp in base]
+
+    def run(tasks):
+        built.append(sorted(task['dp'] for task in tasks))
+        for task in tasks:
+            chunks[task['dp']] = chunks.get(task['dp'], 0) + 1
+        return [dict(task, returncode=1 if task['dp'] == 3 else 0, error=None) for task in tasks]
+
+    def merge(system, dp):
+        return _write(str(tmp_path / f"DP_{dp}.yoda"), base[dp] / np.sqrt(chunks[dp]))
+
+    results, summary = Adaptive.run_adaptive(build_tasks, run, merge, {'pp_200': KEYS}, [1, 2, 3], 0.1,
+                                             max_chunks=3)
+    assert built == [[1, 2, 3], [2], [2]]
+    assert len(results) == 5
+    assert summary[('pp_200', 1)][0] == 1 and summary[('pp_200', 1)][1] <= 0.1
+    assert summary[('pp_200', 2)][0] == 3 and np.isclose(summary[('pp_200', 2)][1], 0.2 / np.sqrt(3), rtol=1e-5)
+    assert summary[('pp_200', 3)] == (1, np.inf)
+
+
+def test_a_run_without_output_drops_its_design_point(tmp_path):
+    def run(tasks):
+        return [dict(task, returncode=0, error="no YODA file") for task in tasks]
+
+    _, summary = Adaptive.run_adaptive(lambda chunk: [{'system': 'pp_200', 'dp': 1}], run,
+                                       lambda system, dp: None, {'pp_200': KEYS}, [1], 0.1, max_chunks=3)
+    assert summary == {('pp_200', 1): (1, np.inf)}
@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+from batch_tools import calibration as Calibration
+
+N_BINS, N_PC, DIM = 12, 3, 2
+ATOL = 1e-11  # the two agree to ~1e-13 in log likelihood
+
+
+class LowRankEmulator:
+    """PCGP-shaped emulator: y = mean + (z @ basis.T) * scale with component means z and variances v."""
+
+    def __init__(self, seed=1):
+        rng = np.random.default_rng(seed)
+        self.mean = rng.normal(size=N_BINS)
+        self.scale = rng.uniform(0.5, 2.0, size=N_BINS)
+        self.basis = np.linalg.qr(rng.normal(size=(N_BINS, N_PC)))[0]
+        self.residual_var = rng.uniform(0.01, 0.1, size=N_BINS)
+        self.coef = rng.normal(size=(DIM, N_PC))
+
+    def predict_components(self, theta):
+        theta = np.atleast_2d(theta)
+        return np.sin(theta @ self.coef), 0.05 + np.cos(theta @ self.coef) ** 2
+
+    def predict(self, theta):
+        z, v = self.predict_components(theta)
+        var = (v @ self.basis.T ** 2) * self.scale ** 2 + self.residual_var
+        return self.mean + (z @ self.basis.T) * self.scale, var
+
+
+def _dense(emulator, y, data_cov, theta, emulator_var=True):
+    """log N(y; mu(theta), data_cov + residual_var + B diag(v) B^T) by a full n x n solve per point."""
+    z, v = emulator.predict_components(theta)
+    B = emulator.basis * emulator.scale[:, None]
+    out = []
+    for zi, vi in zip(z, v):
+        cov = data_cov + (np.diag(emulator.residual_var) + B @ np.diag(vi) @ B.T if emulator_var else 0)
+        r = y - (emulator.mean + B @ zi)
+        _, logdet = np.linalg.slogdet(cov)
+        out.append(-0.5 * (r @ np.linalg.solve(cov, r) + logdet + len(y) * np.log(2 * np.pi)))
+    return np.array(out)
+
+
+@pytest.fixture
+def problem():
+    rng = np.random.default_rng(7)
+    emulator = LowRankEmulator()
+    y = emulator.predict(rng.uniform(size=(1, DIM)))[0][0] + rng.normal(scale=0.1, size=N_BINS)
+    y_err = rng.uniform(0.05, 0.2, size=N_BINS)
+    a = rng.normal(size=(N_BINS, N_BINS)) * 0.02
+    full_cov = np.diag(y_err ** 2) + a @ a.T
+    theta = rng.uniform(size=(16, DIM))
+    return emulator, y, y_err, full_cov, theta
+
+
+def test_woodbury_matches_dense_diagonal(problem):
+    emulator, y, y_err, _, theta = problem
+    likelihood = Calibration.Likelihood(emulator, y, y_err, np.zeros(DIM), np.ones(DIM))
+    assert likelihood.low_rank
+    dense = _dense(emulator, y, np.diag(y_err ** 2), theta)
+    np.testing.assert_allclose(likelihood(theta), dense, rtol=0, atol=ATOL)
+
+
+def test_woodbury_matches_dense_full_covariance(problem):
+    emulator, y, _, full_cov, theta = problem
+    likelihood = Calibration.Likelihood(emulator, y, full_cov, np.zeros(DIM), np.ones(DIM))
+    assert not likelihood.diagonal
+    np.testing.assert_allclose(likelihood(theta), _dense(emulator, y, full_cov, theta), rtol=0, atol=ATOL)
+
+
+def test_woodbury_without_emulator_variance(problem):
+    emulator, y, y_err, _, theta = problem
+    likelihood = Calibration.Likelihood(emulator, y, y_err, np.zeros(DIM), np.ones(DIM), emulator_var=False)
+    dense = _dense(emulator, y, np.diag(y_err ** 2), theta, emulator_var=False)
+    np.testing.assert_allclose(likelihood(theta), dense, rtol=0, atol=ATOL)
+
+
+def test_outside_the_prior_box(problem):
+    emulator, y, y_err, _, theta = problem
+    likelihood = Calibration.Likelihood(emulator, y, y_err, np.zeros(DIM), np.ones(DIM))
+    theta = np.vstack([theta[:2], [[1.5, 0.5]]])
+    logp = likelihood(theta)
+    assert np.all(np.isfinite(logp[:2])) and logp[2] == -np.inf
+    assert likelihood(theta[0]) == pytest.approx(logp[0])
+
+
+def test_joint_likelihood_sums_the_systems(problem):
+    emulator, y, y_err, _, theta = problem
+    other = LowRankEmulator(seed=2)
+    parts = [Calibration.Likelihood(emulator, y, y_err, np.zeros(DIM), np.ones(DIM)),
+             Calibration.Likelihood(other, y[::-1], y_err, np.zeros(DIM), np.ones(DIM))]
+    joint = Calibration.JointLikelihood(parts)
+    np.testing.assert_allclose(joint(theta), parts[0](theta) + parts[1](theta), rtol=1e-12)
+    wider = Calibration.Likelihood(other, y, y_err, np.zeros(DIM), 2 * np.ones(DIM))
+    with pytest.raises(ValueError):
+        Calibration.JointLikelihood([parts[0], wider])
+
+
+def test_resume_only_continues_the_same_posterior(problem, tmp_path, capsys):
+    emulator, y, y_err, _, _ = problem
+
+    def run(y, nsteps):
+        likelihood = Calibration.Likelihood(emulator, y, y_err, np.zeros(DIM), np.ones(DIM))
+        Calibration.run_calibration(likelihood, 8, nsteps, 0, str(tmp_path), "gp_PCGP", checkpoint_every=10)
+        return Calibration.ChainStore(Calibration.chain_dir(str(tmp_path), "gp_PCGP")).meta
+
+    first = run(y, 20)
+    assert run(y, 30)["chunks"] == [10, 10, 10]
+    assert "resuming at step 20" in capsys.readouterr().out
+    # new data: the finished chain is not handed back, a new one is sampled
+    changed = run(y + 0.1, 30)
+    assert "starting over" in capsys.readouterr().out
+    assert changed["posterior"]["emulators"] == first["posterior"]["emulators"]
+    assert changed["posterior"]["data"] != first["posterior"]["data"]
+
+
+def test_resumed_monitor_keeps_its_tau_history(problem, tmp_path):
+    emulator, y, y_err, _, _ = problem
+    likelihood = Calibration.Likelihood(emulator, y, y_err, np.zeros(DIM), np.ones(DIM))
+
+    def run(nsteps):
+        monitor = Calibration.ConvergenceMonitor(["a", "b"], factor=1000)
+        Calibration.run_calibration(likelihood, 8, nsteps, 0, str(tmp_path), "gp_PCGP", checkpoint_every=10,
+                                    monitor=monitor)
+        return monitor
+
+    assert [h["steps"] for h in run(20).history] == [10, 20]
+    assert [h["steps"] for h in run(30).history] == [10, 20, 30]
+    report = Calibration.read_convergence(str(tmp_path), "gp_PCGP")
+    assert [h["steps"] for h in report["history"]] == [10, 20, 30]
@@ -0,0 +1,58 @@
+import time
+
+import numpy as np
+
+from batch_tools import design as Design
+
+LOWER, UPPER = np.array([0.5, -2.0, 10.0, 0.0, 1.0]), np.array([2.5, 2.0, 20.0, 0.1, 5.0])
+
+
+def _existing(n, seed=1):
+    return LOWER + (UPPER - LOWER) * np.random.default_rng(seed).random((n, len(LOWER)))
+
+
+def _strata(points, n_total):
+    unit = (points - LOWER) / (UPPER - LOWER)
+    return np.clip((unit * n_total).astype(int), 0, n_total - 1)
+
+
+def test_points_stay_inside_the_prior_box():
+    points = Design.augment_maximin_lhs(_existing(40), 30, LOWER, UPPER, seed=5)
+    assert points.shape == (30, len(LOWER))
+    assert np.all(points >= LOWER) and np.all(points <= UPPER)
+
+
+def test_new_points_fill_the_empty_strata():
+    existing = _existing(40)
+    n_total = len(existing) + 30
+    points = Design.augment_maximin_lhs(existing, 30, LOWER, UPPER, seed=5)
+    new, old = _strata(points, n_total), _strata(existing, n_total)
+    for j in range(len(LOWER)):
+        assert len(np.unique(new[:, j])) == len(new)            # one new point per interval
+        assert not np.intersect1d(new[:, j], old[:, j]).size     # never in an occupied one
+
+
+def test_plain_lhs_without_existing_points():
+    points = Design.augment_maximin_lhs(np.empty((0, len(LOWER))), 20, LOWER, UPPER, seed=2)
+    for j in range(len(LOWER)):
+        assert sorted(_strata(points, 20)[:, j]) == list(range(20))
+
+
+def test_the_seed_fixes_the_design():
+    existing = _existing(40)
+    a = Design.augment_maximin_lhs(existing, 30, LOWER, UPPER, seed=5)
+    np.testing.assert_array_equal(a, Design.augment_maximin_lhs(existing, 30, LOWER, UPPER, seed=5))
+    assert not np.array_equal(a, Design.augment_maximin_lhs(existing, 30, LOWER, UPPER, seed=6))
+
+
+def test_optimised_design_is_better_spread_than_random():
+    existing = _existing(200)
+    points = Design.augment_maximin_lhs(existing, 50, LOWER, UPPER, seed=3)
+    random = _existing(50, seed=9)
+    assert Design.min_distance(points, existing, LOWER, UPPER) > Design.min_distance(random, existing, LOWER, UPPER)
+
+
+def test_thousands_of_existing_points_take_seconds():
+    start = time.time()
+    Design.augment_maximin_lhs(_existing(2000), 200, LOWER, UPPER, seed=4)
+    assert time.time() - start < 30  # ~1.5 s here; the full pairwise exchange took ~1 min
@@ -0,0 +1,51 @@
+import threading
+import time
+
+from batch_tools import executor as Executor
+
+
+def _task(name, *cmd):
+    return {'name': name, 'cmd': list(cmd)}
+
+
+def test_pt_hat_bins_and_chunk_seeds():
+    assert Executor.pt_hat_bins([]) == [(-1, -1)]
+    assert Executor.pt_hat_bins([5, 10, 20]) == [(5, 10), (10, 20), (20, -1)]
+    seeds = {Executor.chunk_seed(100, k, j, 6) for k in range(3) for j in range(6)}
+    assert len(seeds) == 18 and Executor.chunk_seed(100, 0, 0, 6) == 100
+
+
+def test_failures_are_recorded_and_do_not_stop_the_pool(tmp_path):
+    tasks = [_task("ok", "true"), _task("exit", "sh", "-c", "echo boom; exit 3"),
+             _task("missing", str(tmp_path / "no_such_script")), _task("ok2", "true")]
+    results = {r['name']: r for r in Executor.run_tasks(tasks, jobs=2, log_dir=str(tmp_path / "logs"))}
+    assert set(results) == {"ok", "exit", "missing", "ok2"}
+    assert results["ok"]['returncode'] == 0 and results["ok2"]['returncode'] == 0
+    assert results["exit"]['returncode'] == 3
+    with open(results["exit"]['log']) as f:
+        assert f.read().strip() == "boom"
+    assert results["missing"]['returncode'] == -1 and results["missing"]['error']
+    assert sorted(r['name'] for r in Executor.print_summary(list(results.values()))) == ["exit", "missing"]
+
+
+def test_at_most_jobs_tasks_run_at_once(tmp_path, monkeypatch):
+    running, peak, lock = [0], [0], threading.Lock()
+    run = Executor.subprocess.run
+
+    def counting_run(*args, **kwargs):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        try:
+            return run(*args, **kwargs)
+        finally:
+            with lock:
+                running[0] -= 1
+
+    monkeypatch.setattr(Executor.subprocess, "run", counting_run)
+    start = time.time()
+    results = Executor.run_tasks([_task(f"t{k}", "sleep", "0.2") for k in range(8)], jobs=3,
+                                 log_dir=str(tmp_path))
+    assert len(results) == 8 and all(r['returncode'] == 0 for r in results)
+    assert peak[0] == 3
+    assert time.time() - start < 8 * 0.2  # ran concurrently
@@ -0,0 +1,91 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from batch_tools import executor as Executor
+from batch_tools import manifest as Manifest
+from batch_tools import registry as Registry
+
+NAMES = ["pT0Ref", "ecmPow"]
+
+# run_<model>.sh argument contract: analyses input_dir project_dir System Energy nevents seed param_tag
+# merge_tag PT_Min PT_Max.  Like the real script it picks its own file name (system, merge tag, seed).
+RUN_SCRIPT = """#!/bin/bash
+[ $# -eq 11 ] || { echo "expected 11 arguments, got $#"; exit 2; }
+echo "$9 $7" >> "$3/calls.txt"
+mkdir -p "$3/Models/toy/Rivet_yoda"
+echo "# $1 $6 $8 $10 $11" > "$3/Models/toy/Rivet_yoda/Rivet_$4_$5_$9_$7.yoda"
+"""
+# Succeeds without writing anything.
+SILENT_SCRIPT = """#!/bin/bash
+echo "$9 $7" >> "$3/calls.txt"
+"""
+
+
+def _install(tmp_path, monkeypatch, script):
+    scripts = tmp_path / "share" / "Design_Points" / "Models" / "toy" / "scripts"
+    scripts.mkdir(parents=True)
+    (scripts / "run_toy.sh").write_text(script)
+    monkeypatch.setenv("BAYES_HEP_SHARE", str(tmp_path / "share"))
+    project_dir = tmp_path / "rivet"
+    project_dir.mkdir()
+    return str(project_dir)
+
+
+def _param_tag(names, point):
+    return '_'.join(f"{name}{value:g}" for name, value in zip(names, point))
+
+
+def _tasks(project_dir, n_chunks=2):
+    design = np.array([[1.0, 0.1], [2.0, 0.2]])
+    return Executor.build_model_tasks("toy", ["pp_200"], {"pp_200": ["A"]}, design, NAMES, _param_tag, "input",
+                                      project_dir, 100, 11, [(-1, -1)], n_chunks, range(2))
+
+
+def _run(conn, project_dir, jobs=2):
+    return Manifest.run_model_tasks(conn, 1, _tasks(project_dir), project_dir, "toy", 100, jobs,
+                                    os.path.join(project_dir, "logs"))
+
+
+def _calls(project_dir):
+    with open(os.path.join(project_dir, "calls.txt")) as f:
+        return f.read().splitlines()
+
+
+def test_model_command_follows_the_script_contract(tmp_path, monkeypatch):
+    task = _tasks(_install(tmp_path, monkeypatch, RUN_SCRIPT))[0]
+    assert task['cmd'][2:] == ["A", "input", task['project_dir'], "pp", "200", "100", "11", "pT0Ref1_ecmPow0.1",
+                               "DP_1", "-1", "-1"]
+
+
+def test_runs_are_recorded_from_the_files_the_script_writes(tmp_path, monkeypatch):
+    project_dir = _install(tmp_path, monkeypatch, RUN_SCRIPT)
+    conn = Registry.connect(str(tmp_path))
+    results = _run(conn, project_dir)
+    assert all(r['returncode'] == 0 for r in results) and len(results) == 4
+    for r in results:
+        assert r['output'] == f"{project_dir}/Models/toy/Rivet_yoda/Rivet_pp_200_{r['merge_tag']}_{r['seed']}.yoda"
+        status, _, outputs = Registry.get_run(conn, 1, r['dp'], "pp_200", "model", r['seed'])
+        assert status == "done" and list(json.loads(outputs)) == [r['output']]
+
+    # nothing changed: every run is skipped
+    assert _run(conn, project_dir) == [] and len(_calls(project_dir)) == 4
+
+    # a changed output file is redone, the others are not
+    with open(results[0]['output'], 'a') as f:
+        f.write("# edited\n")
+    rerun = _run(conn, project_dir)
+    assert [(r['dp'], r['seed']) for r in rerun] == [(results[0]['dp'], results[0]['seed'])]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_runs_without_an_output_file_fail_and_are_retried(tmp_path, monkeypatch, jobs):
+    project_dir = _install(tmp_path, monkeypatch, SILENT_SCRIPT)
+    conn = Registry.connect(str(tmp_path))
+    results = _run(conn, project_dir, jobs)
+    assert all(r['returncode'] == 0 and r['output'] is None for r in results)
+    assert len(Executor.print_summary(results)) == 4
+    assert {Registry.get_run(conn, 1, r['dp'], "pp_200", "model", r['seed'])[0] for r in results} == {"failed"}
+    assert len(_run(conn, project_dir, jobs)) == 4 and len(_calls(project_dir)) == 8
@@ -0,0 +1,70 @@
+import re
+
+import pytest
+
+from batch_tools import pipeline as Pipeline
+
+CONFIG = {'main_dir': '/work', 'rivet_main': 'Rivet_Main.py', 'bayes_main': 'Bayes_Main.py',
+          'systems': ['pp_200', 'pp_510'], 'n_points': 5, 'dp_per_task': 2}
+
+
+def _dependencies(args):
+    flags = [a for a in args if a.startswith('--dependency=')]
+    return re.findall(r"(afterok|aftercorr):(\d+)", flags[0]) if flags else []
+
+
+def test_expand_fans_out_per_system_and_batch():
+    tasks = Pipeline.expand(CONFIG)
+    assert Pipeline.dp_batches(5, 2) == [(0, 2), (2, 4), (4, 5)]
+    assert sorted(n for n in tasks if n.startswith('generate:')) == \
+        [f"generate:{s}:{b}" for s in ('pp_200', 'pp_510') for b in range(3)]
+    assert tasks['merge:pp_510:1']['deps'] == ['generate:pp_510:1']
+    assert tasks['write:pp_200']['deps'] == [f"merge:pp_200:{b}" for b in range(3)]
+    assert tasks['emulate']['deps'] == ['write:pp_200', 'write:pp_510']
+    assert tasks['generate:pp_200:2']['cmd'][2:4] == ['4', '5']
+
+
+def test_expand_drops_unselected_upstream():
+    tasks = Pipeline.expand(CONFIG, stages=['merge', 'write'])
+    assert set(t['stage'] for t in tasks.values()) == {'merge', 'write'}
+    assert all(not t['deps'] for t in tasks.values() if t['stage'] == 'merge')
+
+
+def test_fake_backend_submits_in_dependency_order(tmp_path):
+    tasks = Pipeline.expand(CONFIG)
+    backend = Pipeline.FakeBackend(str(tmp_path))
+    job_ids = backend.run(tasks)
+
+    submitted = []
+    for args in backend.jobs:
+        for _, job in _dependencies(args):
+            assert job in submitted  # every dependency was submitted earlier
+        submitted.append(str(1000 + len(submitted) + 1))
+    assert len(backend.jobs) == len(Pipeline.array_groups(tasks)) == len(job_ids)
+
+    merge = next(args for args in backend.jobs if '--job-name=merge_pp_200' in args)
+    assert _dependencies(merge) == [('aftercorr', job_ids[('generate', 'pp_200')])]
+    assert '--array=0-2' in merge
+    write = next(args for args in backend.jobs if '--job-name=write_pp_200' in args)
+    assert _dependencies(write) == [('afterok', job_ids[('merge', 'pp_200')])]
+    assert set(backend.finished.values()) == {'done'}
+
+
+def test_fake_backend_cancels_dependants_of_a_failure(tmp_path):
+    tasks = Pipeline.expand(CONFIG)
+    backend = Pipeline.FakeBackend(str(tmp_path), fail={'generate:pp_510:1'})
+    backend.run(tasks)
+    status = backend.finished
+
+    assert status['generate:pp_510:1'] == 'failed'
+    assert status['merge:pp_510:1'] == 'cancelled'
+    assert status['merge:pp_510:0'] == 'done'
+    assert status['write:pp_510'] == 'cancelled'
+    assert status['write:pp_200'] == 'done'
+    assert all(status[name] == 'cancelled' for name in ('emulate', 'calibrate', 'plot'))
+
+
+def test_topological_rejects_cycles():
+    tasks = {'a': {'deps': ['b']}, 'b': {'deps': ['a']}}
+    with pytest.raises(ValueError):
+        Pipeline.topological(tasks)
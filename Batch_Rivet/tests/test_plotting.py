@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+
+from batch_tools import observables as Observables
+from batch_tools import plotting as GPPlots
+
+
+def _line(module, path):
+    import matplotlib.pyplot as plt
+    plt.plot([0, 1], [0, 1])
+    plt.savefig(path)
+
+
+def test_local_jobs_take_arguments_a_worker_cannot(tmp_path):
+    figures = GPPlots.FigureQueue(jobs=1)
+    figures.submit("traces", _line, os, str(tmp_path / "local.png"), local=True)  # a module does not pickle
+    figures.submit("traces", _line, os, str(tmp_path / "pool.png"))
+    assert figures.wait() == 1
+    assert (tmp_path / "local.png").exists() and not (tmp_path / "pool.png").exists()
+
+
+class _LinearEmulator:
+    """Outputs a linear function of the first parameter, bins of one system."""
+
+    def __init__(self, n_bins):
+        self.slope = np.arange(1.0, n_bins + 1)
+
+    def predict(self, theta):
+        mean = np.asarray(theta)[:, :1] * self.slope
+        return mean, np.zeros_like(mean)
+
+
+def test_results_pages_per_emulator_and_system(tmp_path):
+    layout = Observables.Layout()
+    layout.add("pp_200", "A", "h1", 3)
+    layout.add("pp_200", "A", "h2", 2)
+    layout.add("pp_7000", "B", "h1", 4)
+    x = np.concatenate([np.arange(3.0), np.arange(2.0), np.arange(4.0)])
+    y_data = np.concatenate([np.arange(1.0, 4.0), np.arange(1.0, 3.0), np.arange(1.0, 5.0)])
+    emulators = {"gp_PCGP": {"pp_200": _LinearEmulator(5), "pp_7000": _LinearEmulator(4)}}
+    samples = {"gp_PCGP": np.random.default_rng(1).normal(1.0, 0.05, size=(400, 2))}
+
+    figures = GPPlots.FigureQueue(jobs=1)
+    figures.submit("results", GPPlots.results, 100, layout, x, y_data, 0.1 * y_data, samples, emulators,
+                   [0.0, 0.0], [2.0, 1.0], str(tmp_path))
+    assert figures.wait() == 0
+    assert sorted(os.listdir(tmp_path / "plots" / "results")) == ["Results_gp_PCGP_pp_200.png",
+                                                                  "Results_gp_PCGP_pp_7000.png"]
@@ -0,0 +1,63 @@
+import json
+
+import numpy as np
+
+from batch_tools import prediction_cache as PredCache
+
+N_DP = 6
+
+
+def _write(path, table, header="# Version 1.0\n# Data Data__200__pp__A__h.dat\n# Design Design__1.dat\n"):
+    with open(path, 'w') as f:
+        f.write(header)
+        np.savetxt(f, table)
+
+
+def _project(tmp_path):
+    merged, data = tmp_path / "input" / "Prediction_Merged", tmp_path / "input" / "Data"
+    merged.mkdir(parents=True)
+    data.mkdir(parents=True)
+    rng = np.random.default_rng(3)
+    tables = {}
+    for hist, n_bins in (("A__h1", 3), ("A__h2", 5)):
+        values = rng.normal(size=(n_bins, N_DP))
+        _write(merged / f"Prediction__toy__200__pp__{hist}__values.dat", values)
+        _write(merged / f"Prediction__toy__200__pp__{hist}__errors.dat", 0.1 * np.abs(values))
+        edges = np.arange(n_bins + 1, dtype=float)
+        _write(data / f"Data__200__pp__{hist}.dat", np.column_stack([edges[:-1], edges[1:], np.ones((n_bins, 2))]))
+        tables[str(merged / f"Prediction__toy__200__pp__{hist}__values.dat")] = values
+    return tables
+
+
+def test_cache_matches_the_text_files(tmp_path):
+    tables = _project(tmp_path)
+    cached = PredCache.read_predictions(str(tmp_path), "toy", "pp_200")
+    parsed = PredCache.read_predictions(str(tmp_path), "toy", "pp_200", use_cache=False)
+
+    assert [p["FileName"] for p in cached] == [p["FileName"] for p in parsed] == sorted(tables)
+    for c, p in zip(cached, parsed):
+        np.testing.assert_array_equal(c["Prediction"], tables[c["FileName"]].T)  # DPs x bins
+        np.testing.assert_array_equal(c["Prediction"], p["Prediction"])
+        np.testing.assert_array_equal(c["Errors"], p["Errors"])
+        np.testing.assert_array_equal(c["Edges"], p["Edges"])
+        assert c["DataFile"] == "Data__200__pp__A__h.dat"
+
+    values = np.load(tmp_path / "input" / "Prediction_Cache" / "toy__200__pp" / "values.npy", mmap_mode='r')
+    assert values.shape == (N_DP, 8) and values.flags['C_CONTIGUOUS']  # one design point per row
+
+
+def test_cache_rebuilds_on_change(tmp_path):
+    tables = _project(tmp_path)
+    PredCache.read_predictions(str(tmp_path), "toy", "pp_200")
+    first = sorted(tables)[0]
+    _write(first, 2 * tables[first])
+    cached = PredCache.read_predictions(str(tmp_path), "toy", "pp_200", [first])
+    np.testing.assert_array_equal(cached[0]["Prediction"], 2 * tables[first].T)
+
+    # a cache written in an older layout is rebuilt as well
+    index_file = tmp_path / "input" / "Prediction_Cache" / "toy__200__pp" / "index.json"
+    index = json.loads(index_file.read_text())
+    index.pop("layout")
+    index_file.write_text(json.dumps(index))
+    PredCache.read_predictions(str(tmp_path), "toy", "pp_200")
+    assert json.loads(index_file.read_text())["layout"] == PredCache.LAYOUT
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+
+from batch_tools import prediction_merge as PredMerge
+
+HISTS = ("A__h1", "A__h2")
+N_BINS = 4
+
+
+def _wave(prediction_dir, dg, n_dp=3):
+    """values/errors files of one DG wave, one column per design point."""
+    rng = np.random.default_rng(dg)
+    for hist in HISTS:
+        for suffix in ("values", "errors"):
+            table = rng.normal(size=(N_BINS, n_dp))
+            with open(os.path.join(prediction_dir, f"Prediction__toy__200__pp__{hist}__DG_{dg}__{suffix}.dat"),
+                      'w') as f:
+                f.write(f"# Version 1.0\n# Data Data__200__pp__{hist}.dat\n")
+                f.write("# " + ' '.join(f"design_point{dp}" for dp in range(1, n_dp + 1)) + "\n")
+                np.savetxt(f, table)
+
+
+def _merge(prediction_dir, merged_dir):
+    index = PredMerge.load_index(merged_dir)
+    actions = PredMerge.merge_predictions(prediction_dir, merged_dir, index)
+    PredMerge.save_index(merged_dir, index)
+    return actions
+
+
+def _no_rebuild(*args):
+    raise AssertionError("a merged file was rebuilt")
+
+
+def _merged(merged_dir):
+    """{name: (inode, mtime_ns, rows)} of the merged prediction files."""
+    merged = {}
+    for name in sorted(os.listdir(merged_dir)):
+        if name.startswith("Prediction__"):
+            path = os.path.join(merged_dir, name)
+            st = os.stat(path)
+            merged[name] = (st.st_ino, st.st_mtime_ns, np.loadtxt(path, ndmin=2))
+    return merged
+
+
+def test_unchanged_waves_are_not_rewritten_and_new_waves_are_appended(tmp_path, monkeypatch):
+    prediction_dir, merged_dir = str(tmp_path / "Prediction"), str(tmp_path / "Prediction_Merged")
+    os.makedirs(prediction_dir)
+    _wave(prediction_dir, 1)
+    _wave(prediction_dir, 2)
+    assert _merge(prediction_dir, merged_dir) == {"unchanged": 0, "appended": 0, "rebuilt": 4}
+    first = _merged(merged_dir)
+    assert len(first) == 4 and all(rows.shape == (N_BINS, 6) for _, _, rows in first.values())
+
+    # nothing changed (a touched wave file has the same content): nothing is rewritten
+    os.utime(os.path.join(prediction_dir, "Prediction__toy__200__pp__A__h1__DG_1__values.dat"))
+    assert _merge(prediction_dir, merged_dir) == {"unchanged": 4, "appended": 0, "rebuilt": 0}
+    assert {name: entry[:2] for name, entry in _merged(merged_dir).items()} == \
+        {name: entry[:2] for name, entry in first.items()}
+
+    # a new wave: only its columns are appended, the merged waves are not read again
+    _wave(prediction_dir, 3, n_dp=2)
+    monkeypatch.setattr(PredMerge, "_rebuild", _no_rebuild)
+    read = []
+    original_read = PredMerge._read
+    monkeypatch.setattr(PredMerge, "_read", lambda path: read.append(os.path.basename(path)) or original_read(path))
+    assert _merge(prediction_dir, merged_dir) == {"unchanged": 0, "appended": 4, "rebuilt": 0}
+    assert not [name for name in read if "__DG_1__" in name or "__DG_2__" in name]
+    for name, (_, _, rows) in _merged(merged_dir).items():
+        assert rows.shape == (N_BINS, 8)
+        np.testing.assert_array_equal(rows[:, :6], first[name][2])
+    with open(os.path.join(merged_dir, "Prediction__toy__200__pp__A__h1__values.dat")) as f:
+        assert f.read().count("design_point") == 8
+
+
+def test_a_changed_wave_rebuilds_only_its_merged_file(tmp_path):
+    prediction_dir, merged_dir = str(tmp_path / "Prediction"), str(tmp_path / "Prediction_Merged")
+    os.makedirs(prediction_dir)
+    _wave(prediction_dir, 1)
+    _wave(prediction_dir, 2)
+    _merge(prediction_dir, merged_dir)
+
+    changed = os.path.join(prediction_dir, "Prediction__toy__200__pp__A__h2__DG_1__errors.dat")
+    with open(changed) as f:
+        text = f.read()
+    with open(changed, 'w') as f:
+        f.write(text.replace("e", "E"))  # same numbers, different bytes
+    assert _merge(prediction_dir, merged_dir) == {"unchanged": 3, "appended": 0, "rebuilt": 1}
@@ -0,0 +1,58 @@
+import itertools
+
+import numpy as np
+
+from batch_tools import pthat as PtHat
+
+FINE_EDGES = [5, 7, 9, 11, 15, 20, 30]
+
+
+def _pilot(seed=1):
+    rng = np.random.default_rng(seed)
+    F, B = len(FINE_EDGES), 8
+    sigma = 1e4 / (1 + np.arange(F)) ** 3                            # falling cross-section
+    m1 = rng.random((F, B)) * np.linspace(0.2, 1.0, F)[:, None]       # harder bins fill the tail
+    m2 = m1 * (1 + rng.random((F, B)))                                # per-event second moment >= first
+    cost = np.linspace(1.0, 3.0, F)                                   # harder bins cost more CPU per event
+    return sigma, m1, m2, cost
+
+
+def test_dynamic_programme_finds_the_best_edges():
+    sigma, m1, m2, cost = _pilot()
+    h = (sigma[:, None] * m1).sum(0)
+    A, c = PtHat.segment_terms(sigma, m1, m2, cost, h)
+    F = len(FINE_EDGES)
+    for n_bins in (1, 3, 4):
+        edges, A_K, c_K, objective = PtHat.optimise_edges(FINE_EDGES, sigma, m1, m2, cost, n_bins)
+        brute = min(sum(np.sqrt(A[i, j] * c[i, j]) for i, j in zip((0,) + cuts, cuts + (F,)))
+                    for cuts in itertools.combinations(range(1, F), n_bins - 1))
+        assert np.isclose(objective, brute)
+        assert len(edges) == n_bins and edges[0] == FINE_EDGES[0] and edges == sorted(edges)
+        assert np.isclose(np.sqrt(A_K * c_K).sum(), objective)
+
+
+def test_allocation_spends_the_budget_and_beats_equal_events():
+    sigma, m1, m2, cost = _pilot(2)
+    _, A, c, _ = PtHat.optimise_edges(FINE_EDGES, sigma, m1, m2, cost, 4)
+    budget = 1e6
+    n = PtHat.allocate(A, c, budget)
+    assert np.isclose(n.dot(c), budget, rtol=1e-3)
+    equal = np.full(len(A), budget / c.sum())
+    assert PtHat.variance(A, n) < PtHat.variance(A, equal)
+    # the optimum reached is the one the objective predicts: (sum sqrt(A c))**2 / budget
+    assert np.isclose(PtHat.variance(A, n), np.sqrt(A * c).sum() ** 2 / budget, rtol=1e-3)
+
+
+def test_pilot_moments_use_the_histograms_present_in_every_bin():
+    xmin, xmax = np.arange(3.0), np.arange(1.0, 4.0)
+    bins = []
+    for k in range(3):
+        raw = {("A", "h"): (xmin, xmax, np.full(3, 10.0 * (k + 1)), np.full(3, 2.0))}
+        if k:
+            raw[("A", "partial")] = (xmin, xmax, np.ones(3), np.ones(3))
+        bins.append({'xsec': 1.0 / (k + 1), 'nevents': 100.0, 'raw': raw})
+    sigma, m1, m2 = PtHat.pilot_moments(bins, [("A", "h"), ("A", "partial")])
+    np.testing.assert_allclose(sigma, [1.0, 0.5, 1 / 3])
+    assert m1.shape == m2.shape == (3, 3)
+    np.testing.assert_allclose(m1[:, 0], [0.1, 0.2, 0.3])
+    np.testing.assert_allclose(m2, 0.04)
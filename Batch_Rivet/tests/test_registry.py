@@ -0,0 +1,74 @@
+import multiprocessing
+import sqlite3
+
+import numpy as np
+
+from batch_tools import registry as Registry
+
+NAMES = ["pT0Ref", "ecmPow"]
+
+
+def _design_file(main_dir, dg, rows, seed=7):
+    design_dir = main_dir / "input" / "Design"
+    design_dir.mkdir(parents=True, exist_ok=True)
+    lines = [f"# Parameter {' '.join(NAMES)}", f"# LHS Seed = {seed}; Number of Design Points = {len(rows)}"]
+    lines += [Registry.format_row(row) for row in rows]
+    (design_dir / f"Design__Rivet__{dg}.dat").write_text('\n'.join(lines) + '\n')
+
+
+def _allocate(main_dir):
+    conn = Registry.connect(main_dir)
+    return Registry.new_wave(conn, np.random.default_rng().random((3, 2)), NAMES, 1)
+
+
+def _columns(main_dir):
+    conn = Registry.connect(main_dir)
+    return sorted(row[1] for row in conn.execute("PRAGMA table_info(runs)"))
+
+
+def test_new_waves_get_consecutive_indices(tmp_path):
+    conn = Registry.connect(str(tmp_path))
+    assert Registry.latest_wave(conn) == 0
+    first = np.array([[1.0, 0.1], [2.0, 0.2]])
+    assert Registry.new_wave(conn, first, NAMES, 11) == 1
+    assert Registry.new_wave(conn, np.array([[3.0, 0.3]]), NAMES, 12) == 2
+    assert Registry.waves(conn) == [1, 2] and Registry.latest_wave(conn) == 2
+    assert Registry.parameter_names(conn) == NAMES
+    np.testing.assert_array_equal(Registry.rows_to_array(Registry.wave_rows(conn, 1), 2), first)
+    assert len(Registry.all_design_rows(conn)) == 3
+
+
+def test_concurrent_allocation_never_reuses_an_index(tmp_path):
+    Registry.connect(str(tmp_path))
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        dgs = pool.map(_allocate, [str(tmp_path)] * 12)
+    assert sorted(dgs) == list(range(1, 13))
+
+
+def test_design_files_are_imported_on_creation_and_on_request(tmp_path):
+    _design_file(tmp_path, 1, [[1.0, 0.1], [2.0, 0.2]])
+    conn = Registry.connect(str(tmp_path))
+    assert Registry.waves(conn) == [1] and len(Registry.wave_rows(conn, 1)) == 2
+
+    _design_file(tmp_path, 2, [[3.0, 0.3]])
+    assert Registry.waves(Registry.connect(str(tmp_path))) == [1]  # an ordinary connection does not scan
+    assert Registry.waves(Registry.connect(str(tmp_path), import_designs=True)) == [1, 2]
+    assert Registry.new_wave(conn, np.array([[4.0, 0.4]]), NAMES, 3) == 3
+
+
+def test_old_registries_are_migrated_once(tmp_path):
+    path = tmp_path / Registry.REGISTRY_FILE
+    path.parent.mkdir(parents=True)
+    old = sqlite3.connect(path)
+    old.execute("CREATE TABLE runs (dg INTEGER NOT NULL, dp INTEGER NOT NULL, system TEXT NOT NULL, "
+                "stage TEXT NOT NULL, seed INTEGER NOT NULL DEFAULT -1, nevents INTEGER, status TEXT NOT NULL, "
+                "updated REAL, PRIMARY KEY (dg, dp, system, stage, seed))")
+    old.commit()
+    old.close()
+
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        columns = pool.map(_columns, [str(tmp_path)] * 8)
+    assert all(c == columns[0] for c in columns) and {"outputs", "pt_min", "pt_max"} <= set(columns[0])
+    conn = Registry.connect(str(tmp_path))
+    Registry.record_run(conn, 1, 1, "pp_200", "model", "done", seed=5, outputs="[]", pt_bin=(5.0, 10.0))
+    assert Registry.get_run_bins(conn, 1, 1, "pp_200", "model") == [((5.0, 10.0), "done", "[]")]
@@ -0,0 +1,85 @@
+import os
+import stat
+import subprocess
+import sys
+
+import pytest
+
+from batch_tools import stream as Stream
+
+STREAM = os.path.abspath(Stream.__file__)
+
+# Counts the events it reads from the last argument into --histo-file.
+COUNTING_RIVET = """#!/bin/sh
+out=""
+while [ $# -gt 1 ]; do
+    case "$1" in --histo-file) out="$2"; shift;; esac
+    shift
+done
+grep -c '^E ' "$1" > "$out"
+"""
+# Exits before opening the FIFO, like rivet with an unknown analysis.
+FAILING_RIVET = "#!/bin/sh\nexit 3\n"
+
+
+def _events(path):
+    with open(path) as f:
+        return [line.split() for line in f if line.startswith(('E ', 'P '))]
+
+
+def _fake_rivet(tmp_path, script):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    rivet = bin_dir / "rivet"
+    rivet.write_text(script)
+    rivet.chmod(rivet.stat().st_mode | stat.S_IXUSR)
+    return dict(os.environ, PATH=os.pathsep.join([str(bin_dir), os.environ['PATH']]), TMPDIR=str(tmp_path))
+
+
+def _run(env, output, *extra):
+    cmd = [sys.executable, STREAM, 'run', '--generator', 'toy', '--analyses', 'A', '--output', str(output),
+           '--nevents', '20', '--params', 'pT0Ref=2.0', 'ecmPow=0.2', *extra]
+    return subprocess.run(cmd, env=env, timeout=60, capture_output=True, text=True)
+
+
+def test_generate_toy_writes_hepmc3(tmp_path):
+    out = str(tmp_path / "toy.hepmc")
+    Stream.generate_toy(out, 25, 3, 200.0, {'pT0Ref': 2.0, 'ecmPow': 0.2})
+    with open(out) as f:
+        lines = f.read().splitlines()
+    assert lines[1] == "HepMC::Asciiv3-START_EVENT_LISTING" and lines[-1] == "HepMC::Asciiv3-END_EVENT_LISTING"
+
+    records = _events(out)
+    headers = [r for r in records if r[0] == 'E']
+    assert [int(r[1]) for r in headers] == list(range(25))
+    particles = [r for r in records if r[0] == 'P']
+    assert len(particles) == sum(int(r[3]) for r in headers)  # E <event> <vertices> <particles>
+    assert {int(r[3]) for r in particles} <= {2212, 211, -211}
+
+    again = str(tmp_path / "again.hepmc")
+    Stream.generate_toy(again, 25, 3, 200.0, {'pT0Ref': 2.0, 'ecmPow': 0.2})
+    assert _events(again) == records  # same seed, same events
+
+
+def test_generate_toy_multiplicity_follows_the_first_parameter(tmp_path):
+    def mean_multiplicity(pt0):
+        out = str(tmp_path / f"toy_{pt0}.hepmc")
+        Stream.generate_toy(out, 200, 1, 200.0, {'pT0Ref': pt0, 'ecmPow': 0.2})
+        return sum(int(r[3]) - 2 for r in _events(out) if r[0] == 'E') / 200
+
+    assert mean_multiplicity(1.0) > mean_multiplicity(4.0)
+
+
+@pytest.mark.parametrize("extra", [(), ("--file",)])
+def test_stream_feeds_every_event_to_rivet(tmp_path, extra):
+    output = tmp_path / "out" / "run.yoda"
+    result = _run(_fake_rivet(tmp_path, COUNTING_RIVET), output, *extra)
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert output.read_text().strip() == "20"
+    assert not any(p.name.startswith("stream_") for p in tmp_path.iterdir())  # scratch removed
+
+
+def test_stream_does_not_hang_when_rivet_exits_early(tmp_path):
+    result = _run(_fake_rivet(tmp_path, FAILING_RIVET), tmp_path / "run.yoda")
+    assert result.returncode != 0
+    assert "rivet exit 3" in result.stdout
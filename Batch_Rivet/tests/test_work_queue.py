@@ -0,0 +1,90 @@
+import multiprocessing
+import os
+
+from batch_tools import registry as Registry
+from batch_tools import work_queue as WorkQueue
+
+
+def _tasks(project_dir, n=6):
+    tasks = []
+    for k in range(n):
+        dp, seed = k // 2 + 1, 11 + k % 2
+        output = f"{project_dir}/Models/toy/yoda/toy_pp_200_DP_{dp}_seed{seed}.yoda"
+        tasks.append({'name': f"pp_200_DP_{dp}_seed{seed}", 'system': 'pp_200', 'dp': dp, 'pt_bin': (-1, -1),
+                      'seed': seed, 'merge_tag': f"DP_{dp}", 'nevents': 10,
+                      'cmd': ['bash', '-c', f'mkdir -p "$(dirname {output})" && echo "$0" > {output} '
+                                            f'&& echo {dp} {seed} >> {project_dir}/calls.txt', str(k)]})
+    return tasks
+
+
+def _claim_all(main_dir):
+    conn = WorkQueue.connect(main_dir)
+    names = []
+    while True:
+        task = WorkQueue.claim(conn, 1, f"worker-{os.getpid()}")
+        if task is None:
+            return names
+        names.append(task['name'])
+
+
+def test_enqueue_is_idempotent_and_claims_are_exclusive(tmp_path):
+    conn = WorkQueue.connect(str(tmp_path))
+    tasks = _tasks(str(tmp_path), 24)
+    assert WorkQueue.enqueue(conn, 1, tasks) == 24
+    assert WorkQueue.enqueue(conn, 1, tasks) == 0
+
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        claimed = [name for names in pool.map(_claim_all, [str(tmp_path)] * 4) for name in names]
+    assert sorted(claimed) == sorted(task['name'] for task in tasks)
+    assert WorkQueue.counts(conn, 1) == {'claimed': 24}
+
+
+def test_stale_claims_are_reclaimed_and_the_old_worker_loses_them(tmp_path):
+    conn = WorkQueue.connect(str(tmp_path))
+    WorkQueue.enqueue(conn, 1, _tasks(str(tmp_path), 1))
+    task = WorkQueue.claim(conn, 1, "dead")
+    assert WorkQueue.claim(conn, 1, "alive", stale_after=60) is None  # the claim is still fresh
+    assert WorkQueue.heartbeat(conn, 1, [task['name']], "dead") == []
+
+    conn.execute("UPDATE queue SET heartbeat = heartbeat - 120")
+    assert WorkQueue.claim(conn, 1, "alive", stale_after=60)['name'] == task['name']
+    assert WorkQueue.heartbeat(conn, 1, [task['name']], "dead") == [task['name']]
+    assert WorkQueue.heartbeat(conn, 1, [task['name']], "alive") == []
+
+
+def test_failed_units_are_retried_up_to_max_attempts(tmp_path):
+    conn = WorkQueue.connect(str(tmp_path))
+    WorkQueue.enqueue(conn, 1, _tasks(str(tmp_path), 1))
+    for _ in range(3):
+        task = WorkQueue.claim(conn, 1, "w", max_attempts=3)
+        assert task is not None
+        WorkQueue.finish(conn, 1, task['name'], "w", False, max_attempts=3)
+    assert WorkQueue.counts(conn, 1) == {'failed': 1}
+    assert WorkQueue.claim(conn, 1, "w") is None
+    assert WorkQueue.reset_failed(conn, 1) == 1 and WorkQueue.counts(conn, 1) == {'pending': 1}
+
+
+def test_workers_drain_the_queue_and_record_every_run(tmp_path):
+    main_dir, project_dir = str(tmp_path), str(tmp_path / "rivet")
+    os.makedirs(project_dir)
+    tasks = _tasks(project_dir)
+    WorkQueue.enqueue(WorkQueue.connect(main_dir), 1, tasks)
+    results = WorkQueue.run_worker(main_dir, 1, project_dir, "toy", 10, jobs=3, poll=0.1)
+
+    assert sorted(r['name'] for r in results) == sorted(task['name'] for task in tasks)
+    assert WorkQueue.counts(WorkQueue.connect(main_dir), 1) == {'done': len(tasks)}
+    with open(f"{project_dir}/calls.txt") as f:
+        assert len(f.read().splitlines()) == len(tasks)  # every unit ran exactly once
+    conn = Registry.connect(main_dir)
+    assert {Registry.get_run(conn, 1, t['dp'], 'pp_200', 'model', t['seed'])[0] for t in tasks} == {'done'}
+
+    # a second pass finds nothing left to do
+    assert WorkQueue.run_worker(main_dir, 1, project_dir, "toy", 10, jobs=2, poll=0.1) == []
+
+
+def test_a_run_that_writes_no_file_is_not_done(tmp_path):
+    main_dir, project_dir = str(tmp_path), str(tmp_path / "rivet")
+    task = dict(_tasks(project_dir, 1)[0], cmd=['true'])
+    WorkQueue.enqueue(WorkQueue.connect(main_dir), 1, [task])
+    results = WorkQueue.run_worker(main_dir, 1, project_dir, "toy", 10, max_attempts=2, poll=0.1)
+    assert len(results) == 2 and WorkQueue.counts(WorkQueue.connect(main_dir), 1) == {'failed': 1}
@@ -0,0 +1,52 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from batch_tools import rivet_writer as RivetWriter
+from batch_tools import yoda_io as YodaIO
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "input", "Data")
+DATA_FILES = sorted(glob.glob(os.path.join(DATA_DIR, "Data__*.dat")))
+
+
+def _labels(path):
+    labels = {}
+    with open(path) as f:
+        for line in f:
+            for key in ("Observable", "Subobservable"):
+                if line.startswith(f"# {key}:"):
+                    labels[key] = line.split(':', 1)[1].strip()
+    return labels.get("Observable", ''), labels.get("Subobservable", '')
+
+
+@pytest.mark.parametrize("ext", [".yoda", ".yoda.gz"])
+def test_data_round_trip(tmp_path, ext):
+    assert DATA_FILES
+    objects, originals = {}, {}
+    for path in DATA_FILES:
+        _, energy, system, analysis, hist = os.path.basename(path)[:-len(".dat")].split("__")
+        data = np.loadtxt(path, comments='#', ndmin=2)
+        objects[f"/{analysis}/{hist}"] = tuple(data.T)
+        originals[(analysis, hist)] = path
+
+    yoda_file = str(tmp_path / f"data{ext}")
+    YodaIO.write_estimates(yoda_file, objects)
+    found = YodaIO.read_histograms(yoda_file, list(originals))
+    assert set(found) == set(originals)
+
+    for (analysis, hist), path in originals.items():
+        out = str(tmp_path / f"{analysis}__{hist}")
+        RivetWriter.write_data(out, *_labels(path), found[(analysis, hist)])
+        with open(path) as f, open(out + ".dat") as g:
+            assert g.read() == f.read()
+
+
+def test_read_histograms_matches_underscore_variants(tmp_path):
+    yoda_file = str(tmp_path / "mc.yoda")
+    YodaIO.write_estimates(yoda_file, {"/STAR_2006_I709170TEST/d02-x01-y01": ([0.0, 1.0], [1.0, 2.0], [3.0, 4.0],
+                                                                             [0.1, 0.2])})
+    found = YodaIO.read_histograms(yoda_file, [("STAR_2006_I709170_TEST", "d02-x01-y01")])
+    xmin, xmax, y, yerr = found[("STAR_2006_I709170_TEST", "d02-x01-y01")]
+    np.testing.assert_allclose(np.column_stack([xmin, xmax, y, yerr]), [[0, 1, 3, 0.1], [1, 2, 4, 0.2]])
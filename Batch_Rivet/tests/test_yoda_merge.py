@@ -0,0 +1,96 @@
+import numpy as np
+
+from batch_tools import yoda_merge as YodaMerge
+
+EDGES = [0.0, 1.0, 2.0]
+
+
+def _histo(path, rows):
+    lines = [f"BEGIN YODA_HISTO1D_V3 {path}", f"Path: {path}", "Type: Histo1D", "---",
+             "Edges(A1): [" + ", ".join(str(e) for e in EDGES) + "]",
+             "# sumW\tsumW2\tsumW(A1)\tsumW2(A1)\tnumEntries"]
+    return lines + ['\t'.join(f"{v:.6e}" for v in row) for row in rows] + ["END YODA_HISTO1D_V3", ""]
+
+
+def _run(tmp_path, name, nevents, xsec, final, raw=None):
+    """One run file: /_EVCOUNT, /_XSEC and /A/h (and /RAW/A/h) with rows of sumW sumW2 sumW(A1) sumW2(A1) numEntries."""
+    lines = ["BEGIN YODA_COUNTER_V3 /_EVCOUNT", "Path: /_EVCOUNT", "Type: Counter", "---",
+             "# sumW\tsumW2\tnumEntries", f"{nevents:.6e}\t{nevents:.6e}\t{nevents:.6e}", "END YODA_COUNTER_V3", "",
+             "BEGIN YODA_ESTIMATE0D_V3 /_XSEC", "Path: /_XSEC", "Type: Estimate0D", "---",
+             'ErrorLabels: ["stat"]', "# value\terrDn(1)\terrUp(1)", f"{xsec:.6e}\t{-0.1 * xsec:.6e}\t{0.1 * xsec:.6e}",
+             "END YODA_ESTIMATE0D_V3", ""]
+    lines += _histo("/A/h", final)
+    if raw is not None:
+        lines += _histo("/RAW/A/h", raw)
+    path = tmp_path / f"{name}.yoda"
+    path.write_text('\n'.join(lines) + '\n')
+    return YodaMerge.read_file(str(path))
+
+
+def _rows(scale):
+    return scale * np.array([[0.0, 0.0, 0.0, 0.0, 0.0], [2.0, 0.5, 1.0, 0.3, 4.0], [6.0, 1.5, 9.0, 2.0, 8.0],
+                             [0.0, 0.0, 0.0, 0.0, 0.0]])
+
+
+def test_column_power():
+    assert [YodaMerge.column_power(c) for c in ("sumW", "sumW2", "sumW(A1)", "sumW2(A1)", "numEntries")] == \
+        [1, 2, 1, 1, 0]
+    assert YodaMerge.column_power("errDn(1)") == 'err'
+    assert YodaMerge.column_power("xlow") is None
+
+
+def test_merge_equivalent_columns(tmp_path):
+    a = _run(tmp_path, "a", 100, 2.0, _rows(1.0), raw=_rows(10.0))
+    b = _run(tmp_path, "b", 300, 4.0, _rows(3.0), raw=_rows(30.0))
+    merged = YodaMerge.merge_equivalent([a, b])
+    wa, wb = 0.25, 0.75  # N_c / N
+
+    h, ha, hb = merged['/A/h']['values'], a['/A/h']['values'], b['/A/h']['values']
+    np.testing.assert_allclose(h[:, 0], wa * ha[:, 0] + wb * hb[:, 0])             # sumW
+    np.testing.assert_allclose(h[:, 1], wa ** 2 * ha[:, 1] + wb ** 2 * hb[:, 1])   # sumW2
+    np.testing.assert_allclose(h[:, 4], ha[:, 4] + hb[:, 4])                       # numEntries
+    # RAW fills and the event count are summed
+    np.testing.assert_allclose(merged['/RAW/A/h']['values'], a['/RAW/A/h']['values'] + b['/RAW/A/h']['values'])
+    assert merged['/_EVCOUNT']['values'][0, 0] == 400
+    # the cross-section is averaged, its errors added in quadrature
+    xsec = merged['/_XSEC']['values'][0]
+    np.testing.assert_allclose(xsec[0], wa * 2.0 + wb * 4.0)
+    np.testing.assert_allclose(xsec[2], np.hypot(wa * 0.2, wb * 0.4))
+    assert xsec[1] < 0
+
+
+def test_merge_pt_bins_cross_section_histogram(tmp_path):
+    # finalize() scaled by sigma_k / N_k: a cross-section, so the bins add up
+    raw_a, raw_b = _rows(10.0), _rows(4.0)
+    a = _run(tmp_path, "a", 100, 50.0, raw_a * 50.0 / 100, raw=raw_a)
+    b = _run(tmp_path, "b", 200, 2.0, raw_b * 2.0 / 200, raw=raw_b)
+    merged, kinds = YodaMerge.merge_pt_bins([a, b])
+
+    assert kinds['/A/h'] == 'xsec'
+    h, ha, hb = merged['/A/h']['values'], a['/A/h']['values'], b['/A/h']['values']
+    np.testing.assert_allclose(h[:, 0], ha[:, 0] + hb[:, 0])
+    np.testing.assert_allclose(h[:, 1], ha[:, 1] + hb[:, 1])
+    # RAW: an equivalent sample of sum(N) events, each bin weighted by sigma_k / N_k
+    w = np.array([50.0 / 100, 2.0 / 200]) * 300 / 52.0
+    np.testing.assert_allclose(merged['/RAW/A/h']['values'][:, 0], w[0] * raw_a[:, 0] + w[1] * raw_b[:, 0], rtol=1e-6)
+    assert merged['/_EVCOUNT']['values'][0, 0] == 300
+    np.testing.assert_allclose(merged['/_XSEC']['values'][0, 0], 52.0)
+
+
+def test_merge_pt_bins_without_raw_uses_cross_section_fractions(tmp_path):
+    a = _run(tmp_path, "a", 100, 30.0, _rows(1.0))
+    b = _run(tmp_path, "b", 100, 10.0, _rows(2.0))
+    merged, kinds = YodaMerge.merge_pt_bins([a, b])
+
+    assert kinds['/A/h'] is None
+    np.testing.assert_allclose(merged['/A/h']['values'][:, 0],
+                               0.75 * a['/A/h']['values'][:, 0] + 0.25 * b['/A/h']['values'][:, 0])
+
+
+def test_merge_groups_writes_a_readable_file(tmp_path):
+    _run(tmp_path, "a", 100, 2.0, _rows(1.0))
+    _run(tmp_path, "b", 100, 2.0, _rows(3.0))
+    out = str(tmp_path / "merged" / "dp.yoda")
+    assert YodaMerge.merge_groups([[str(tmp_path / "a.yoda"), str(tmp_path / "b.yoda")]], out) == (out, {})
+    back = YodaMerge.read_file(out)
+    np.testing.assert_allclose(back['/A/h']['values'], _rows(2.0) * [1, 0.5, 1, 1, 2], rtol=1e-6)
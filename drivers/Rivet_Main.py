@@ -11,6 +11,10 @@ import glob
 import random
 import numpy as np
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Batch_Rivet'))
+from batch_tools import executor as Executor
+from batch_tools import rivet_writer as RivetWriter
+
 ###########################################################
 ################### SCRIPT PARAMETERS #####################
 work_dir= os.environ.get('WORKDIR', '/workdir')  # Default to /workdir
@@ -28,8 +32,13 @@ Run_Model = True            #run design points through model and Rivet
 PT_Min = -1 
 PT_Max = -1
 nevents = 1000             # number of events for model in each run
+jobs = 1                   # model runs executed in parallel (per-task logs in rivet/logs when > 1)
+seed_chunks = 1            # independent seed chunks per design point
+PT_Edges = []              # pT-hat bin edges, last bin open ended (e.g. [15, 20, 25, 30, 40, 60])
 Rivet_Merge = True
+Make_HTML = True           #render mkhtml.sh reports (only needed when Prediction_Source = 'html')
 Write_input_Rivet = True   #gets Data/Pred info from html files 
+Prediction_Source = 'html' #'html': html reports, 'yoda': merged yoda files directly
 
 ###########################################################
 ###########################################################
@@ -185,27 +194,18 @@ if Run_Model:
         print("Design points not found. Need to generate design points first.")
         exit(1)
 
-    for system in Coll_System:
-        if system not in analyses_list:
-            print(f"⚠️ No analyses defined for system: {system}")
-            continue
+    print("🧪 Running model for systems:", Coll_System)
 
-        System, Energy = system.split('_')
-        print("🧪 Running model for system:", system)
+    pt_bins = Executor.pt_hat_bins(PT_Edges, PT_Min, PT_Max)
+    tasks = Executor.build_model_tasks(model, Coll_System, analyses_list, design_points, parameter_names,
+                                       DesignPoints.generate_param_tag, input_dir, project_dir, nevents,
+                                       model_seed, pt_bins, seed_chunks, range(len(design_points)))
 
-        system_analyses = analyses_list[system]
-        if not system_analyses:
-            print(f"⚠️ No analyses listed for {system}")
-            continue
-
-        for i, point in enumerate(design_points):
-            print(f"🚀 Running {model} for Design Point {i+1}: {point}")
-            param_tag = DesignPoints.generate_param_tag(parameter_names, point)
-            merge_tag = f"DP_{i+1}"
-
-            subprocess.run([
-                'bash', f'/usr/local/share/Bayes_HEP/Design_Points/Models/{model}/scripts/run_{model}.sh',
-                ','.join(system_analyses), input_dir, project_dir, System, Energy, str(nevents), str(model_seed), param_tag, merge_tag, str(PT_Min), str(PT_Max)], check=True)
+    results = Executor.run_tasks(tasks, jobs, f"{main_dir}/rivet/logs" if jobs > 1 else None)
+    failed = Executor.print_summary(results)
+    if failed:
+        print(f"❌ {len(failed)} model runs failed.")
+        sys.exit(1)
 
 ############# Rivet Merge/HTML #################
 if Rivet_Merge:
@@ -226,7 +226,8 @@ if Rivet_Merge:
             subprocess.run(['bash', '/usr/local/share/Bayes_HEP/Design_Points/Rivet_Analyses/merge.sh', project_dir, model, System, Energy, merge_tag], check=True)
             
             # Generate HTML report
-            subprocess.run(['bash', '/usr/local/share/Bayes_HEP/Design_Points/Rivet_Analyses/mkhtml.sh', project_dir, model, System, Energy, merge_tag], check=True)
+            if Make_HTML:
+                subprocess.run(['bash', '/usr/local/share/Bayes_HEP/Design_Points/Rivet_Analyses/mkhtml.sh', project_dir, model, System, Energy, merge_tag], check=True)
           
 
 ############# Write out Data/Prediction Files #################
@@ -234,7 +235,13 @@ if Write_input_Rivet:
     os.makedirs(f"{main_dir}/input/Data", exist_ok=True)
     os.makedirs(f"{main_dir}/input/Prediction", exist_ok=True)
  
-    for system in Coll_System:
+    if Prediction_Source == 'yoda':
+        for system in Coll_System:
+            RivetWriter.write_inputs(main_dir, project_dir, model, system, analyses_list[system],
+                                     tagged_analyses[system], len(design_points), max_index, jobs, 'yoda')
+
+    else:
+        for system in Coll_System:
             System, Energy = system.split('_')
 
             system_analyses = analyses_list[system]